@@ -4,31 +4,39 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
 from ..utils.config import get_settings
 import contextlib
+import logging
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 # Convert SQLite URL to async
 ASYNC_DATABASE_URL = settings.DATABASE_URL.replace(
     'postgresql://', 'postgresql+asyncpg://'
 )
 
-# Create async engine with optimized settings for high concurrency
-engine = create_async_engine(
-    ASYNC_DATABASE_URL,
-    echo=settings.DB_ECHO,  # Control SQL logging via settings
+def build_engine(pool_size: int, max_overflow: int):
+    """Create an async engine with optimized settings for high concurrency"""
+    return create_async_engine(
+        ASYNC_DATABASE_URL,
+        echo=settings.DB_ECHO,  # Control SQL logging via settings
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,  # Timeout for getting a connection
+        pool_recycle=settings.DB_POOL_RECYCLE,  # Replace each connection once it reaches this age
+        pool_pre_ping=True,  # Enable connection health checks
+        connect_args={
+            "server_settings": {
+                "jit": "off",  # Disable JIT for more predictable performance
+                "statement_timeout": "60000",  # 60 second timeout
+                "idle_in_transaction_session_timeout": "60000",  # 60 second timeout
+            },
+            "command_timeout": 60  # 60 second timeout for commands
+        }
+    )
+
+engine = build_engine(
     pool_size=settings.DB_POOL_SIZE * 2,  # Double the pool size
     max_overflow=settings.DB_MAX_OVERFLOW * 2,  # Double the max overflow
-    pool_timeout=settings.DB_POOL_TIMEOUT,  # Timeout for getting a connection
-    pool_recycle=settings.DB_POOL_RECYCLE,  # Recycle connections
-    pool_pre_ping=True,  # Enable connection health checks
-    connect_args={
-        "server_settings": {
-            "jit": "off",  # Disable JIT for more predictable performance
-            "statement_timeout": "60000",  # 60 second timeout
-            "idle_in_transaction_session_timeout": "60000",  # 60 second timeout
-        },
-        "command_timeout": 60  # 60 second timeout for commands
-    }
 )
 
 # Create async session factory with optimized settings
@@ -41,6 +49,13 @@ AsyncSessionLocal = sessionmaker(
 
 Base = declarative_base()
 
+def configure_engine(pool_size: int, max_overflow: int):
+    """Swap in an engine with a differently sized pool (used by worker processes)"""
+    global engine
+    engine = build_engine(pool_size, max_overflow)
+    AsyncSessionLocal.configure(bind=engine)
+    return engine
+
 async def get_db():
     """Dependency to get database session with automatic cleanup"""
     session = AsyncSessionLocal()
@@ -48,7 +63,7 @@ async def get_db():
         yield session
         await session.commit()
     except Exception as e:
-        print(f"Database session error: {e}")
+        logger.error("Database session error: %s", e)
         await session.rollback()
         raise
     finally:
@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import sys
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import pytz
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..schemas.appointment import AppointmentImport
+from ..schemas.user import UserCreate
+from ..utils.appointment_cache import appointment_cache
+from ..utils.auth import configure_password_hashing, pwd_context
+from ..utils.cache import redis_client
+from ..utils.config import get_settings
+from ..utils.etag import appointments_changed
+from ..utils.json_encoder import dumps
+from ..utils.log import setup_logging
+from ..utils.password_pool import PasswordHashPool
+from ..utils.queue import AppointmentQueue
+from ..utils.registered_emails import registered_emails
+from ..utils.schedule import confirmed_events, pending_events, schedule_events
+from ..utils.vehicle_catalog import ResolvedVehicle, vehicle_catalog
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+USER_COLUMNS = [
+    "email", "first_name", "last_name", "phone_number", "hashed_password", "vehicle_year",
+    "vehicle_make", "vehicle_model", "vehicle_make_id", "vehicle_model_id", "vehicle_vin", "is_active",
+]
+APPOINTMENT_COLUMNS = [
+    "email", "phone_number", "appointment_time", "vehicle_year", "vehicle_make", "vehicle_model",
+    "vehicle_make_id", "vehicle_model_id", "problem_description", "status", "created_at",
+]
+# Inserted appointments' fields that pending ones are queued with, as the API queues new requests
+APPOINTMENT_RETURNING = (
+    "id, status, email, phone_number, appointment_time, vehicle_year, vehicle_make, vehicle_model, "
+    "vehicle_make_id, vehicle_model_id, problem_description"
+)
+# Everything but password hashes
+EXPORT_QUERIES = {
+    "users": (
+        "SELECT id, email, first_name, last_name, phone_number, vehicle_year, vehicle_make, "
+        "vehicle_model, vehicle_make_id, vehicle_model_id, vehicle_vin, is_active, created_at, updated_at "
+        "FROM users"
+    ),
+    "appointments": (
+        "SELECT id, email, phone_number, appointment_time, vehicle_year, vehicle_make, vehicle_model, "
+        "vehicle_make_id, vehicle_model_id, problem_description, status, created_at, updated_at "
+        "FROM appointments"
+    ),
+}
+IMPORT_KINDS = tuple(EXPORT_QUERIES)
+
+password_pool = PasswordHashPool(settings.IMPORT_HASH_PROCESSES)
+appointment_queue = AppointmentQueue(redis_client)
+
+# Reading records
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+async def iter_records(
+    chunks: AsyncIterator[bytes], fmt: str
+) -> AsyncIterator[Tuple[int, Union[Dict[str, Any], Exception]]]:
+    """(line number, record or parse error) for each non-empty line.
+
+    CSV needs a header row and one record per line; empty fields become None.
+    """
+    header: Optional[List[str]] = None
+    number = 0
+    async for line in iter_lines(chunks):
+        number += 1
+        line = line.rstrip("\r")
+        if not line.strip():
+            continue
+        try:
+            if fmt == "ndjson":
+                yield number, json.loads(line)
+                continue
+            values = next(csv.reader([line]))
+            if header is None:
+                header = values
+                continue
+            if len(values) != len(header):
+                raise ValueError(f"expected {len(header)} fields, got {len(values)}")
+            yield number, {key: (value if value != "" else None) for key, value in zip(header, values)}
+        except ValueError as e:
+            yield number, e
+
+async def iter_file(path: str, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with open(path, "rb") as source:
+        while True:
+            chunk = await asyncio.to_thread(source.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+# Writing batches
+
+async def _copy_and_insert(
+    engine: AsyncEngine,
+    table: str,
+    columns: List[str],
+    rows: List[tuple],
+    returning: Optional[str] = None,
+    before_commit: Optional[Callable[[List[Any]], Awaitable[None]]] = None,
+) -> Tuple[int, List[Any]]:
+    """COPY rows into a temporary staging table, then move them over skipping unique conflicts.
+
+    `before_commit` gets the returned rows inside the transaction; if it raises, nothing is inserted.
+    """
+    staging = f"import_{table}"
+    column_list = ", ".join(columns)
+    async with engine.begin() as conn:
+        # Column types only: no constraints or defaults (which would draw ids) on the staging table
+        await conn.execute(text(
+            f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA"
+        ))
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(staging, records=rows, columns=columns)
+        result = await conn.execute(text(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} "
+            f"ON CONFLICT DO NOTHING" + (f" RETURNING {returning}" if returning else "")
+        ))
+        if returning:
+            returned = result.all()
+            if before_commit is not None:
+                await before_commit(returned)
+            return len(returned), returned
+        return result.rowcount, []
+
+async def _resolve_vehicles(rows: List[BaseModel]) -> List[ResolvedVehicle]:
+    """Catalog spelling and ids for each row's make and model, adding unknown ones to the catalog"""
+    resolved: Dict[Tuple[Optional[str], Optional[str]], ResolvedVehicle] = {}
+    vehicles = []
+    for row in rows:
+        pair = (row.vehicle_make, row.vehicle_model)
+        if pair not in resolved:
+            resolved[pair] = await vehicle_catalog.resolve(*pair, create=True)
+        vehicles.append(resolved[pair])
+    return vehicles
+
+async def _write_users(engine: AsyncEngine, users: List[UserCreate]) -> int:
+    rounds = pwd_context.handler("bcrypt").default_rounds
+    hashes = await password_pool.hash_many([user.password for user in users], rounds)
+    vehicles = await _resolve_vehicles(users)
+    rows = [
+        (
+            user.email, user.first_name, user.last_name, user.phone_number, hashed, user.vehicle_year,
+            vehicle.make, vehicle.model, vehicle.make_id, vehicle.model_id, user.vehicle_vin, True,
+        )
+        for user, hashed, vehicle in zip(users, hashes, vehicles)
+    ]
+    inserted, returned = await _copy_and_insert(engine, "users", USER_COLUMNS, rows, returning="email")
+    # Logins for these emails must get past every process's registered-email filter
+    await registered_emails.record_registrations([row.email for row in returned])
+    return inserted
+
+async def _write_appointments(engine: AsyncEngine, appointments: List[AppointmentImport]) -> int:
+    now = datetime.now(pytz.UTC)
+    vehicles = await _resolve_vehicles(appointments)
+    rows = [
+        (
+            appointment.email, appointment.phone_number, appointment.appointment_time,
+            appointment.vehicle_year, vehicle.make, vehicle.model, vehicle.make_id, vehicle.model_id,
+            appointment.problem_description, appointment.status, appointment.created_at or now,
+        )
+        for appointment, vehicle in zip(appointments, vehicles)
+    ]
+    inserted, returned = await _copy_and_insert(
+        engine, "appointments", APPOINTMENT_COLUMNS, rows,
+        returning=APPOINTMENT_RETURNING, before_commit=_queue_pending,
+    )
+    if inserted:
+        await appointments_changed()
+    # The same follow-up the API and the worker give appointments they create or confirm
+    active = [row for row in returned if row.status in ("pending", "confirmed")]
+    await appointment_cache.refresh(row.id for row in active)
+    events = []
+    for row in active:
+        timed_events = pending_events if row.status == "pending" else confirmed_events
+        events.extend(timed_events(row.id, row.appointment_time))
+    await schedule_events(redis_client, events)
+    return inserted
+
+async def _queue_pending(returned: List[Any]) -> None:
+    """Queue imported pending appointments for the worker before they are committed.
+
+    Raising here rolls the batch back, so a Redis outage fails the import instead of leaving
+    pending rows no worker will ever see. A worker that dequeues one before the commit is
+    visible requeues it.
+    """
+    now = datetime.now(pytz.UTC)
+    messages = [
+        dumps({**{key: value for key, value in row._asdict().items() if key != "status"}, "queued_at": now})
+        for row in returned if row.status == "pending"
+    ]
+    if messages:
+        await appointment_queue.push_messages(messages)
+
+_IMPORTERS = {
+    "users": (UserCreate, _write_users),
+    "appointments": (AppointmentImport, _write_appointments),
+}
+
+async def import_records(
+    engine: AsyncEngine,
+    kind: str,
+    records: AsyncIterator[Tuple[int, Union[Dict[str, Any], Exception]]],
+    batch_size: int = settings.IMPORT_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """Validate and load records in batches; duplicates (by unique index) are skipped, not errors.
+
+    The next batch is parsed and validated while the previous one is being hashed and copied.
+    """
+    model, write = _IMPORTERS[kind]
+    summary: Dict[str, Any] = {"imported": 0, "skipped": 0, "invalid": 0, "errors": []}
+    batch: List[BaseModel] = []
+    writing: Optional[asyncio.Task] = None
+
+    async def flush(rows: List[BaseModel]) -> None:
+        inserted = await write(engine, rows)
+        summary["imported"] += inserted
+        summary["skipped"] += len(rows) - inserted
+
+    try:
+        async for number, record in records:
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                batch.append(model.model_validate(record))
+            except (ValueError, ValidationError) as e:
+                summary["invalid"] += 1
+                if len(summary["errors"]) < settings.IMPORT_MAX_ERRORS:
+                    summary["errors"].append({"line": number, "error": str(e)})
+                continue
+            if len(batch) >= batch_size:
+                if writing is not None:
+                    await writing
+                writing = asyncio.create_task(flush(batch))
+                batch = []
+        if writing is not None:
+            await writing
+            writing = None
+        if batch:
+            await flush(batch)
+    finally:
+        if writing is not None and not writing.done():
+            writing.cancel()
+    logger.info(
+        "Imported %s %s (%s skipped as duplicates, %s invalid)",
+        summary["imported"], kind, summary["skipped"], summary["invalid"]
+    )
+    return summary
+
+# Export
+
+async def stream_export(engine: AsyncEngine, kind: str, buffered_chunks: int = 16) -> AsyncIterator[bytes]:
+    """CSV (with header) straight from COPY TO; at most `buffered_chunks` chunks are held in memory"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffered_chunks)
+    done = object()
+
+    async def produce() -> None:
+        try:
+            async with engine.connect() as conn:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_from_query(
+                    EXPORT_QUERIES[kind], output=queue.put, format="csv", header=True
+                )
+            await queue.put(done)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is done:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # The client went away or the export failed: stop reading from Postgres
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+# Command line
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.database.bulk", description="Bulk import/export")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="load users or appointments from a file")
+    import_parser.add_argument("kind", choices=IMPORT_KINDS)
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=IMPORT_FORMATS, help="default: from the file extension")
+    export_parser = subparsers.add_parser("export", help="write users or appointments as CSV")
+    export_parser.add_argument("kind", choices=IMPORT_KINDS)
+    export_parser.add_argument("path", help="output file, or - for stdout")
+    args = parser.parse_args(argv)
+    setup_logging()
+    if args.command == "import":
+        # Imported users get the same bcrypt cost as the API gives new registrations
+        configure_password_hashing()
+    from .base import engine
+
+    async def run() -> None:
+        try:
+            if args.command == "import":
+                fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+                summary = await import_records(engine, args.kind, iter_records(iter_file(args.path), fmt))
+                print(json.dumps(summary, indent=2))
+            else:
+                output = sys.stdout.buffer if args.path == "-" else open(args.path, "wb")
+                try:
+                    async for chunk in stream_export(engine, args.kind):
+                        output.write(chunk)
+                finally:
+                    if output is not sys.stdout.buffer:
+                        output.close()
+        finally:
+            password_pool.shutdown()
+            await engine.dispose()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
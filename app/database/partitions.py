@@ -0,0 +1,329 @@
+import argparse
+import asyncio
+import csv
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, time
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from ..models.appointment import Appointment
+from ..utils.bloom import BloomFilter
+from ..utils.config import get_settings
+from ..utils.etag import appointments_changed
+from ..utils.log import setup_logging
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARTITION = "appointments_default"
+ARCHIVE_SUFFIX = ".csv.gz"
+# Bloom filter of an archive's emails and phone numbers, written next to it
+INDEX_SUFFIX = ".idx"
+INDEXED_COLUMNS = ("email", "phone_number")
+INDEX_ERROR_RATE = 0.01
+_PARTITION_NAME = re.compile(r"^appointments_p(\d{4})(\d{2})$")
+_COLUMNS = [column.name for column in Appointment.__table__.columns]
+
+# Month helpers
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"appointments_p{month:%Y%m}"
+
+def partition_month(name: str) -> Optional[date]:
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+def _bounds(month: date) -> Tuple[datetime, datetime]:
+    lower = datetime.combine(month, time.min, tzinfo=pytz.UTC)
+    return lower, datetime.combine(add_months(month, 1), time.min, tzinfo=pytz.UTC)
+
+# Partition management
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    result = await conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('appointments')"))
+    return result.scalar() == "p"
+
+async def attached_partitions(conn: AsyncConnection) -> Dict[date, str]:
+    """Monthly partitions currently attached, by month"""
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('appointments')"
+    ))
+    partitions = {}
+    for (name,) in result:
+        month = partition_month(name)
+        if month is not None:
+            partitions[month] = name
+    return partitions
+
+async def create_month_partition(conn: AsyncConnection, month: date) -> None:
+    """Create and attach one month, moving any of its rows out of the default partition"""
+    name = partition_name(month)
+    lower, upper = _bounds(month)
+    columns = ", ".join(_COLUMNS)
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE appointments INCLUDING DEFAULTS)"))
+    await conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            f"WHERE appointment_time >= :lower AND appointment_time < :upper RETURNING {columns}) "
+            f"INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+        ),
+        {"lower": lower, "upper": upper},
+    )
+    # Bounds are generated here, never user input; DDL takes no bind parameters
+    await conn.execute(text(
+        f"ALTER TABLE appointments ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    ))
+    logger.info("Created appointments partition %s", name)
+
+async def ensure_partitions(conn: AsyncConnection, now: Optional[datetime] = None) -> List[str]:
+    """Make sure monthly partitions exist through APPOINTMENT_PARTITION_PREMAKE_MONTHS ahead.
+
+    Months that only have rows in the default partition (appointments booked beyond the
+    premade range, or history after `convert`) get their own partition as they come in range.
+    """
+    if not await is_partitioned(conn):
+        logger.warning("appointments is not partitioned; run `python -m app.database.partitions convert`")
+        return []
+    # Serialises concurrent callers (API startup and worker maintenance) until commit
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('appointments_partitions'))"))
+    current = month_start(now or datetime.now(pytz.UTC))
+    horizon = add_months(current, settings.APPOINTMENT_PARTITION_PREMAKE_MONTHS + 1)
+    wanted = {add_months(current, offset) for offset in range(settings.APPOINTMENT_PARTITION_PREMAKE_MONTHS + 1)}
+    result = await conn.execute(
+        text(
+            f"SELECT DISTINCT date_trunc('month', appointment_time AT TIME ZONE 'UTC')::date "
+            f"FROM {DEFAULT_PARTITION} WHERE appointment_time < :horizon"
+        ),
+        {"horizon": _bounds(horizon)[0]},
+    )
+    wanted.update(month for (month,) in result)
+
+    existing = await attached_partitions(conn)
+    created = []
+    for month in sorted(wanted - existing.keys()):
+        await create_month_partition(conn, month)
+        created.append(partition_name(month))
+    return created
+
+# Archival
+
+def archive_path(name: str, archive_dir: str = settings.APPOINTMENT_ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, name + ARCHIVE_SUFFIX)
+
+def index_path(name: str, archive_dir: str = settings.APPOINTMENT_ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, name + INDEX_SUFFIX)
+
+def _index_key(column: str, value: str) -> str:
+    return f"{column}:{value}"
+
+def _replace_synced(tmp_path: str, path: str) -> None:
+    with open(tmp_path, "rb") as written:
+        os.fsync(written.fileno())
+    os.replace(tmp_path, path)
+
+async def _export_and_drop(engine: AsyncEngine, name: str, archive_dir: str) -> None:
+    """Write a detached partition to a gzipped CSV and its index (written aside, fsynced, renamed), then drop it"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = archive_path(name, archive_dir)
+    tmp_path = path + ".tmp"
+    async with engine.begin() as conn:
+        await conn.execute(text("SET LOCAL TIME ZONE 'UTC'"))
+        raw = await conn.get_raw_connection()
+        with gzip.open(tmp_path, "wb") as output:
+            # asyncpg hands writes to a file object off to the default executor
+            await raw.driver_connection.copy_from_table(
+                name, columns=_COLUMNS, output=output, format="csv", header=True
+            )
+
+        rows = (await conn.execute(text(f"SELECT count(*) FROM {name}"))).scalar_one()
+        index = BloomFilter(rows * len(INDEXED_COLUMNS), INDEX_ERROR_RATE)
+        result = await conn.stream(text(f"SELECT {', '.join(INDEXED_COLUMNS)} FROM {name}"))
+        async for row in result:
+            for column, value in zip(INDEXED_COLUMNS, row):
+                index.add(_index_key(column, value))
+        with open(index_path(name, archive_dir) + ".tmp", "wb") as output:
+            output.write(index.to_bytes())
+        # The index first: an archive without one is read in full, an index without an archive is ignored
+        _replace_synced(index_path(name, archive_dir) + ".tmp", index_path(name, archive_dir))
+        _replace_synced(tmp_path, path)
+        await conn.execute(text(f"DROP TABLE {name}"))
+    logger.info("Archived appointments partition %s to %s", name, path)
+
+async def archive_partitions(
+    engine: AsyncEngine, now: Optional[datetime] = None, archive_dir: str = settings.APPOINTMENT_ARCHIVE_DIR
+) -> List[str]:
+    """Detach months older than APPOINTMENT_RETENTION_MONTHS and move them to archive files"""
+    cutoff = add_months(month_start(now or datetime.now(pytz.UTC)), -settings.APPOINTMENT_RETENTION_MONTHS)
+    async with engine.begin() as conn:
+        if not await is_partitioned(conn):
+            return []
+        existing = await attached_partitions(conn)
+    for month, name in sorted(existing.items()):
+        if month < cutoff:
+            # Detaching locks the parent, so it gets its own short transaction
+            async with engine.begin() as conn:
+                await conn.execute(text(f"ALTER TABLE appointments DETACH PARTITION {name}"))
+            # Its rows are gone from appointment lists
+            await appointments_changed()
+
+    # Includes partitions detached by an earlier run that stopped before dropping them
+    async with engine.begin() as conn:
+        result = await conn.execute(text(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition "
+            "AND relname ~ '^appointments_p[0-9]{6}$'"
+        ))
+        detached = sorted(name for (name,) in result)
+    for name in detached:
+        await _export_and_drop(engine, name, archive_dir)
+    return detached
+
+async def run_maintenance(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await ensure_partitions(conn)
+    await archive_partitions(engine)
+
+# Reading archives
+
+def _parse_archived_row(row: Dict[str, str]) -> dict:
+    parsed: dict = {key: (value if value != "" else None) for key, value in row.items()}
+    for key in ("id", "change_seq", "change_xid", "vehicle_make_id", "vehicle_model_id"):
+        # Archives written before a column existed don't have it
+        if parsed.get(key) is not None:
+            parsed[key] = int(parsed[key])
+    for key in ("appointment_time", "created_at", "updated_at"):
+        if parsed[key] is not None:
+            parsed[key] = datetime.fromisoformat(parsed[key])
+    return parsed
+
+def _archive_may_match(name: str, filters: Dict[str, str], archive_dir: str) -> bool:
+    indexed = [(column, filters[column]) for column in INDEXED_COLUMNS if column in filters]
+    if not indexed:
+        return True
+    try:
+        with open(index_path(name, archive_dir), "rb") as index_file:
+            index = BloomFilter.from_bytes(index_file.read())
+    except FileNotFoundError:
+        return True  # Archived before indexes were written
+    except ValueError as e:
+        logger.warning("Ignoring unreadable index of archive %s: %s", name, e)
+        return True
+    return all(_index_key(column, value) in index for column, value in indexed)
+
+def read_archived_appointments(
+    filters: Dict[str, str],
+    archive_dir: str = settings.APPOINTMENT_ARCHIVE_DIR,
+    limit: Optional[int] = None,
+    before: Optional[Tuple[datetime, int]] = None,
+) -> List[dict]:
+    """Archived appointments whose columns equal every value in `filters`, latest first (blocking).
+
+    Months are read newest first and only until `limit` rows are found; with `before`, an
+    (appointment_time, id) key, only rows ordered after it are returned and later months
+    aren't read. Archives whose index rules out an email or phone_number filter are skipped.
+    """
+    if not os.path.isdir(archive_dir):
+        return []
+    archives = []
+    for filename in os.listdir(archive_dir):
+        if filename.endswith(ARCHIVE_SUFFIX):
+            name = filename[:-len(ARCHIVE_SUFFIX)]
+            month = partition_month(name)
+            if month is not None:
+                archives.append((month, name))
+
+    matches: List[dict] = []
+    for month, name in sorted(archives, reverse=True):
+        if limit is not None and len(matches) >= limit:
+            break
+        if before is not None and _bounds(month)[0] > before[0]:
+            continue
+        if not _archive_may_match(name, filters, archive_dir):
+            continue
+        month_matches = []
+        with gzip.open(archive_path(name, archive_dir), "rt", newline="") as archive:
+            for row in csv.DictReader(archive):
+                if all(row.get(key) == value for key, value in filters.items()):
+                    parsed = _parse_archived_row(row)
+                    if before is None or (parsed["appointment_time"], parsed["id"]) < before:
+                        month_matches.append(parsed)
+        month_matches.sort(key=lambda row: (row["appointment_time"], row["id"]), reverse=True)
+        matches.extend(month_matches)
+    return matches[:limit] if limit is not None else matches
+
+# Converting an existing unpartitioned table
+
+CONVERT_STATEMENTS = [
+    "LOCK TABLE appointments IN ACCESS EXCLUSIVE MODE",
+    # The new parent's trigger is cloned onto the table when it is attached
+    "DROP TRIGGER IF EXISTS appointments_touch ON appointments",
+    f"ALTER TABLE appointments RENAME TO {DEFAULT_PARTITION}",
+    "ALTER INDEX appointments_pkey RENAME TO appointments_default_pkey",
+    "ALTER INDEX IF EXISTS ix_appointments_id RENAME TO appointments_default_id_idx",
+    "ALTER INDEX IF EXISTS ix_appointments_change_seq RENAME TO appointments_default_change_seq_idx",
+    "ALTER INDEX IF EXISTS ix_appointments_change_xid RENAME TO appointments_default_change_xid_idx",
+    "ALTER INDEX IF EXISTS uq_appointments_held_slot RENAME TO appointments_default_held_slot_idx",
+    "ALTER INDEX IF EXISTS ix_appointments_search_trgm RENAME TO appointments_default_search_trgm_idx",
+    "ALTER SEQUENCE appointments_id_seq RENAME TO appointments_default_id_seq",
+]
+
+async def convert_to_partitioned(engine: AsyncEngine) -> None:
+    """Turn an unpartitioned appointments table into the default partition of a new partitioned one.
+
+    Rows are then moved into monthly partitions. Runs in one transaction and blocks the
+    table throughout, so run it during a maintenance window.
+    """
+    async with engine.begin() as conn:
+        if await is_partitioned(conn):
+            logger.info("appointments is already partitioned")
+            return
+        for statement in CONVERT_STATEMENTS:
+            await conn.execute(text(statement))
+        # The default partition already exists, so the create hook is a no-op
+        await conn.run_sync(lambda sync_conn: Appointment.__table__.create(sync_conn, checkfirst=True))
+        await conn.execute(text(
+            f"SELECT setval('appointments_id_seq', COALESCE((SELECT max(id) FROM {DEFAULT_PARTITION}), 0) + 1, false)"
+        ))
+        await conn.execute(text(f"ALTER TABLE appointments ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+        created = await ensure_partitions(conn)
+    logger.info("Converted appointments to a partitioned table with %s monthly partitions", len(created))
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.database.partitions", description="Manage appointments table partitions"
+    )
+    parser.add_argument(
+        "command", choices=["maintain", "convert"],
+        help="maintain: create upcoming partitions and archive old ones; convert: partition an existing table"
+    )
+    args = parser.parse_args(argv)
+    setup_logging()
+    from .base import engine
+
+    async def run() -> None:
+        try:
+            if args.command == "convert":
+                await convert_to_partitioned(engine)
+            else:
+                await run_maintenance(engine)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
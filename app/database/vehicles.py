@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Tuple
+
+from sqlalchemy import Table, and_, bindparam, func, or_, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..models.appointment import Appointment
+from ..models.user import User
+from ..utils.config import get_settings
+from ..utils.etag import appointments_changed
+from ..utils.appointment_cache import appointment_cache
+from ..utils.log import setup_logging
+from ..utils.vehicle_catalog import clean_vehicle_name, normalize_vehicle_name, vehicle_catalog
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Table -> columns identifying a row (the appointments partition key helps prune)
+BACKFILL_TABLES: Dict[str, Tuple[Table, Tuple[str, ...]]] = {
+    "users": (User.__table__, ("id",)),
+    "appointments": (Appointment.__table__, ("id", "appointment_time")),
+}
+
+async def seed_catalog(engine: AsyncEngine) -> None:
+    """Add every make and model in use to the catalog, spelled the way most rows spell it"""
+    in_use = union_all(*[
+        select(table.c.vehicle_make, table.c.vehicle_model, func.count().label("rows"))
+        .where(table.c.vehicle_make.is_not(None))
+        .group_by(table.c.vehicle_make, table.c.vehicle_model)
+        for table, _ in BACKFILL_TABLES.values()
+    ])
+    make_spellings: Dict[str, Counter] = defaultdict(Counter)
+    model_spellings: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+    async with engine.connect() as conn:
+        for make, model, rows in await conn.execute(in_use):
+            if not make.strip():
+                continue
+            make_key = normalize_vehicle_name(make)
+            make_spellings[make_key][clean_vehicle_name(make)] += rows
+            if model and model.strip():
+                model_spellings[(make_key, normalize_vehicle_name(model))][clean_vehicle_name(model)] += rows
+
+    makes = {}
+    for make_key, spellings in make_spellings.items():
+        makes[make_key] = await vehicle_catalog.resolve_make(spellings.most_common(1)[0][0])
+    for (make_key, _), spellings in model_spellings.items():
+        await vehicle_catalog.resolve_model(makes[make_key].id, spellings.most_common(1)[0][0])
+    logger.info("Vehicle catalog covers %s makes and %s models in use", len(make_spellings), len(model_spellings))
+
+async def backfill_table(
+    engine: AsyncEngine, name: str, batch_size: int = settings.VEHICLE_BACKFILL_BATCH_SIZE
+) -> int:
+    """Point rows missing catalog ids at the catalog and respell their make and model, in batches.
+
+    Each batch is read and written in short transactions of its own, so the backfill can run
+    alongside normal traffic and be interrupted and restarted at any point.
+    """
+    table, keys = BACKFILL_TABLES[name]
+    matches_row = [table.c[key] == bindparam(f"b_{key}") for key in keys]
+    # Written before the catalog existed, or by public writes naming a make or model it lacked
+    unresolved = or_(
+        table.c.vehicle_make_id.is_(None),
+        and_(table.c.vehicle_model_id.is_(None), func.trim(table.c.vehicle_model) != ""),
+    )
+    statement = (
+        update(table)
+        .where(*matches_row, unresolved)
+        .values(
+            vehicle_make=bindparam("b_make"),
+            vehicle_model=bindparam("b_model"),
+            vehicle_make_id=bindparam("b_make_id"),
+            vehicle_model_id=bindparam("b_model_id"),
+        )
+    )
+    last_id = 0
+    updated = 0
+    while True:
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                select(*[table.c[key] for key in keys], table.c.vehicle_make, table.c.vehicle_model)
+                .where(table.c.id > last_id, unresolved, table.c.vehicle_make.is_not(None))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            vehicle = await vehicle_catalog.resolve(row.vehicle_make, row.vehicle_model, create=True)
+            if vehicle.make_id is None:
+                continue
+            values = {f"b_{key}": getattr(row, key) for key in keys}
+            values.update(
+                b_make=vehicle.make, b_model=vehicle.model, b_make_id=vehicle.make_id, b_model_id=vehicle.model_id
+            )
+            params.append(values)
+        if params:
+            async with engine.begin() as conn:
+                await conn.execute(statement, params)
+            if name == "appointments":
+                changed_ids = [values["b_id"] for values in params]
+                await appointment_cache.refresh(changed_ids)
+                await appointments_changed(changed_ids)
+        last_id = rows[-1].id
+        updated += len(params)
+        logger.info("Normalized vehicles on %s %s (through id %s)", updated, name, last_id)
+    return updated
+
+async def backfill(engine: AsyncEngine, batch_size: int = settings.VEHICLE_BACKFILL_BATCH_SIZE) -> None:
+    await vehicle_catalog.load()
+    await seed_catalog(engine)
+    for name in BACKFILL_TABLES:
+        await backfill_table(engine, name, batch_size)
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.database.vehicles", description="Manage the vehicle catalog")
+    parser.add_argument(
+        "command", choices=["backfill"],
+        help="backfill: add makes and models in use to the catalog and normalize existing rows"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.VEHICLE_BACKFILL_BATCH_SIZE,
+        help="rows updated per transaction (default: VEHICLE_BACKFILL_BATCH_SIZE)"
+    )
+    args = parser.parse_args(argv)
+    setup_logging()
+    from .base import engine
+
+    async def run() -> None:
+        try:
+            await backfill(engine, args.batch_size)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
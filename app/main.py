@@ -1,14 +1,63 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import text
 from .database.base import Base, engine
-from .routers import auth, appointments
-from .models import user, appointment  # Import all models to ensure table creation
-from .utils.cache import init_redis, redis_client
+from .database.partitions import ensure_partitions
+from .database.bulk import password_pool
+from .routers import auth, appointments, admin, health, vehicles
+from .models import user, appointment, vehicle  # Import all models to ensure table creation
+from .utils.cache import init_redis, redis_client, redis_bytes_client
+from .utils.compression import CompressionMiddleware
+from .utils.profiler import ProfilerMiddleware, profiler
+from .utils.loop_monitor import loop_monitor
+from .utils.spool import appointment_spool
+from .utils.queue import AppointmentQueue
+from .utils.rate_limit import init_rate_limiter
+from .utils.events import status_broadcaster
+from .utils.auth import user_cache_invalidator, configure_password_hashing
+from .utils.registered_emails import registered_emails
+from .utils.vehicle_catalog import vehicle_catalog
+from .utils.appointment_cache import appointment_cache
+from .utils.log import setup_logging, RequestIdMiddleware
+
+# Non-blocking structured logging for everything in the API process
+setup_logging()
+
+def create_trigger_if_missing(name: str, table: str, create_statement: str) -> str:
+    # Skips the lock CREATE TRIGGER takes when the trigger is already there
+    return (
+        f"DO $$ BEGIN IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{name}' "
+        f"AND tgrelid = '{table}'::regclass) THEN {create_statement}; END IF; END $$"
+    )
+
+# Columns added since the initial schema; create_all only creates missing tables
+SCHEMA_UPGRADES = [
+    "CREATE SEQUENCE IF NOT EXISTS appointments_change_seq",
+    "ALTER TABLE appointments ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT nextval('appointments_change_seq')",
+    "CREATE INDEX IF NOT EXISTS ix_appointments_change_seq ON appointments (change_seq)",
+    f"ALTER TABLE appointments ADD COLUMN IF NOT EXISTS change_xid BIGINT NOT NULL DEFAULT ({appointment.CURRENT_XID})",
+    "CREATE INDEX IF NOT EXISTS ix_appointments_change_xid ON appointments (change_xid, change_seq)",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_appointments_search_trgm ON appointments USING gin "
+    "((problem_description || ' ' || vehicle_year || ' ' || vehicle_make || ' ' || vehicle_model) gin_trgm_ops)",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS vehicle_make_id INTEGER REFERENCES vehicle_makes (id)",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS vehicle_model_id INTEGER REFERENCES vehicle_models (id)",
+    "ALTER TABLE appointments ADD COLUMN IF NOT EXISTS vehicle_make_id INTEGER REFERENCES vehicle_makes (id)",
+    "ALTER TABLE appointments ADD COLUMN IF NOT EXISTS vehicle_model_id INTEGER REFERENCES vehicle_models (id)",
+    appointment.TOUCH_FUNCTION.statement,
+    create_trigger_if_missing("appointments_touch", "appointments", appointment.TOUCH_TRIGGER.statement),
+    user.TOUCH_FUNCTION.statement,
+    create_trigger_if_missing("users_touch", "users", user.TOUCH_TRIGGER.statement),
+]
 
 # Create database tables
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
+        await ensure_partitions(conn)
 
 app = FastAPI(title="HMLS API")
 
@@ -21,23 +70,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip (or brotli) for bodies of COMPRESSION_MIN_SIZE bytes and up
+app.add_middleware(CompressionMiddleware)
+
+# Route-scoped profiling sessions started from the admin API
+app.add_middleware(ProfilerMiddleware, profiler=profiler)
+
+# Bind X-Request-ID to every log record emitted while handling a request
+app.add_middleware(RequestIdMiddleware)
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     # Initialize database
     await create_tables()
+    # Pick the bcrypt cost for this CPU (a few sample hashes, off the loop)
+    await asyncio.to_thread(configure_password_hashing)
     # Initialize Redis and rate limiter
     await init_redis()
+    await init_rate_limiter()
+    # Open the local enqueue spool and replay anything left from a previous run
+    await appointment_spool.start(AppointmentQueue(redis_client))
+    # One shared pub/sub subscriber for appointment status waiters
+    status_broadcaster.start()
+    # Keeps cached user records in step with changes made by other processes
+    user_cache_invalidator.start()
+    # Built in the background; logins query the database until it is ready
+    registered_emails.start()
+    # Small enough to load before serving autocomplete
+    await vehicle_catalog.start()
+    # Preloads upcoming appointments (one process per round), then keeps them loaded
+    appointment_cache.start()
+    # Start measuring event loop lag
+    loop_monitor.start()
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
+    await loop_monitor.stop()
+    await registered_emails.stop()
+    await vehicle_catalog.stop()
+    await appointment_cache.stop()
+    password_pool.shutdown()
+    await user_cache_invalidator.stop()
+    await status_broadcaster.stop()
+    await appointment_spool.stop()
     # Close Redis connection
     await redis_client.close()
+    await redis_bytes_client.close()
 
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(appointments.router, prefix="/appointments", tags=["appointments"])
+app.include_router(vehicles.router, prefix="/vehicles", tags=["vehicles"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
+app.include_router(health.router, tags=["health"])
 
 @app.get("/")
 async def read_root():
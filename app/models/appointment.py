@@ -1,19 +1,106 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, ForeignKey, Index, Sequence, DDL, FetchedValue, event, literal_column, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database.base import Base
+from .vehicle import VehicleMake, VehicleModel
+
+# Bumped on every insert and update
+appointment_change_seq = Sequence("appointments_change_seq")
+
+# 64-bit id of the transaction writing a row (never wraps); with change_seq, orders the change feed
+CURRENT_XID = "pg_current_xact_id()::text::bigint"
+
+# Stamps every UPDATE, whichever code path (or SQL session) issues it
+TOUCH_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION appointments_touch() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    NEW.change_seq := nextval('appointments_change_seq');
+    NEW.change_xid := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""")
+TOUCH_TRIGGER = DDL(
+    "CREATE TRIGGER appointments_touch BEFORE UPDATE ON appointments "
+    "FOR EACH ROW EXECUTE FUNCTION appointments_touch()"
+)
 
 class Appointment(Base):
     __tablename__ = "appointments"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # The partition key has to be part of the primary key
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     email = Column(String, nullable=False)
     phone_number = Column(String, nullable=False)
-    appointment_time = Column(DateTime(timezone=True), nullable=False)
+    appointment_time = Column(DateTime(timezone=True), primary_key=True)
     vehicle_year = Column(String, nullable=False)
     vehicle_make = Column(String, nullable=False)
     vehicle_model = Column(String, nullable=False)
+    # Catalog entries for the make and model (names above are their canonical spelling)
+    vehicle_make_id = Column(Integer, ForeignKey(VehicleMake.id), nullable=True)
+    vehicle_model_id = Column(Integer, ForeignKey(VehicleModel.id), nullable=True)
     problem_description = Column(Text, nullable=False)
     status = Column(String, default="pending")  # pending, confirmed, completed, cancelled
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now()) 
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_onupdate=FetchedValue())  # Set by appointments_touch
+    change_seq = Column(
+        BigInteger,
+        appointment_change_seq,
+        server_default=appointment_change_seq.next_value(),
+        server_onupdate=FetchedValue(),  # Set by appointments_touch
+        nullable=False,
+        index=True,
+    )
+    change_xid = Column(
+        BigInteger,
+        server_default=text(CURRENT_XID),
+        server_onupdate=FetchedValue(),  # Set by appointments_touch
+        nullable=False,
+    )
+
+    __table_args__ = (
+        # One confirmed (or completed) appointment per slot; backs the worker's in-memory conflict checks
+        Index(
+            "uq_appointments_held_slot",
+            "appointment_time",
+            unique=True,
+            postgresql_where=status.in_(["confirmed", "completed"]),
+        ),
+        # Change feed order
+        Index("ix_appointments_change_xid", "change_xid", "change_seq"),
+        # Monthly partitions are managed by database.partitions
+        {"postgresql_partition_by": "RANGE (appointment_time)"},
+    )
+
+    # ORM inserts and updates read back the trigger-set columns with RETURNING, so a
+    # committed object can be cached as it is
+    __mapper_args__ = {"eager_defaults": True}
+
+# Text matched by appointment search. Queries must use this exact expression to hit the index,
+# so the separators are literals rather than bind parameters
+_space = literal_column("' '")
+search_document = (
+    Appointment.problem_description + _space + Appointment.vehicle_year + _space
+    + Appointment.vehicle_make + _space + Appointment.vehicle_model
+)
+
+Index(
+    "ix_appointments_search_trgm",
+    search_document.label("search_document"),
+    postgresql_using="gin",
+    postgresql_ops={"search_document": "gin_trgm_ops"},
+)
+
+# The search index needs trigram operators
+event.listen(Appointment.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+event.listen(Appointment.__table__, "after_create", TOUCH_FUNCTION)
+event.listen(Appointment.__table__, "after_create", TOUCH_TRIGGER)
+
+# Catches rows outside the monthly partitions, so inserts work before any exist
+event.listen(
+    Appointment.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS appointments_default PARTITION OF appointments DEFAULT"),
+)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, DDL, FetchedValue, event
 from sqlalchemy.sql import func
 from ..database.base import Base
+from .vehicle import VehicleMake, VehicleModel
 
 class User(Base):
     __tablename__ = "users"
@@ -17,7 +18,24 @@ class User(Base):
     vehicle_make = Column(String, nullable=True)
     vehicle_model = Column(String, nullable=True)
     vehicle_vin = Column(String, nullable=True)
+    # Catalog entries for the make and model (names above are their canonical spelling)
+    vehicle_make_id = Column(Integer, ForeignKey(VehicleMake.id), nullable=True)
+    vehicle_model_id = Column(Integer, ForeignKey(VehicleModel.id), nullable=True)
     
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now()) 
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_onupdate=FetchedValue())  # Set by users_touch
+
+# Stamps every UPDATE, whichever code path (or SQL session) issues it
+TOUCH_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION users_touch() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""")
+TOUCH_TRIGGER = DDL("CREATE TRIGGER users_touch BEFORE UPDATE ON users FOR EACH ROW EXECUTE FUNCTION users_touch()")
+
+event.listen(User.__table__, "after_create", TOUCH_FUNCTION)
+event.listen(User.__table__, "after_create", TOUCH_TRIGGER) 
\ No newline at end of file
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint
+from ..database.base import Base
+
+# Names are matched on `normalized_name` (see utils.vehicle_catalog.normalize_vehicle_name);
+# `name` is the spelling written back to users and appointments
+
+class VehicleMake(Base):
+    __tablename__ = "vehicle_makes"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    normalized_name = Column(String, nullable=False, unique=True)
+
+class VehicleModel(Base):
+    __tablename__ = "vehicle_models"
+
+    id = Column(Integer, primary_key=True)
+    make_id = Column(Integer, ForeignKey("vehicle_makes.id"), nullable=False)
+    name = Column(String, nullable=False)
+    normalized_name = Column(String, nullable=False)
+
+    __table_args__ = (UniqueConstraint("make_id", "normalized_name", name="uq_vehicle_models_make_name"),)
@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Literal, Optional
+import json
+
+from ..database.base import engine
+from ..database.bulk import import_records, iter_records, stream_export
+
+from ..utils.auth import require_admin
+from ..utils.cache import redis_client
+from ..utils.config import get_settings
+from ..utils.profiler import (
+    profiler,
+    ProfilerBusyError,
+    WORKER_PROFILE_REQUEST_KEY,
+    WORKER_PROFILE_RESULT_KEY,
+)
+
+settings = get_settings()
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_api(
+    seconds: float = Query(10, gt=0),
+    route: Optional[str] = None,
+    requests: Optional[int] = Query(None, gt=0)
+):
+    """Sample this API worker and return collapsed stacks.
+
+    Without `route`, profiles everything for `seconds`. With `route` and `requests`,
+    only samples taken while requests under that path prefix run are kept, and the
+    session ends after `requests` of them have completed (or `seconds` elapses).
+    """
+    if seconds > settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must not exceed {settings.PROFILER_MAX_SECONDS}"
+        )
+    if requests is not None and route is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="requests can only be used together with route"
+        )
+    try:
+        return await profiler.profile(seconds, route_prefix=route, max_requests=requests)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+@router.post("/profile/worker", status_code=status.HTTP_202_ACCEPTED)
+async def profile_worker(seconds: float = Query(10, gt=0)):
+    """Ask the appointment worker process to profile itself"""
+    if seconds > settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must not exceed {settings.PROFILER_MAX_SECONDS}"
+        )
+    await redis_client.delete(WORKER_PROFILE_RESULT_KEY)
+    await redis_client.set(WORKER_PROFILE_REQUEST_KEY, json.dumps({"seconds": seconds}))
+    return {"status": "requested", "seconds": seconds}
+
+@router.get("/profile/worker", response_class=PlainTextResponse)
+async def get_worker_profile():
+    """Fetch the collapsed stacks from the last worker profiling session"""
+    result = await redis_client.get(WORKER_PROFILE_RESULT_KEY)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No worker profile available yet"
+        )
+    return result
+
+@router.post("/import/{kind}")
+async def import_data(
+    kind: Literal["users", "appointments"],
+    request: Request,
+    format: Literal["csv", "ndjson"] = "csv"
+):
+    """Stream a CSV (with header) or NDJSON body into the table through COPY.
+
+    Users need a `password`, hashed across worker processes. Rows that would duplicate
+    an existing email or held slot are skipped; invalid rows are counted and reported.
+    """
+    return await import_records(engine, kind, iter_records(request.stream(), format))
+
+@router.get("/export/{kind}")
+async def export_data(kind: Literal["users", "appointments"]):
+    """Stream the table as CSV via COPY TO (password hashes are never exported)"""
+    return StreamingResponse(
+        stream_export(engine, kind),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{kind}.csv"'}
+    )
@@ -1,28 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, func, tuple_, BigInteger, Float, Text
 from sqlalchemy.future import select
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from pydantic import TypeAdapter
+from typing import List, Optional
 from datetime import datetime, timedelta
+import asyncio
+import base64
+import binascii
 import pytz
 import json
+import re
+import logging
+import redis.asyncio as redis
 
-from ..database.base import get_db
-from ..models.appointment import Appointment
-from ..schemas.appointment import AppointmentCreate, Appointment as AppointmentSchema, AppointmentUpdate
-from ..utils.cache import cache_response, clear_cached_data
+from ..database.base import get_db, AsyncSessionLocal
+from ..database.partitions import read_archived_appointments
+from ..models.appointment import Appointment, search_document
+from ..schemas.appointment import (
+    AppointmentCreate,
+    Appointment as AppointmentSchema,
+    AppointmentUpdate,
+    AppointmentChanges,
+    AppointmentSearchResult,
+    AppointmentSearchResults,
+    ArchivedAppointments,
+)
 from ..utils.queue import AppointmentQueue
 from ..utils.cache import redis_client
-from fastapi_limiter.depends import RateLimiter
+from ..utils.spool import appointment_spool
+from ..utils.admission import AdmissionController
+from ..utils.config import get_settings
+from ..utils.rate_limit import RateLimiter
+from ..utils.events import status_broadcaster, publish_status_change, RESYNC
+from ..utils.schedule import schedule_events, pending_events, confirmed_events
+from ..utils.vehicle_catalog import vehicle_catalog
+from ..utils.appointment_cache import appointment_cache
+from ..utils.etag import (
+    APPOINTMENTS_VERSION_KEY,
+    APPOINTMENT_VERSION_KEY,
+    appointments_changed,
+    coded_etag,
+    etag_matches,
+    not_modified,
+    read_stamp,
+    save_stamp,
+)
+from ..utils.compression import choose_encoding, precompressed_response, read_precompressed, save_precompressed
 
+settings = get_settings()
 router = APIRouter()
-appointment_queue = AppointmentQueue(redis_client)
+logger = logging.getLogger(__name__)
+appointment_queue = AppointmentQueue(redis_client, fallback=appointment_spool)
+admission_controller = AdmissionController(appointment_queue)
+# Serializes list responses the way the route's response_model would, for precompressed entries
+appointment_list_adapter = TypeAdapter(List[AppointmentSchema])
+
+# Statuses after which the worker will not change an appointment again
+TERMINAL_STATUSES = {"confirmed", "completed", "cancelled"}
 
 @router.post("/", response_model=dict)
 async def create_appointment(
     appointment: AppointmentCreate,
     db: AsyncSession = Depends(get_db),
-    rate_limit: bool = Depends(RateLimiter(times=100, seconds=60))
+    rate_limit: None = Depends(RateLimiter("appointments:create"))
 ):
     # Validate appointment time is in the future
     current_time = datetime.now(pytz.UTC)
@@ -32,9 +75,29 @@ async def create_appointment(
             detail="Appointment time must be in the future"
         )
     
+    # Shed load before writing anything when the worker can't keep up
+    admission = None
+    if settings.ADMISSION_ENABLED:
+        admission = await admission_controller.check()
+        if not admission.admitted:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Appointment queue is saturated, please retry later",
+                headers={"Retry-After": str(admission.retry_after)}
+            )
+    
     # Queue the appointment request
     appointment_data = appointment.model_dump()
     try:
+        # Stored with the catalog's spelling of the make and model
+        vehicle = await vehicle_catalog.resolve(appointment.vehicle_make, appointment.vehicle_model)
+        appointment_data.update(
+            vehicle_make=vehicle.make,
+            vehicle_model=vehicle.model,
+            vehicle_make_id=vehicle.make_id,
+            vehicle_model_id=vehicle.model_id,
+        )
+        
         # Create appointment in database first
         db_appointment = Appointment(
             email=appointment_data["email"],
@@ -43,12 +106,15 @@ async def create_appointment(
             vehicle_year=appointment_data["vehicle_year"],
             vehicle_make=appointment_data["vehicle_make"],
             vehicle_model=appointment_data["vehicle_model"],
+            vehicle_make_id=appointment_data["vehicle_make_id"],
+            vehicle_model_id=appointment_data["vehicle_model_id"],
             problem_description=appointment_data["problem_description"],
             status="pending"
         )
         db.add(db_appointment)
         await db.commit()
         await db.refresh(db_appointment)
+        await appointment_cache.put([db_appointment])
         
         # Add appointment ID to the data before queuing
         appointment_data["id"] = db_appointment.id
@@ -56,40 +122,278 @@ async def create_appointment(
         # Queue the appointment for processing
         queue_response = await appointment_queue.enqueue_appointment(appointment_data)
         queue_response["id"] = db_appointment.id
+        await appointments_changed([db_appointment.id])
+        await schedule_events(redis_client, pending_events(db_appointment.id, db_appointment.appointment_time))
+        if admission is not None and admission.projected_wait is not None:
+            queue_response["projected_wait_seconds"] = round(admission.projected_wait, 1)
+            queue_response["estimated_confirmation_at"] = admission.estimated_confirmation_at().isoformat()
+        else:
+            queue_response["projected_wait_seconds"] = None
+            queue_response["estimated_confirmation_at"] = None
         return queue_response
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error creating appointment: %s", e)
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
+def appointment_etag(appointment) -> str:
+    # change_seq moves on every insert and update (with updated_at, see appointments_touch)
+    return f'"{appointment.id}.{appointment.change_seq}"'
+
+def appointment_list_etag(count: int, max_change_seq: Optional[int]) -> str:
+    # A row joining, leaving or changing within the filtered set moves the count or the max
+    return f'"list.{count}.{max_change_seq or 0}"'
+
 @router.get("/", response_model=List[AppointmentSchema])
 async def get_appointments(
+    response: Response,
     email: str = None,
     phone: str = None,
     status: str = None,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
-    rate_limit: bool = Depends(RateLimiter(times=100, seconds=60))
+    rate_limit: None = Depends(RateLimiter("appointments:list"))
 ):
+    """Appointments matching the filters, latest first.
+
+    Responses carry an ETag; a matching If-None-Match gets 304 from a Redis stamp or a
+    count query.
+    Compressed bodies of large lists are cached in Redis until the next change.
+    """
     query = select(Appointment)
+    filters = {}
     
     if email:
         query = query.where(Appointment.email == email)
+        filters["email"] = email
     if phone:
         query = query.where(Appointment.phone_number == phone)
+        filters["phone_number"] = phone
     if status:
         query = query.where(Appointment.status == status)
+        filters["status"] = status
+    
+    scope = "appointments:" + json.dumps(filters, sort_keys=True)
+    encoding = choose_encoding(accept_encoding)
+    if encoding is not None:
+        version, cached = await read_precompressed(scope, encoding, APPOINTMENTS_VERSION_KEY)
+        if cached is not None:
+            if etag_matches(if_none_match, cached.etag):
+                return not_modified(coded_etag(cached.etag, encoding))
+            return precompressed_response(cached.body, encoding, cached.etag)
+    
+    if if_none_match is not None:
+        stamp_version, etag = await read_stamp(scope, APPOINTMENTS_VERSION_KEY)
+        if etag is not None and etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        summary = query.with_only_columns(func.count(), func.max(Appointment.change_seq))
+        etag = appointment_list_etag(*(await db.execute(summary)).one())
+        await save_stamp(scope, stamp_version, etag)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
     
     result = await db.execute(query.order_by(Appointment.appointment_time.desc()))
-    return result.scalars().all()
+    appointments = list(result.scalars().all())
+    etag = appointment_list_etag(len(appointments), max((a.change_seq for a in appointments), default=None))
+    if encoding is not None:
+        body = appointment_list_adapter.dump_json(
+            appointment_list_adapter.validate_python(appointments, from_attributes=True)
+        )
+        if len(body) >= settings.COMPRESSION_MIN_SIZE:
+            # Compressed once here; later requests at the same version are served the cached bytes
+            compressed = await save_precompressed(scope, encoding, version, etag, body)
+            return precompressed_response(compressed, encoding, etag)
+    response.headers["ETag"] = etag
+    return appointments
+
+def _encode_archive_cursor(appointment_time: datetime, appointment_id: int) -> str:
+    payload = json.dumps([appointment_time.isoformat(), appointment_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+def _decode_archive_cursor(cursor: str):
+    try:
+        appointment_time, appointment_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(appointment_time), int(appointment_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+@router.get("/archived", response_model=ArchivedAppointments)
+async def get_archived_appointments(
+    email: Optional[str] = None,
+    phone: Optional[str] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.ARCHIVE_PAGE_SIZE, ge=1, le=settings.ARCHIVE_MAX_PAGE_SIZE),
+    rate_limit: None = Depends(RateLimiter("appointments:archived"))
+):
+    """Appointments from archived months (older than the retention period), latest first.
+
+    Needs `email` or `phone`: archives are indexed by both, so months that can't match are
+    not read. Pass `next_cursor` back as `cursor` for the next page.
+    """
+    if not email and not phone:
+        raise HTTPException(
+            status_code=400, detail="Archived appointments can only be searched by email or phone"
+        )
+    filters = {}
+    if email:
+        filters["email"] = email
+    if phone:
+        filters["phone_number"] = phone
+    if status:
+        filters["status"] = status
+    before = _decode_archive_cursor(cursor) if cursor else None
+    
+    rows = await asyncio.to_thread(
+        read_archived_appointments, filters, settings.APPOINTMENT_ARCHIVE_DIR, limit=limit + 1, before=before
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_archive_cursor(rows[-1]["appointment_time"], rows[-1]["id"])
+    return {"appointments": rows, "next_cursor": next_cursor}
+
+def _decode_change_token(token: str):
+    # "<writer xid>.<change_seq>" of the last change delivered; "0" starts from the beginning
+    if token == "0":
+        return 0, 0
+    try:
+        xid, seq = token.split(".")
+        return int(xid), int(seq)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid change token")
+
+@router.get("/changes", response_model=AppointmentChanges)
+async def get_appointment_changes(
+    since: str = Query("0"),
+    limit: int = Query(settings.CHANGE_FEED_PAGE_SIZE, ge=1, le=settings.CHANGE_FEED_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    rate_limit: None = Depends(RateLimiter("appointments:changes"))
+):
+    """Appointments created or updated after the `since` token, in commit-safe order.
+
+    Pass the returned `next_token` as `since` on the next poll. Changes are ordered by the
+    writing transaction's id, then change_seq, and a page only includes transactions older
+    than the oldest one still running: every change committed later has a higher
+    transaction id than the token, however long its transaction took, so none is skipped.
+    A long-running write transaction holds the feed back until it ends. Deleted
+    appointments are not reported.
+    """
+    after = _decode_change_token(since)
+    # Every transaction below this id has committed or aborted
+    horizon = func.pg_snapshot_xmin(func.pg_current_snapshot()).cast(Text).cast(BigInteger)
+    query = (
+        select(Appointment)
+        .where(
+            tuple_(Appointment.change_xid, Appointment.change_seq) > tuple_(*after),
+            Appointment.change_xid < horizon,
+        )
+        .order_by(Appointment.change_xid, Appointment.change_seq)
+        .limit(limit + 1)
+    )
+    result = await db.execute(query)
+    changes = list(result.scalars().all())
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    next_token = f"{changes[-1].change_xid}.{changes[-1].change_seq}" if changes else since
+    return {"changes": changes, "next_token": next_token, "has_more": has_more}
+
+def search_terms(q: str) -> List[str]:
+    terms = list(dict.fromkeys(re.findall(r"\w+", q.lower())))
+    return terms[:settings.SEARCH_MAX_TERMS]
+
+def _encode_cursor(rank: float, appointment_time: datetime, appointment_id: int) -> str:
+    payload = json.dumps([rank, appointment_time.isoformat(), appointment_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        rank, appointment_time, appointment_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), datetime.fromisoformat(appointment_time), int(appointment_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def search_query(terms: List[str], limit: int, after: Optional[tuple] = None):
+    """Best matches for every term first, optionally continuing after a (rank, time, id) key.
+
+    Terms match when their word similarity reaches the session's
+    pg_trgm.word_similarity_threshold.
+    """
+    similarities = [func.word_similarity(term, search_document, type_=Float) for term in terms]
+    rank = sum(similarities[1:], similarities[0]).label("rank")
+    query = select(*Appointment.__table__.columns, rank)
+    for term in terms:
+        # The operator form is what the trigram index serves
+        query = query.where(search_document.op("%>")(term))
+    if after is not None:
+        query = query.where(tuple_(rank, Appointment.appointment_time, Appointment.id) < tuple_(*after))
+    return query.order_by(rank.desc(), Appointment.appointment_time.desc(), Appointment.id.desc()).limit(limit)
+
+@router.get("/search", response_model=AppointmentSearchResults)
+async def search_appointments(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.SEARCH_PAGE_SIZE, ge=1, le=settings.SEARCH_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    rate_limit: None = Depends(RateLimiter("appointments:search"))
+):
+    """Appointments whose problem description and vehicle match every word of `q`, best first.
+
+    Words match fuzzily (pg_trgm word similarity of at least SEARCH_SIMILARITY_THRESHOLD)
+    through the trigram index, so "brake noise civic" also finds "Noisy brakes" on a Honda
+    Civic. Pass `next_cursor` back as `cursor` for the next page.
+    """
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Search query has no words")
+    
+    query = search_query(terms, limit + 1, _decode_cursor(cursor) if cursor else None)
+    
+    # Scoped to this transaction
+    await db.execute(
+        select(func.set_config("pg_trgm.word_similarity_threshold", str(settings.SEARCH_SIMILARITY_THRESHOLD), True))
+    )
+    rows = (await db.execute(query)).mappings().all()
+    results = [AppointmentSearchResult.model_validate(dict(row)) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = results[-1]
+        next_cursor = _encode_cursor(last.rank, last.appointment_time, last.id)
+    return {"results": results, "next_cursor": next_cursor}
 
 @router.get("/{appointment_id}", response_model=AppointmentSchema)
 async def get_appointment(
     appointment_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
-    rate_limit: bool = Depends(RateLimiter(times=100, seconds=60))
+    rate_limit: None = Depends(RateLimiter("appointments:get"))
 ):
+    """One appointment, with an ETag; a matching If-None-Match usually gets 304 without a query.
+
+    Served from the appointment cache when it holds the appointment.
+    """
+    cached = await appointment_cache.get(appointment_id)
+    if cached is not None:
+        etag = appointment_etag(cached)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return Response(content=cached.body, media_type="application/json", headers={"ETag": etag})
+    
+    version = None
+    if if_none_match is not None:
+        version, etag = await read_stamp(
+            f"appointment:{appointment_id}", APPOINTMENT_VERSION_KEY.format(appointment_id)
+        )
+        if etag is not None and etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    
     query = select(Appointment).where(Appointment.id == appointment_id)
     result = await db.execute(query)
     appointment = result.scalar_one_or_none()
@@ -99,14 +403,152 @@ async def get_appointment(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Appointment not found"
         )
+    await appointment_cache.put([appointment], source="read")
+    etag = appointment_etag(appointment)
+    await save_stamp(f"appointment:{appointment_id}", version, etag)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return appointment
 
+@router.get("/{appointment_id}/queue-status", response_model=dict)
+async def get_queue_status(
+    appointment_id: int,
+    rate_limit: None = Depends(RateLimiter("appointments:queue_status"))
+):
+    """Estimated place in the service order and an ETA from the worker's measured throughput.
+
+    `position` counts the requests its partition serves up to and including this one, weighing
+    the priority lanes as the workers do, so a request in a busy lane can see its position grow
+    when more urgent requests arrive. `queued: false` means the appointment is no longer
+    waiting (being processed, already processed, or unknown).
+    """
+    try:
+        queue_position = await appointment_queue.get_queue_position(appointment_id)
+    except redis.RedisError as e:
+        logger.warning("Redis error reading queue position: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service temporarily unavailable"
+        )
+    if queue_position is None:
+        return {
+            "id": appointment_id,
+            "queued": False,
+            "position": None,
+            "lane": None,
+            "eta_seconds": None,
+            "estimated_processing_at": None,
+        }
+
+    drain_rate = await admission_controller.drain_rate()
+    eta_seconds = queue_position.served_before / drain_rate if drain_rate > 0 else None
+    return {
+        "id": appointment_id,
+        "queued": True,
+        "position": queue_position.position,
+        "lane": queue_position.lane,
+        "eta_seconds": round(eta_seconds, 1) if eta_seconds is not None else None,
+        "estimated_processing_at": (
+            (datetime.now(pytz.UTC) + timedelta(seconds=eta_seconds)).isoformat()
+            if eta_seconds is not None else None
+        ),
+    }
+
+async def _read_status(appointment_id: int) -> Optional[str]:
+    """Read the current status with a short-lived session (no connection held while waiting)"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Appointment.status).where(Appointment.id == appointment_id))
+        return result.scalar_one_or_none()
+
+def _sse_event(appointment_id: int, appointment_status: str) -> str:
+    return f"event: status\ndata: {json.dumps({'id': appointment_id, 'status': appointment_status})}\n\n"
+
+async def _stream_status(request: Request, appointment_id: int, last_status: Optional[str]):
+    """Server-Sent Events stream of status changes until a terminal status or max duration"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.EVENTS_SSE_MAX_SECONDS
+    async with status_broadcaster.subscribe(appointment_id) as events:
+        yield f"retry: {settings.EVENTS_SSE_RETRY_MS}\n\n"
+        # Re-read after subscribing so a change between the first read and now isn't lost
+        current = await _read_status(appointment_id)
+        while current is not None:
+            if current != last_status:
+                yield _sse_event(appointment_id, current)
+                last_status = current
+            if current in TERMINAL_STATUSES or loop.time() >= deadline:
+                return
+            try:
+                current = await asyncio.wait_for(
+                    events.get(), timeout=min(settings.EVENTS_HEARTBEAT_SECONDS, deadline - loop.time())
+                )
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                current = last_status
+                continue
+            if current is RESYNC:
+                current = await _read_status(appointment_id)
+
+@router.get("/{appointment_id}/events")
+async def appointment_events(
+    appointment_id: int,
+    request: Request,
+    last_status: Optional[str] = Query(None, alias="status"),
+    timeout: float = Query(settings.EVENTS_LONG_POLL_TIMEOUT, gt=0, le=settings.EVENTS_LONG_POLL_MAX),
+    db: AsyncSession = Depends(get_db),
+    rate_limit: None = Depends(RateLimiter("appointments:events"))
+):
+    """Wait for an appointment's status to change.
+
+    With `Accept: text/event-stream` this streams Server-Sent Events. Otherwise it long-polls:
+    it returns as soon as the status differs from `status` (the client's last known value),
+    or after `timeout` seconds with `changed: false`.
+    """
+    if "text/event-stream" in request.headers.get("accept", ""):
+        result = await db.execute(select(Appointment.id).where(Appointment.id == appointment_id))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Appointment not found"
+            )
+        return StreamingResponse(
+            _stream_status(request, appointment_id, last_status),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    async with status_broadcaster.subscribe(appointment_id) as events:
+        result = await db.execute(select(Appointment.status).where(Appointment.id == appointment_id))
+        current = result.scalar_one_or_none()
+        # Give the pooled connection back before parking the request
+        await db.close()
+        if current is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Appointment not found"
+            )
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while current == last_status or (last_status is None and current not in TERMINAL_STATUSES):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return {"id": appointment_id, "status": current, "changed": False}
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return {"id": appointment_id, "status": current, "changed": False}
+            current = await _read_status(appointment_id) if event is RESYNC else event
+        return {"id": appointment_id, "status": current, "changed": True}
+
 @router.put("/{appointment_id}", response_model=AppointmentSchema)
 async def update_appointment_status(
     appointment_id: int,
     update_data: AppointmentUpdate,
     db: AsyncSession = Depends(get_db),
-    rate_limit: bool = Depends(RateLimiter(times=50, seconds=60))
+    rate_limit: None = Depends(RateLimiter("appointments:update"))
 ):
     # Check if appointment exists
     query = select(Appointment).where(Appointment.id == appointment_id)
@@ -126,24 +568,40 @@ async def update_appointment_status(
             detail=f"Invalid status. Must be one of: {', '.join(valid_statuses)}"
         )
     
-    # Update appointment status
-    stmt = update(Appointment).where(Appointment.id == appointment_id).values(status=update_data.status)
-    await db.execute(stmt)
-    await db.commit()
+    appointment_time = appointment.appointment_time
     
-    # Clear cached data
-    await clear_cached_data(f"get_appointment:{appointment_id}")
-    await clear_cached_data("get_appointments")
+    # Update appointment status, reading back the row with the trigger-set updated_at and change_seq
+    stmt = (
+        update(Appointment)
+        .where(Appointment.id == appointment_id)
+        .values(status=update_data.status)
+        .returning(Appointment)
+        .execution_options(populate_existing=True)
+    )
+    try:
+        appointment = (await db.execute(stmt)).scalar_one()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Time slot is already taken"
+        )
+    # Cached before the status event goes out, so woken clients read the new row
+    await appointment_cache.put([appointment])
+    await publish_status_change(appointment_id, update_data.status)
+    if update_data.status == "confirmed":
+        await schedule_events(redis_client, confirmed_events(appointment_id, appointment_time))
+    elif update_data.status == "pending":
+        await schedule_events(redis_client, pending_events(appointment_id, appointment_time))
     
-    # Refresh and return updated appointment
-    result = await db.execute(query)
-    return result.scalar_one()
+    return appointment
 
 @router.delete("/{appointment_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def cancel_appointment(
     appointment_id: int,
     db: AsyncSession = Depends(get_db),
-    rate_limit: bool = Depends(RateLimiter(times=50, seconds=60))
+    rate_limit: None = Depends(RateLimiter("appointments:cancel"))
 ):
     # Check if appointment exists
     query = select(Appointment).where(Appointment.id == appointment_id)
@@ -157,12 +615,16 @@ async def cancel_appointment(
         )
     
     # Update status to cancelled
-    stmt = update(Appointment).where(Appointment.id == appointment_id).values(status="cancelled")
-    await db.execute(stmt)
+    stmt = (
+        update(Appointment)
+        .where(Appointment.id == appointment_id)
+        .values(status="cancelled")
+        .returning(Appointment)
+        .execution_options(populate_existing=True)
+    )
+    appointment = (await db.execute(stmt)).scalar_one()
     await db.commit()
-    
-    # Clear cached data
-    await clear_cached_data(f"get_appointment:{appointment_id}")
-    await clear_cached_data("get_appointments")
+    await appointment_cache.put([appointment])
+    await publish_status_change(appointment_id, "cancelled")
     
     return None 
\ No newline at end of file
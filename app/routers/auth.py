@@ -1,20 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import timedelta, datetime, timezone
 from typing import Any
 import asyncio
+import logging
 
 from ..database.base import get_db
 from ..models.user import User
 from ..schemas.user import UserCreate, Token, User as UserSchema
-from ..utils.auth import verify_password, get_password_hash, create_access_token
+from ..utils.auth import (
+    verify_password,
+    get_password_hash,
+    dummy_verify_password,
+    create_access_token,
+    get_current_user,
+    invalidate_user,
+    schedule_rehash_if_needed,
+)
+from ..utils.registered_emails import registered_emails
+from ..utils.vehicle_catalog import vehicle_catalog
 from ..utils.config import get_settings
 
 settings = get_settings()
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
+logger = logging.getLogger(__name__)
 
 # Create a semaphore to limit concurrent database operations
 db_semaphore = asyncio.Semaphore(settings.DB_POOL_SIZE)
@@ -22,47 +34,66 @@ db_semaphore = asyncio.Semaphore(settings.DB_POOL_SIZE)
 @router.post("/register", response_model=UserSchema)
 async def register(user: UserCreate, db: AsyncSession = Depends(get_db)) -> Any:
     async with db_semaphore:
-        # Check if user exists
-        query = select(User).where(User.email == user.email)
-        result = await db.execute(query)
-        db_user = result.scalar_one_or_none()
-        
-        if db_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
-            )
-        
         try:
-            # Create new user
-            hashed_password = get_password_hash(user.password)
-            db_user = User(
-                email=user.email,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                phone_number=user.phone_number,
-                hashed_password=hashed_password,
-                vehicle_year=user.vehicle_year,
-                vehicle_make=user.vehicle_make,
-                vehicle_model=user.vehicle_model,
-                vehicle_vin=user.vehicle_vin
+            # One statement: a concurrent duplicate loses on the unique email index instead of raising
+            hashed_password = await asyncio.to_thread(get_password_hash, user.password)
+            vehicle = await vehicle_catalog.resolve(user.vehicle_make, user.vehicle_model)
+            stmt = (
+                pg_insert(User)
+                .values(
+                    email=user.email,
+                    first_name=user.first_name,
+                    last_name=user.last_name,
+                    phone_number=user.phone_number,
+                    hashed_password=hashed_password,
+                    vehicle_year=user.vehicle_year,
+                    vehicle_make=vehicle.make,
+                    vehicle_model=vehicle.model,
+                    vehicle_make_id=vehicle.make_id,
+                    vehicle_model_id=vehicle.model_id,
+                    vehicle_vin=user.vehicle_vin
+                )
+                .on_conflict_do_nothing(index_elements=[User.email])
+                .returning(User)
             )
-            db.add(db_user)
+            result = await db.execute(stmt)
+            db_user = result.scalar_one_or_none()
+            
+            if db_user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Email already registered"
+                )
             await db.commit()
-            await db.refresh(db_user)
-            return db_user
+        except HTTPException:
+            raise
         except Exception as e:
+            logger.exception("Error registering user: %s", e)
             await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=str(e)
             )
+    
+    await registered_emails.record_registration(db_user.email)
+    await invalidate_user(db_user.email)
+    return db_user
 
 @router.post("/token", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ) -> Any:
+    # Emails that were certainly never registered are turned away without a query. Password
+    # checks (real or dummy) run in a thread: bcrypt takes tens of milliseconds of CPU
+    if not await registered_emails.might_exist(form_data.username):
+        await asyncio.to_thread(dummy_verify_password)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
     async with db_semaphore:
         try:
             query = select(User).where(User.email == form_data.username)
@@ -70,18 +101,20 @@ async def login(
             user = result.scalar_one_or_none()
             
             if not user:
+                await asyncio.to_thread(dummy_verify_password)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Incorrect email or password",
                     headers={"WWW-Authenticate": "Bearer"},
                 )
             
-            if not verify_password(form_data.password, user.hashed_password):
+            if not await asyncio.to_thread(verify_password, form_data.password, user.hashed_password):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Incorrect email or password",
                     headers={"WWW-Authenticate": "Bearer"},
                 )
+            schedule_rehash_if_needed(user.id, user.email, form_data.password, user.hashed_password)
             
             access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
             access_token = create_access_token(
@@ -91,8 +124,13 @@ async def login(
         except HTTPException:
             raise
         except Exception as e:
+            logger.exception("Error during login: %s", e)
             await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=str(e)
-            ) 
\ No newline at end of file
+            )
+
+@router.get("/me", response_model=UserSchema)
+async def read_current_user(current_user: UserSchema = Depends(get_current_user)) -> Any:
+    return current_user
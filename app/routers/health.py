@@ -0,0 +1,141 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
+from typing import Optional
+import asyncio
+import logging
+import time
+
+from ..database.base import engine
+from ..utils.cache import redis_client
+from ..utils.config import get_settings
+from ..utils.loop_monitor import loop_monitor
+from ..utils.metrics import registry
+from ..utils.queue import AppointmentQueue
+
+settings = get_settings()
+router = APIRouter()
+logger = logging.getLogger(__name__)
+appointment_queue = AppointmentQueue(redis_client)
+
+class ReadinessCache:
+    """Caches the deep readiness result for a short TTL and shares one in-flight check"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.result: Optional[dict] = None
+        self.checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def fresh(self) -> bool:
+        return self.result is not None and time.monotonic() - self.checked_at < self.ttl
+
+    async def get(self) -> dict:
+        if self.fresh():
+            return self.result
+        async with self._lock:
+            # Another probe may have refreshed the result while we waited
+            if not self.fresh():
+                self.result = await run_readiness_checks()
+                self.checked_at = time.monotonic()
+            return self.result
+
+readiness_cache = ReadinessCache(settings.HEALTH_CHECK_CACHE_TTL)
+
+async def _timed(check) -> dict:
+    start = time.perf_counter()
+    try:
+        detail = await asyncio.wait_for(check(), timeout=settings.HEALTH_CHECK_TIMEOUT)
+        result = {"ok": True}
+        if detail:
+            result.update(detail)
+    except Exception as e:
+        result = {"ok": False, "error": str(e) or type(e).__name__}
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+async def _check_database():
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+async def _check_redis():
+    await redis_client.ping()
+
+async def _check_queue():
+    depth = await appointment_queue.get_queue_length()
+    if depth > settings.READY_MAX_QUEUE_DEPTH:
+        raise RuntimeError(f"queue depth {depth} exceeds {settings.READY_MAX_QUEUE_DEPTH}")
+    return {"depth": depth}
+
+async def run_readiness_checks() -> dict:
+    """Run the dependency checks concurrently"""
+    database, redis_check, queue = await asyncio.gather(
+        _timed(_check_database), _timed(_check_redis), _timed(_check_queue)
+    )
+    lag = loop_monitor.max_recent_lag
+    checks = {
+        "database": database,
+        "redis": redis_check,
+        "queue": queue,
+        "loop_lag": {
+            "ok": lag <= settings.READY_MAX_LOOP_LAG,
+            "max_recent_seconds": round(lag, 4),
+        },
+    }
+    return {
+        "status": "ok" if all(check["ok"] for check in checks.values()) else "unavailable",
+        "checks": checks,
+    }
+
+@router.get("/healthz")
+async def liveness():
+    """Cheap liveness probe: succeeds whenever the event loop is responsive"""
+    stalled_for = loop_monitor.seconds_since_last_tick()
+    body = {
+        "status": "ok",
+        "loop_lag_seconds": round(loop_monitor.current_lag, 4),
+    }
+    if stalled_for > settings.LIVENESS_MAX_LOOP_STALL:
+        body["status"] = "stalled"
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@router.get("/readyz")
+async def readiness():
+    """Deep readiness probe, cached for HEALTH_CHECK_CACHE_TTL seconds"""
+    result = await readiness_cache.get()
+    return JSONResponse(status_code=200 if result["status"] == "ok" else 503, content=result)
+
+queue_lane_depth = registry.gauge(
+    "appointment_queue_lane_depth",
+    "Appointment requests waiting in each priority lane, across all partitions",
+    ["lane"],
+)
+queue_lane_dequeued = registry.counter(
+    "appointment_queue_lane_dequeued_total",
+    "Appointment requests taken off each priority lane by the workers",
+    ["lane"],
+)
+queue_lane_wait = registry.counter(
+    "appointment_queue_lane_wait_seconds_total",
+    "Total seconds requests in each priority lane waited before a worker took them",
+    ["lane"],
+)
+
+async def _refresh_queue_metrics() -> None:
+    """Copy the shared per-lane counters from Redis; mean wait is rate(wait) / rate(dequeued)"""
+    try:
+        stats = await asyncio.wait_for(appointment_queue.get_lane_stats(), timeout=settings.HEALTH_CHECK_TIMEOUT)
+    except Exception as e:
+        logger.warning("Could not read queue lane stats: %s", e)
+        return
+    for lane, lane_stats in stats.items():
+        queue_lane_depth.set(lane_stats["depth"], lane=lane)
+        # Counted in Redis across all workers
+        queue_lane_dequeued.set_total(lane_stats["dequeued"], lane=lane)
+        queue_lane_wait.set_total(lane_stats["wait_seconds"], lane=lane)
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    await _refresh_queue_metrics()
+    return registry.render()
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+
+from ..schemas.vehicle import VehicleSuggestions
+from ..utils.config import get_settings
+from ..utils.rate_limit import RateLimiter
+from ..utils.vehicle_catalog import vehicle_catalog
+
+settings = get_settings()
+router = APIRouter()
+
+@router.get("/autocomplete", response_model=VehicleSuggestions)
+async def autocomplete_vehicles(
+    q: str = Query("", max_length=100),
+    make: Optional[str] = None,
+    limit: int = Query(settings.VEHICLE_AUTOCOMPLETE_MAX_RESULTS, ge=1, le=settings.VEHICLE_AUTOCOMPLETE_MAX_RESULTS),
+    rate_limit: None = Depends(RateLimiter("vehicles:autocomplete"))
+):
+    """Makes starting with `q` (or with a word of theirs starting with it), alphabetically.
+
+    With `make`, completes that make's models instead. Answered from the in-memory catalog.
+    """
+    if make is None:
+        entries = vehicle_catalog.complete_makes(q, limit)
+        make_id = None
+    else:
+        make_entry = vehicle_catalog.find_make(make)
+        if make_entry is None:
+            return {"make_id": None, "suggestions": []}
+        entries = vehicle_catalog.complete_models(make_entry.id, q, limit)
+        make_id = make_entry.id
+    return {"make_id": make_id, "suggestions": [entry._asdict() for entry in entries]}
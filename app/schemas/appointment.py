@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, constr
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
 class AppointmentBase(BaseModel):
     email: EmailStr
@@ -14,14 +14,38 @@ class AppointmentBase(BaseModel):
 class AppointmentCreate(AppointmentBase):
     pass
 
+class AppointmentImport(AppointmentBase):
+    # Bulk imports are mostly history, so past times are accepted and the status defaults to completed;
+    # pending rows are queued for the worker and confirmed ones scheduled, as the API would
+    status: Literal["pending", "confirmed", "completed", "cancelled"] = "completed"
+    created_at: Optional[datetime] = None
+
 class AppointmentUpdate(BaseModel):
     status: str
 
 class Appointment(AppointmentBase):
     id: int
     status: str
+    vehicle_make_id: Optional[int] = None
+    vehicle_model_id: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class AppointmentChanges(BaseModel):
+    changes: List[Appointment]
+    next_token: str  # Pass as `since` on the next poll
+    has_more: bool
+
+class AppointmentSearchResult(Appointment):
+    rank: float  # Summed word similarity of the query terms
+
+class AppointmentSearchResults(BaseModel):
+    results: List[AppointmentSearchResult]
+    next_cursor: Optional[str] = None  # Pass as `cursor` for the next page; absent on the last page
+
+class ArchivedAppointments(BaseModel):
+    appointments: List[Appointment]
+    next_cursor: Optional[str] = None  # Pass as `cursor` for the next page; absent on the last page
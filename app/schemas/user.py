@@ -39,6 +39,8 @@ class User(UserBase):
     vehicle_make: Optional[str] = None
     vehicle_model: Optional[str] = None
     vehicle_vin: Optional[str] = None
+    vehicle_make_id: Optional[int] = None
+    vehicle_model_id: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
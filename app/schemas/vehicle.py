@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class VehicleSuggestion(BaseModel):
+    id: int
+    name: str
+
+class VehicleSuggestions(BaseModel):
+    make_id: Optional[int] = None  # Set when completing models of a known make
+    suggestions: List[VehicleSuggestion]
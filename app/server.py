@@ -0,0 +1,261 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from .utils.config import get_settings
+from .utils.log import restart_logging_after_fork, setup_logging, shutdown_logging
+from .workers.supervisor import STABLE_RUN_SECONDS, WorkerSupervisor
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+def default_workers() -> int:
+    """One API process per CPU this process is allowed to run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def bind_socket(host: str, port: int, reuse_port: bool, backlog: int = settings.SERVER_BACKLOG) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def serve(
+    slot: int, host: str, port: int, sock: Optional[socket.socket], cpu: Optional[int], ready
+) -> None:
+    """Run one API process: uvicorn on the shared socket, or on its own SO_REUSEPORT socket"""
+    import uvicorn
+
+    restart_logging_after_fork()
+    # Drop the launcher's handlers (uvicorn installs its own once serving); rolling restarts
+    # are the launcher's business
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    # Already imported by the launcher when SERVER_PRELOAD is set
+    from .main import app
+
+    class Server(uvicorn.Server):
+        async def startup(self, sockets=None) -> None:
+            await super().startup(sockets)
+            if self.started:
+                ready.set()
+
+    config = uvicorn.Config(
+        app,
+        loop=settings.SERVER_LOOP,
+        http=settings.SERVER_HTTP,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=int(settings.SERVER_GRACEFUL_TIMEOUT),
+        access_log=settings.SERVER_ACCESS_LOG,
+        log_config=None,  # Through the app's logging setup
+    )
+    if sock is None:
+        sock = bind_socket(host, port, reuse_port=True)
+    logger.info("API process %s (pid %s) serving on %s:%s", slot, os.getpid(), host, port)
+    try:
+        Server(config).run(sockets=[sock])
+    finally:
+        # Child processes exit without running atexit handlers
+        shutdown_logging()
+
+class _ServerChild:
+    __slots__ = ("process", "ready", "started_at", "failures", "restart_at")
+
+    def __init__(self):
+        self.process: Optional[multiprocessing.Process] = None
+        self.ready = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at = 0.0
+
+class ServerSupervisor:
+    """Forks `processes` uvicorn processes for the API and keeps them running.
+
+    The processes accept connections from one listening socket bound here, or each bind
+    their own with SO_REUSEPORT. With `preload` the app is imported before forking, so
+    import errors stop the launch and the processes share its memory until they write to it.
+    A process that exits is restarted in its slot with the workers' backoff. SIGHUP replaces
+    the processes one at a time, each only after its replacement is serving; SIGTERM or
+    SIGINT stops them gracefully. Appointment worker processes can be run alongside.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        host: str = settings.SERVER_HOST,
+        port: int = settings.SERVER_PORT,
+        preload: bool = settings.SERVER_PRELOAD,
+        reuse_port: bool = settings.SERVER_REUSE_PORT,
+        cpu_affinity: bool = settings.SERVER_CPU_AFFINITY,
+        appointment_workers: int = settings.SERVER_APPOINTMENT_WORKERS,
+        target: Callable = serve,  # Entry point of each API process
+    ):
+        self.processes = processes
+        self.host = host
+        self.port = port
+        self.preload = preload
+        self.reuse_port = reuse_port
+        self.target = target
+        self._cpus: List[int] = []
+        if cpu_affinity:
+            if hasattr(os, "sched_getaffinity"):
+                self._cpus = sorted(os.sched_getaffinity(0))
+            else:
+                logger.warning("CPU affinity is not supported on this platform; ignoring SERVER_CPU_AFFINITY")
+        self._context = multiprocessing.get_context("fork")
+        self._children: Dict[int, _ServerChild] = {slot: _ServerChild() for slot in range(processes)}
+        self._socket: Optional[socket.socket] = None
+        self._workers = WorkerSupervisor(appointment_workers) if appointment_workers > 0 else None
+        self._stopping = threading.Event()
+        self._restart_requested = threading.Event()
+
+    def _start(self, slot: int) -> None:
+        child = self._children[slot]
+        cpu = self._cpus[slot % len(self._cpus)] if self._cpus else None
+        child.ready = self._context.Event()
+        child.process = self._context.Process(
+            target=self.target,
+            args=(slot, self.host, self.port, self._socket, cpu, child.ready),
+            name=f"api-{slot}",
+        )
+        child.process.start()
+        child.started_at = time.monotonic()
+        logger.info("Started API slot %s (pid %s)", slot, child.process.pid)
+
+    def _check(self, slot: int) -> None:
+        child = self._children[slot]
+        now = time.monotonic()
+        if child.process is None:
+            if now >= child.restart_at:
+                self._start(slot)
+            return
+        if child.process.is_alive():
+            return
+
+        exitcode = child.process.exitcode
+        child.process.close()
+        child.process = None
+        if now - child.started_at >= STABLE_RUN_SECONDS:
+            child.failures = 0
+        delay = min(2 ** child.failures, settings.WORKER_RESTART_BACKOFF_MAX)
+        child.failures += 1
+        child.restart_at = now + delay
+        logger.error("API slot %s exited with code %s, restarting in %.0fs", slot, exitcode, delay)
+
+    def _stop_process(self, process: multiprocessing.Process) -> None:
+        if process.is_alive():
+            process.terminate()  # SIGTERM: finish in-flight requests
+        process.join(settings.SERVER_GRACEFUL_TIMEOUT + 5)
+        if process.is_alive():
+            logger.error("API pid %s did not stop in time, killing it", process.pid)
+            process.kill()
+            process.join()
+
+    def _wait_ready(self, child: _ServerChild) -> bool:
+        """Whether a new process started serving; gives up early when the launcher is stopping"""
+        deadline = time.monotonic() + settings.SERVER_STARTUP_TIMEOUT
+        while not child.ready.wait(0.5):
+            if self._stopping.is_set() or not child.process.is_alive() or time.monotonic() >= deadline:
+                return False
+        return True
+
+    def rolling_restart(self) -> None:
+        """Replace each API process in turn, starting the next only once its replacement serves"""
+        logger.info("Rolling restart of %s API processes", len(self._children))
+        for slot, child in self._children.items():
+            if self._stopping.is_set():
+                return
+            old = child.process
+            if old is None:
+                continue  # Already waiting to be restarted
+            self._start(slot)
+            if not self._wait_ready(child):
+                if not self._stopping.is_set():
+                    logger.error("Replacement for API slot %s did not start; keeping the old process", slot)
+                self._stop_process(child.process)
+                child.process.close()
+                child.process = old
+                return
+            self._stop_process(old)
+            old.close()
+        logger.info("Rolling restart finished")
+
+    def _handle_stop(self, signum, frame) -> None:
+        self._stopping.set()
+
+    def _handle_restart(self, signum, frame) -> None:
+        self._restart_requested.set()
+
+    def run(self) -> None:
+        if self.preload:
+            from .main import app  # noqa: F401
+        if not self.reuse_port:
+            self._socket = bind_socket(self.host, self.port, reuse_port=False)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_restart)
+        logger.info(
+            "Starting %s API processes on %s:%s (%s)", self.processes, self.host, self.port,
+            "SO_REUSEPORT" if self.reuse_port else "shared socket"
+        )
+        for slot in self._children:
+            self._start(slot)
+        if self._workers is not None:
+            self._workers.start()
+        while not self._stopping.wait(0.5):
+            if self._restart_requested.is_set():
+                self._restart_requested.clear()
+                self.rolling_restart()
+            for slot in self._children:
+                self._check(slot)
+            if self._workers is not None:
+                self._workers.poll()
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        running = [child.process for child in self._children.values() if child.process is not None]
+        logger.info("Stopping %s API processes", len(running))
+        for process in running:
+            if process.is_alive():
+                process.terminate()
+        for process in running:
+            self._stop_process(process)
+        if self._workers is not None:
+            self._workers.shutdown()
+        if self._socket is not None:
+            self._socket.close()
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app", description="Run the API in production")
+    parser.add_argument("--host", default=settings.SERVER_HOST, help="address to bind (default: SERVER_HOST)")
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT, help="port to bind (default: SERVER_PORT)")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=settings.SERVER_WORKERS,
+        help="API processes (default: SERVER_WORKERS, or one per CPU)"
+    )
+    parser.add_argument(
+        "--appointment-workers", type=int, default=settings.SERVER_APPOINTMENT_WORKERS,
+        help="appointment worker processes to run alongside (default: SERVER_APPOINTMENT_WORKERS)"
+    )
+    args = parser.parse_args(argv)
+    setup_logging()
+    processes = args.workers if args.workers is not None else default_workers()
+    ServerSupervisor(
+        max(1, processes), args.host, args.port, appointment_workers=max(0, args.appointment_workers)
+    ).run()
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from math import ceil
+from typing import Optional
+
+import pytz
+import redis.asyncio as redis
+
+from ..utils.config import get_settings
+from ..utils.metrics import registry
+from ..utils.queue import AppointmentQueue
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DRAIN_BUCKET_KEY = "appointment_drain"
+DRAIN_BUCKET_SECONDS = 10
+
+admission_rejections = registry.counter(
+    "admission_rejected_total",
+    "Appointment requests rejected because the projected queue wait exceeded the SLO",
+)
+admission_projected_wait = registry.gauge(
+    "admission_projected_wait_seconds",
+    "Projected wait before a newly queued appointment is processed",
+)
+admission_drain_rate = registry.gauge(
+    "admission_drain_rate_per_second",
+    "Measured appointment worker drain rate",
+)
+
+async def record_drained(redis_client: redis.Redis, count: int) -> None:
+    """Record that the worker took `count` requests off the queue (called by the worker)"""
+    if count <= 0:
+        return
+    bucket = int(time.time() // DRAIN_BUCKET_SECONDS)
+    key = f"{DRAIN_BUCKET_KEY}:{bucket}"
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.incrby(key, count)
+            pipe.expire(key, DRAIN_BUCKET_SECONDS * (settings.ADMISSION_RATE_WINDOW_BUCKETS + 2))
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Redis error recording drain rate: %s", e)
+
+@dataclass
+class AdmissionDecision:
+    admitted: bool
+    queue_depth: int
+    drain_rate: float
+    projected_wait: Optional[float] = None
+    retry_after: Optional[int] = None
+
+    def estimated_confirmation_at(self) -> Optional[datetime]:
+        if self.projected_wait is None:
+            return None
+        return datetime.now(pytz.UTC) + timedelta(seconds=self.projected_wait)
+
+class AdmissionController:
+    """Admits new appointment requests while the projected queue wait stays within the SLO.
+
+    Projected wait is queue depth divided by the worker drain rate measured over the last
+    ADMISSION_RATE_WINDOW_BUCKETS ten-second buckets. Both inputs are cached for
+    ADMISSION_CACHE_TTL so a surge does not add Redis round trips per request.
+    """
+
+    def __init__(self, queue: AppointmentQueue):
+        self.queue = queue
+        self._depth = 0
+        self._rate = 0.0
+        self._sampled_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _measure_drain_rate(self) -> float:
+        now = time.time()
+        current = int(now // DRAIN_BUCKET_SECONDS)
+        buckets = range(current - settings.ADMISSION_RATE_WINDOW_BUCKETS, current + 1)
+        counts = await self.queue.redis.mget([f"{DRAIN_BUCKET_KEY}:{bucket}" for bucket in buckets])
+        drained = sum(int(count) for count in counts if count)
+        # The current bucket is only partially elapsed
+        covered = settings.ADMISSION_RATE_WINDOW_BUCKETS * DRAIN_BUCKET_SECONDS + (now % DRAIN_BUCKET_SECONDS)
+        return drained / covered
+
+    async def _refresh(self) -> None:
+        if time.monotonic() - self._sampled_at < settings.ADMISSION_CACHE_TTL:
+            return
+        async with self._lock:
+            if time.monotonic() - self._sampled_at < settings.ADMISSION_CACHE_TTL:
+                return
+            try:
+                self._rate = await self._measure_drain_rate()
+            except redis.RedisError as e:
+                logger.warning("Redis error measuring drain rate: %s", e)
+            self._depth = await self.queue.get_queue_length()
+            self._sampled_at = time.monotonic()
+            admission_drain_rate.set(self._rate)
+
+    async def drain_rate(self) -> float:
+        """Cached worker throughput in requests per second"""
+        await self._refresh()
+        return self._rate
+
+    async def check(self) -> AdmissionDecision:
+        """Decide whether to admit one more request"""
+        await self._refresh()
+        depth, rate = self._depth, self._rate
+
+        if depth < settings.ADMISSION_MIN_DEPTH:
+            # A short queue is always admitted; the drain rate measured while the worker
+            # was partly idle understates its capacity
+            self._depth += 1
+            return AdmissionDecision(True, depth, rate, projected_wait=(depth + 1) / rate if rate > 0 else None)
+
+        if rate <= 0:
+            # No measured throughput: the worker is idle, just started, or stalled
+            if depth > settings.ADMISSION_STALLED_DEPTH:
+                admission_rejections.inc()
+                return AdmissionDecision(False, depth, rate, retry_after=settings.ADMISSION_MAX_RETRY_AFTER)
+            self._depth += 1
+            return AdmissionDecision(True, depth, rate)
+
+        projected_wait = (depth + 1) / rate
+        admission_projected_wait.set(projected_wait)
+        if projected_wait > settings.ADMISSION_WAIT_SLO_SECONDS:
+            # Time until the backlog has drained back under the SLO
+            retry_after = ceil(projected_wait - settings.ADMISSION_WAIT_SLO_SECONDS)
+            admission_rejections.inc()
+            return AdmissionDecision(
+                False, depth, rate,
+                projected_wait=projected_wait,
+                retry_after=min(max(retry_after, 1), settings.ADMISSION_MAX_RETRY_AFTER),
+            )
+        # Count ourselves so back-to-back requests within the cache TTL see a growing queue
+        self._depth += 1
+        return AdmissionDecision(True, depth, rate, projected_wait=projected_wait)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, List, NamedTuple, Optional
+
+import pytz
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from ..database.base import AsyncSessionLocal
+from ..models.appointment import Appointment
+from ..schemas.appointment import Appointment as AppointmentSchema
+from .cache import redis_client
+from .config import get_settings
+from .metrics import registry
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Hash of the appointment's JSON representation ("body") and the change_seq it was read at ("version")
+APPOINTMENT_CACHE_KEY = "appointment_cache:{}"
+# Held by the process warming the cache, so other processes skip that round
+APPOINTMENT_CACHE_WARM_LOCK_KEY = "appointment_cache_warm_lock"
+
+# KEYS: entries; ARGV: ttl, then version and body per key. Writes each entry unless the cache
+# already holds that version or a newer one, so a late writer can't put back an older row.
+PUT_LUA = """
+local written = 0
+for i, key in ipairs(KEYS) do
+    local version = tonumber(ARGV[i * 2])
+    local current = redis.call('HGET', key, 'version')
+    if not current or tonumber(current) < version then
+        redis.call('HSET', key, 'version', ARGV[i * 2], 'body', ARGV[i * 2 + 1])
+        redis.call('EXPIRE', key, ARGV[1])
+        written = written + 1
+    end
+end
+return written
+"""
+
+appointment_cache_lookups = registry.counter(
+    "appointment_cache_lookups_total", "Single appointment reads answered from the cache or not", ["result"]
+)
+appointment_cache_writes = registry.counter(
+    "appointment_cache_writes_total", "Appointment representations written to the cache", ["source"]
+)
+
+class CachedAppointment(NamedTuple):
+    id: int
+    change_seq: int
+    body: str
+
+class AppointmentCache:
+    """JSON representations of single appointments in Redis, written through after each commit.
+
+    Every writer puts the row it committed (with the change_seq the touch trigger gave it);
+    entries only move to newer versions, so writes that finish out of order leave the latest.
+    Reads that miss fill the cache the same way. The API processes also warm it with the
+    appointments of the next APPOINTMENT_CACHE_WARM_DAYS at startup and every
+    APPOINTMENT_CACHE_WARM_INTERVAL, one process per round.
+    """
+
+    def __init__(self, client: redis.Redis = redis_client):
+        self.redis = client
+        self._put_script = client.register_script(PUT_LUA)
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, appointment_id: int) -> Optional[CachedAppointment]:
+        try:
+            version, body = await self.redis.hmget(APPOINTMENT_CACHE_KEY.format(appointment_id), "version", "body")
+        except redis.RedisError as e:
+            logger.warning("Redis error reading cached appointment: %s", e)
+            return None
+        if body is None:
+            appointment_cache_lookups.inc(result="miss")
+            return None
+        appointment_cache_lookups.inc(result="hit")
+        return CachedAppointment(appointment_id, int(version), body)
+
+    async def put(self, appointments: Iterable[Appointment], source: str = "write") -> None:
+        """Cache committed rows, each unless a newer version of it is already cached"""
+        keys = []
+        args = [settings.APPOINTMENT_CACHE_TTL]
+        for appointment in appointments:
+            keys.append(APPOINTMENT_CACHE_KEY.format(appointment.id))
+            args.append(appointment.change_seq)
+            args.append(AppointmentSchema.model_validate(appointment).model_dump_json())
+        if not keys:
+            return
+        try:
+            written = await self._put_script(keys=keys, args=args)
+        except redis.RedisError as e:
+            # Entries written before this change stay until APPOINTMENT_CACHE_TTL
+            logger.warning("Redis error caching appointments: %s", e)
+            return
+        appointment_cache_writes.inc(written, source=source)
+
+    async def refresh(self, appointment_ids: Iterable[int]) -> None:
+        """Re-read and cache rows changed by bulk statements that don't return them"""
+        appointment_ids = list(appointment_ids)
+        if not appointment_ids:
+            return
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(Appointment).where(Appointment.id.in_(appointment_ids)))
+            appointments = result.scalars().all()
+        await self.put(appointments)
+
+    async def warm(self) -> int:
+        """Cache every appointment of the next APPOINTMENT_CACHE_WARM_DAYS, in batches"""
+        started = time.monotonic()
+        now = datetime.now(pytz.UTC)
+        window = (
+            Appointment.appointment_time >= now,
+            Appointment.appointment_time < now + timedelta(days=settings.APPOINTMENT_CACHE_WARM_DAYS),
+        )
+        last_id = 0
+        warmed = 0
+        while True:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Appointment)
+                    .where(*window, Appointment.id > last_id)
+                    .order_by(Appointment.id)
+                    .limit(settings.APPOINTMENT_CACHE_WARM_BATCH_SIZE)
+                )
+                appointments = result.scalars().all()
+            if not appointments:
+                break
+            await self.put(appointments, source="warm")
+            last_id = appointments[-1].id
+            warmed += len(appointments)
+        logger.info("Warmed appointment cache with %s appointments in %.3fs", warmed, time.monotonic() - started)
+        return warmed
+
+    async def _warm_if_due(self) -> None:
+        # Skip the round if another process has started it within the interval
+        try:
+            claimed = await self.redis.set(
+                APPOINTMENT_CACHE_WARM_LOCK_KEY, "1", nx=True, ex=max(1, int(settings.APPOINTMENT_CACHE_WARM_INTERVAL))
+            )
+        except redis.RedisError as e:
+            logger.warning("Redis error claiming appointment cache warm-up: %s", e)
+            return
+        if claimed:
+            await self.warm()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._warm_if_due()
+            except Exception as e:
+                logger.error("Failed to warm appointment cache: %s", e)
+            await asyncio.sleep(settings.APPOINTMENT_CACHE_WARM_INTERVAL)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+appointment_cache = AppointmentCache()
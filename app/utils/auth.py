@@ -1,17 +1,122 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Set
+import asyncio
+import contextlib
+import logging
+import secrets
+import time
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+import redis.asyncio as redis
+from sqlalchemy import select, update
+
+from ..database.base import AsyncSessionLocal
+from ..models.user import User
+from ..schemas.user import User as UserSchema
+from .cache import redis_client
 from .config import get_settings
+from .local_cache import ExpiringLRU
+from .metrics import registry
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
+
+USER_CHANGES_CHANNEL = "user_changes"
+
+# Verified token -> subject (email), kept until the token's own expiry
+token_cache = ExpiringLRU(settings.AUTH_TOKEN_CACHE_SIZE)
+# Email -> user record
+user_cache = ExpiringLRU(settings.AUTH_USER_CACHE_SIZE)
+# Bumped on every invalidation, so a lookup that raced one doesn't cache what it read
+_user_generation = 0
+
+password_hash_seconds = registry.histogram(
+    "password_hash_seconds",
+    "Time spent hashing or verifying one password",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+bcrypt_rounds = registry.gauge("bcrypt_rounds", "bcrypt cost (log2 rounds) used for new password hashes")
+password_rehashes = registry.counter(
+    "password_rehashes_total",
+    "Stored password hashes upgraded to the current cost after a successful login",
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    started = time.perf_counter()
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    finally:
+        password_hash_seconds.observe(time.perf_counter() - started, operation="verify")
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    started = time.perf_counter()
+    try:
+        return pwd_context.hash(password)
+    finally:
+        password_hash_seconds.observe(time.perf_counter() - started, operation="hash")
+
+def dummy_verify_password() -> None:
+    """Take as long as a real password check, so unknown emails can't be told apart by latency"""
+    pwd_context.dummy_verify()
+
+def calibrate_bcrypt_rounds(target_seconds: float = settings.PASSWORD_HASH_TARGET_SECONDS) -> int:
+    """Highest bcrypt cost whose hash time on this CPU stays within `target_seconds`.
+
+    Each extra round doubles the work, so timing the minimum cost is enough to extrapolate.
+    """
+    rounds = settings.BCRYPT_MIN_ROUNDS
+    probe = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    samples = []
+    for _ in range(3):
+        started = time.perf_counter()
+        probe.hash("calibration")
+        samples.append(time.perf_counter() - started)
+    elapsed = sorted(samples)[1]
+    while rounds < settings.BCRYPT_MAX_ROUNDS and elapsed * 2 <= target_seconds:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+def configure_password_hashing() -> int:
+    """Set the bcrypt cost (BCRYPT_ROUNDS, or calibrated); hashes below it are upgraded on login"""
+    rounds = settings.BCRYPT_ROUNDS or calibrate_bcrypt_rounds()
+    pwd_context.update(bcrypt__rounds=rounds, bcrypt__min_rounds=rounds)
+    bcrypt_rounds.set(rounds)
+    logger.info("Using bcrypt cost %s for password hashes", rounds)
+    return rounds
+
+# Keeps background rehash tasks referenced until they finish
+_rehash_tasks: Set[asyncio.Task] = set()
+
+async def _rehash_password(user_id: int, email: str, password: str, old_hash: str) -> None:
+    try:
+        new_hash = await asyncio.to_thread(get_password_hash, password)
+        async with AsyncSessionLocal() as session:
+            # Only replace the hash we verified; a password change in the meantime wins
+            result = await session.execute(
+                update(User)
+                .where(User.id == user_id, User.hashed_password == old_hash)
+                .values(hashed_password=new_hash)
+            )
+            await session.commit()
+        if result.rowcount:
+            password_rehashes.inc()
+            await invalidate_user(email)
+    except Exception as e:
+        logger.warning("Failed to upgrade password hash for user %s: %s", user_id, e)
+
+def schedule_rehash_if_needed(user_id: int, email: str, password: str, stored_hash: str) -> None:
+    """After a successful login, upgrade a hash made with an outdated cost, off the request path"""
+    if not pwd_context.needs_update(stored_hash):
+        return
+    task = asyncio.create_task(_rehash_password(user_id, email, password, stored_hash))
+    _rehash_tasks.add(task)
+    task.add_done_callback(_rehash_tasks.discard)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -21,4 +126,120 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt 
\ No newline at end of file
+    return encoded_jwt 
+
+async def require_admin(x_admin_key: Optional[str] = Header(None)) -> None:
+    """Dependency guarding admin endpoints with the configured ADMIN_API_KEY"""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin API is disabled"
+        )
+    if not x_admin_key or not secrets.compare_digest(x_admin_key, settings.ADMIN_API_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid admin key"
+        )
+
+def _credentials_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _verify_token(token: str) -> str:
+    """Subject of a valid token; signatures are only checked the first time a token is seen"""
+    email = token_cache.get(token)
+    if email is not None:
+        return email
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise _credentials_error()
+    email = payload.get("sub")
+    expires_at = payload.get("exp")
+    if not email or expires_at is None:
+        raise _credentials_error()
+    token_cache.set(token, email, float(expires_at))
+    return email
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserSchema:
+    """Dependency resolving the bearer token to its user, from process-local caches when possible"""
+    email = _verify_token(token)
+    user = user_cache.get(email)
+    if user is None:
+        generation = _user_generation
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(User).where(User.email == email))
+            db_user = result.scalar_one_or_none()
+        if db_user is None:
+            raise _credentials_error()
+        user = UserSchema.model_validate(db_user)
+        if generation == _user_generation:
+            user_cache.set(email, user, time.time() + settings.AUTH_USER_CACHE_TTL)
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+    return user
+
+def _forget_user(email: Optional[str]) -> None:
+    global _user_generation
+    _user_generation += 1
+    if email is None:
+        user_cache.clear()
+    else:
+        user_cache.discard(email)
+
+async def invalidate_user(email: str) -> None:
+    """Drop a changed user from every process's cache"""
+    _forget_user(email)
+    try:
+        await redis_client.publish(USER_CHANGES_CHANNEL, email)
+    except redis.RedisError as e:
+        # Other processes pick the change up after AUTH_USER_CACHE_TTL
+        logger.warning("Redis error publishing user change: %s", e)
+
+class UserCacheInvalidator:
+    """Applies other processes' user invalidations to this process's cache"""
+
+    def __init__(self, client: redis.Redis, channel: str = USER_CHANGES_CHANNEL):
+        self.client = client
+        self.channel = channel
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Invalidations may have been missed while disconnected
+                _forget_user(None)
+                backoff = 0.5
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        _forget_user(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("User change subscriber disconnected: %s", e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10)
+            finally:
+                with contextlib.suppress(Exception):
+                    await pubsub.aclose()
+
+user_cache_invalidator = UserCacheInvalidator(redis_client)
@@ -0,0 +1,44 @@
+import hashlib
+import math
+import struct
+
+# size, hashes and count ahead of the bits in a serialized filter
+_HEADER = struct.Struct("<QIQ")
+
+class BloomFilter:
+    """Fixed-size Bloom filter: no false negatives, about `error_rate` false positives at `capacity` items"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def to_bytes(self) -> bytes:
+        return _HEADER.pack(self.size, self.hashes, self.count) + bytes(self._bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BloomFilter":
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hashes, bloom.count = _HEADER.unpack_from(data)
+        bloom._bits = bytearray(data[_HEADER.size:])
+        if len(bloom._bits) != (bloom.size + 7) // 8:
+            raise ValueError("Truncated Bloom filter")
+        return bloom
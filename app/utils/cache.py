@@ -1,9 +1,11 @@
 import redis.asyncio as redis
-from fastapi_limiter import FastAPILimiter
 from ..utils.config import get_settings
+from ..utils.circuit_breaker import CircuitBreaker, CircuitBreakerRedis
 import json
+import logging
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 # Redis connection pool with optimized settings for high concurrency
 redis_pool = redis.ConnectionPool.from_url(
@@ -11,24 +13,41 @@ redis_pool = redis.ConnectionPool.from_url(
     max_connections=settings.REDIS_POOL_SIZE * 4,  # Increased pool size for higher concurrency
     decode_responses=True,
     health_check_interval=30,
-    socket_timeout=10,  # Reduced timeout for faster failure detection
-    socket_connect_timeout=5,  # Reduced connect timeout
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,  # Short timeouts; the circuit breaker handles outages
+    socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
     socket_keepalive=True,  # Enable keepalive
-    retry_on_timeout=True,   # Enable retry on timeout
-    retry_on_error=[redis.ConnectionError, redis.TimeoutError],  # Retry on specific errors
+    retry_on_error=[redis.ConnectionError],  # Retry once on a dropped pooled connection, never on timeouts
 )
 
+# Shared breaker for every Redis caller (cache, queue, rate limiter)
+redis_breaker = CircuitBreaker("redis")
+
 # Redis client with optimized settings
-redis_client = redis.Redis(
+redis_client = CircuitBreakerRedis(
     connection_pool=redis_pool,
+    breaker=redis_breaker,
     socket_keepalive=True,
-    retry_on_timeout=True,
     health_check_interval=30
 )
 
+# Same server, for values that aren't text (precompressed response bodies)
+redis_bytes_pool = redis.ConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_POOL_SIZE,
+    health_check_interval=30,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+    socket_keepalive=True,
+    retry_on_error=[redis.ConnectionError],
+)
+redis_bytes_client = CircuitBreakerRedis(connection_pool=redis_bytes_pool, breaker=redis_breaker)
+
 async def init_redis():
-    """Initialize Redis connection and rate limiter"""
-    await FastAPILimiter.init(redis_client)
+    """Check the Redis connection at startup; outages are handled by the circuit breaker"""
+    try:
+        await redis_client.ping()
+    except redis.RedisError as e:
+        logger.warning("Redis unavailable at startup: %s", e)
 
 async def get_cached_data(key: str, default=None) -> str:
     """Get data from Redis cache with error handling"""
@@ -36,7 +55,7 @@ async def get_cached_data(key: str, default=None) -> str:
         value = await redis_client.get(key)
         return value if value is not None else default
     except (redis.ConnectionError, redis.TimeoutError) as e:
-        print(f"Redis error in get_cached_data: {e}")
+        logger.warning("Redis error in get_cached_data: %s", e)
         return default
 
 async def set_cached_data(key: str, value: str, expire: int = 300):
@@ -44,14 +63,14 @@ async def set_cached_data(key: str, value: str, expire: int = 300):
     try:
         await redis_client.set(key, value, ex=expire)
     except (redis.ConnectionError, redis.TimeoutError) as e:
-        print(f"Redis error in set_cached_data: {e}")
+        logger.warning("Redis error in set_cached_data: %s", e)
 
 async def clear_cached_data(key: str):
     """Clear data from Redis cache with error handling"""
     try:
         await redis_client.delete(key)
     except (redis.ConnectionError, redis.TimeoutError) as e:
-        print(f"Redis error in clear_cached_data: {e}")
+        logger.warning("Redis error in clear_cached_data: %s", e)
 
 def cache_response(expire: int = 300):
     """Decorator to cache API responses with improved error handling"""
@@ -71,7 +90,7 @@ def cache_response(expire: int = 300):
                 await set_cached_data(cache_key, json.dumps(result), expire)
                 return result
             except Exception as e:
-                print(f"Cache error in wrapper: {e}")
+                logger.warning("Cache error in wrapper: %s", e)
                 # On cache error, just execute the function
                 return await func(*args, **kwargs)
         return wrapper
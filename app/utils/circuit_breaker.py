@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+
+from ..utils.config import get_settings
+from ..utils.metrics import registry
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+circuit_state = registry.gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state (0=closed, 1=half-open, 2=open)",
+    ["name"],
+)
+circuit_transitions = registry.counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state transitions",
+    ["name", "state"],
+)
+circuit_rejected = registry.counter(
+    "circuit_breaker_rejected_total",
+    "Calls rejected without being attempted because the circuit was open",
+    ["name"],
+)
+
+class CircuitOpenError(redis.ConnectionError):
+    """Raised instead of calling Redis while the breaker is open.
+
+    Subclasses ConnectionError so existing `except redis.ConnectionError` fallbacks apply unchanged.
+    """
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = settings.REDIS_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout: float = settings.REDIS_BREAKER_RECOVERY_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        circuit_state.set(0, name=name)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning("Circuit breaker %s: %s -> %s", self.name, self.state, state)
+        self.state = state
+        circuit_state.set(_STATE_VALUES[state], name=self.name)
+        circuit_transitions.inc(name=self.name, state=state)
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being short-circuited (half-open probes excluded)"""
+        return self.state == OPEN and time.monotonic() - self.opened_at < self.recovery_timeout
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        circuit_rejected.inc(name=self.name)
+        return False
+
+    def release_probe(self) -> None:
+        """Forget an in-flight half-open probe that ended without a verdict"""
+        self._probe_in_flight = False
+
+    async def call(self, func, *args, **kwargs):
+        """Await a Redis call through the breaker"""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit breaker {self.name} is open")
+        try:
+            result = await func(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError):
+            self.record_failure()
+            raise
+        except redis.RedisError:
+            # Command errors still prove the server is reachable
+            self.record_success()
+            raise
+        except asyncio.CancelledError:
+            self.release_probe()
+            raise
+        self.record_success()
+        return result
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probe_in_flight = False
+        self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+class CircuitBreakerRedis(redis.Redis):
+    """Redis client whose commands and pipelines go through a circuit breaker"""
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    async def execute_command(self, *args, **options):
+        return await self.breaker.call(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> "CircuitBreakerPipeline":
+        pipe = CircuitBreakerPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.breaker = self.breaker
+        return pipe
+
+class CircuitBreakerPipeline(Pipeline):
+    breaker: CircuitBreaker
+
+    async def execute(self, raise_on_error: bool = True):
+        return await self.breaker.call(super().execute, raise_on_error)
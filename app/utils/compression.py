@@ -0,0 +1,273 @@
+import logging
+import time
+import zlib
+from typing import NamedTuple, Optional, Tuple
+
+import redis.asyncio as redis
+from fastapi import Response
+from starlette.datastructures import Headers, MutableHeaders
+
+from .cache import redis_bytes_client
+from .config import get_settings
+from .etag import coded_etag
+from .metrics import registry
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Content codings we can produce, most preferred first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# "<version>\n<etag>\n<compression seconds>\n<uncompressed size>\n<body>", valid while the version is unchanged
+PRECOMPRESSED_KEY = "precompressed:{}:{}"
+
+compression_input_bytes = registry.counter(
+    "http_compression_input_bytes_total", "Response bytes passed through a compressor", ["encoding"]
+)
+compression_output_bytes = registry.counter(
+    "http_compression_output_bytes_total", "Compressed bytes produced from them", ["encoding"]
+)
+compression_seconds = registry.counter(
+    "http_compression_seconds_total", "Time spent compressing responses", ["encoding"]
+)
+compression_bytes_saved = registry.counter(
+    "http_compression_bytes_saved_total",
+    "Response bytes not sent thanks to compression, including precompressed cache hits",
+    ["encoding"],
+)
+precompressed_hits = registry.counter(
+    "http_precompressed_hits_total", "Responses served from a precompressed cache entry", ["encoding"]
+)
+compression_seconds_saved = registry.counter(
+    "http_compression_seconds_saved_total",
+    "Compression time precompressed cache hits did not have to spend",
+    ["encoding"],
+)
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Content coding to answer an Accept-Encoding header with, or None for identity.
+
+    The highest q-value wins; among equal ones, brotli is preferred over gzip.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    best = None
+    for preference, coding in enumerate(ENCODINGS):
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > 0 and (best is None or (quality, -preference) > best[0]):
+            best = ((quality, -preference), coding)
+    return best[1] if best is not None else None
+
+class StreamCompressor:
+    """Incremental gzip or brotli compressor that records what it does in the metrics"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self.input_size = 0
+        self.output_size = 0
+        self.seconds = 0.0
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+            self._process, self._finish = self._compressor.process, self._compressor.finish
+        else:
+            # wbits 16+ writes the gzip header and trailer
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._process, self._finish = self._compressor.compress, self._compressor.flush
+
+    def _record(self, started: float, input_size: int, output: bytes) -> bytes:
+        elapsed = time.perf_counter() - started
+        self.input_size += input_size
+        self.output_size += len(output)
+        self.seconds += elapsed
+        compression_input_bytes.inc(input_size, encoding=self.encoding)
+        compression_output_bytes.inc(len(output), encoding=self.encoding)
+        compression_bytes_saved.inc(input_size - len(output), encoding=self.encoding)
+        compression_seconds.inc(elapsed, encoding=self.encoding)
+        return output
+
+    def compress(self, data: bytes) -> bytes:
+        started = time.perf_counter()
+        return self._record(started, len(data), self._process(data))
+
+    def finish(self) -> bytes:
+        started = time.perf_counter()
+        return self._record(started, 0, self._finish())
+
+def compress(body: bytes, encoding: str) -> Tuple[bytes, float]:
+    """Compressed body and the seconds it took"""
+    compressor = StreamCompressor(encoding)
+    compressed = compressor.compress(body) + compressor.finish()
+    return compressed, compressor.seconds
+
+def _add_vary(headers: MutableHeaders) -> None:
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = vary + ", Accept-Encoding"
+
+def _is_event_stream(start_message) -> bool:
+    return Headers(raw=start_message.get("headers", [])).get("content-type", "").startswith("text/event-stream")
+
+def _vary_uncompressed(start_message) -> None:
+    # Sent as it is to this client, but another one may get it compressed
+    start_message.setdefault("headers", [])
+    _add_vary(MutableHeaders(scope=start_message))
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies for clients that accept gzip (or brotli).
+
+    Bodies shorter than `minimum_size` go out as they are, and so do responses that already
+    have a Content-Encoding (precompressed cache entries) and event streams, whose events
+    would otherwise sit in the compressor's buffer. Compressed responses get their coding's
+    ETag; all but event streams carry `Vary: Accept-Encoding`, whether compressed or not.
+    """
+
+    def __init__(self, app, minimum_size: int = settings.COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            async def send_identity(message):
+                if message["type"] == "http.response.start" and not _is_event_stream(message):
+                    _vary_uncompressed(message)
+                await send(message)
+
+            await self.app(scope, receive, send_identity)
+            return
+
+        start = None
+        pending = []
+        pending_size = 0
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, pending_size, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if "content-encoding" in Headers(raw=message.get("headers", [])) or _is_event_stream(message):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held until enough of the body is in to decide
+                    start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is not None:
+                data = compressor.compress(body)
+                if not more_body:
+                    data += compressor.finish()
+                if data or not more_body:
+                    await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            pending.append(body)
+            pending_size += len(body)
+            if pending_size < self.minimum_size:
+                if more_body:
+                    return
+                passthrough = True
+                _vary_uncompressed(start)
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(pending), "more_body": False})
+                return
+
+            compressor = StreamCompressor(encoding)
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            del headers["content-length"]
+            headers["Content-Encoding"] = encoding
+            if "etag" in headers:
+                headers["ETag"] = coded_etag(headers["etag"], encoding)
+            _add_vary(headers)
+            start["headers"] = headers.raw
+            data = compressor.compress(b"".join(pending))
+            if not more_body:
+                data += compressor.finish()
+            pending.clear()
+            await send(start)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+# Precompressed response cache
+
+class PrecompressedEntry(NamedTuple):
+    etag: str
+    body: bytes
+
+def precompressed_response(body: bytes, encoding: str, etag: str, media_type: str = "application/json") -> Response:
+    """Response with a body compressed with `encoding`; `etag` is the identity representation's"""
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding", "ETag": coded_etag(etag, encoding)},
+    )
+
+async def read_precompressed(
+    scope: str, encoding: str, version_key: str
+) -> Tuple[Optional[str], Optional[PrecompressedEntry]]:
+    """Current version of a resource and its cached compressed body, if cached at that version.
+
+    As with ETag stamps, read the version before querying the database, so an entry saved
+    with it is invalidated by any change committed in between.
+    """
+    try:
+        version, entry = await redis_bytes_client.mget(version_key, PRECOMPRESSED_KEY.format(encoding, scope))
+    except redis.RedisError as e:
+        logger.warning("Redis error reading precompressed response: %s", e)
+        return None, None
+    version = (version or b"0").decode()
+    if entry is not None:
+        cached_version, etag, seconds, size, body = entry.split(b"\n", 4)
+        if cached_version.decode() == version:
+            precompressed_hits.inc(encoding=encoding)
+            compression_seconds_saved.inc(float(seconds), encoding=encoding)
+            compression_bytes_saved.inc(int(size) - len(body), encoding=encoding)
+            return version, PrecompressedEntry(etag.decode(), body)
+    return version, None
+
+async def save_precompressed(
+    scope: str, encoding: str, version: Optional[str], etag: str, body: bytes
+) -> bytes:
+    """Compress a response body, cache it for the version it was read at and return it"""
+    compressed, seconds = compress(body, encoding)
+    if version is None:
+        return compressed
+    entry = b"\n".join([version.encode(), etag.encode(), repr(seconds).encode(), str(len(body)).encode(), compressed])
+    try:
+        await redis_bytes_client.set(
+            PRECOMPRESSED_KEY.format(encoding, scope), entry, ex=settings.COMPRESSION_CACHE_TTL
+        )
+    except redis.RedisError as e:
+        logger.warning("Redis error saving precompressed response: %s", e)
+    return compressed
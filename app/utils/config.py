@@ -1,6 +1,6 @@
 from functools import lru_cache
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # Database Settings
@@ -19,29 +19,188 @@ class Settings(BaseSettings):
     REDIS_MAX_CONNECTIONS: int = 1000  # Maximum number of connections
     REDIS_RETRY_ATTEMPTS: int = 3
     REDIS_RETRY_DELAY: float = 0.1  # 100ms
+    REDIS_SOCKET_TIMEOUT: float = 1.0
+    REDIS_CONNECT_TIMEOUT: float = 1.0
+    REDIS_BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive failures before the breaker opens
+    REDIS_BREAKER_RECOVERY_TIMEOUT: float = 5.0  # Seconds before a half-open probe is allowed
     
     # JWT Settings
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PASSWORD_HASH_TARGET_SECONDS: float = 0.25  # bcrypt cost is calibrated at startup to stay within this
+    BCRYPT_MIN_ROUNDS: int = 10
+    BCRYPT_MAX_ROUNDS: int = 15
+    BCRYPT_ROUNDS: Optional[int] = None  # Fixed cost; skips calibration
+    AUTH_TOKEN_CACHE_SIZE: int = 10000  # Verified tokens kept per process (until they expire)
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL: float = 300.0  # Upper bound on staleness if an invalidation is missed
+    
+    # Login filter settings
+    LOGIN_FILTER_ENABLED: bool = True  # Reject logins for unregistered emails without a database query
+    LOGIN_FILTER_CAPACITY: int = 1000000  # Grows to twice the user count if that is larger
+    LOGIN_FILTER_ERROR_RATE: float = 0.01
+    LOGIN_FILTER_REBUILD_INTERVAL: float = 3600.0
     
     # Rate limiting settings
     RATE_LIMIT_TIMES: int = 1000  # Increased rate limit
     RATE_LIMIT_SECONDS: int = 60
+    # Per-route overrides as "times/seconds"; routes not listed use the global limit above
+    RATE_LIMITS: Dict[str, str] = {
+        "appointments:create": "100/60",
+        "appointments:list": "100/60",
+        "appointments:get": "100/60",
+        "appointments:changes": "600/60",  # Polled by dashboards
+        "appointments:search": "100/60",
+        "vehicles:autocomplete": "1200/60",  # One request per keystroke
+        "appointments:update": "50/60",
+        "appointments:cancel": "50/60",
+    }
+    RATE_LIMIT_LEASE_SIZE: int = 10  # Max tokens a process reserves from Redis at once
+    # Proxy addresses or CIDRs whose X-Forwarded-For is believed; other peers are limited by their own address
+    RATE_LIMIT_TRUSTED_PROXIES: List[str] = []
     
     # Cache settings
     CACHE_EXPIRE_SECONDS: int = 300
     CACHE_ENABLED: bool = True
     
+    # Enqueue spool settings (used while Redis is unavailable)
+    SPOOL_DIR: str = "spool"
+    SPOOL_SEGMENT_BYTES: int = 16 * 1024 * 1024
+    SPOOL_FSYNC_INTERVAL: float = 0.005  # Group-commit window for appends
+    SPOOL_DRAIN_BATCH_SIZE: int = 500
+    SPOOL_DRAIN_INTERVAL: float = 1.0
+    
+    # Admission control for new appointment requests
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_WAIT_SLO_SECONDS: int = 300  # Reject when the projected queue wait exceeds this
+    ADMISSION_MIN_DEPTH: int = 500  # Always admit while the queue is shorter than this
+    ADMISSION_STALLED_DEPTH: int = 1000  # Reject above this depth when no drain is measured
+    ADMISSION_RATE_WINDOW_BUCKETS: int = 6  # Drain rate window, in 10 second buckets
+    ADMISSION_CACHE_TTL: float = 1.0
+    ADMISSION_MAX_RETRY_AFTER: int = 300
+    
+    # Appointment status events (SSE / long-poll)
+    EVENTS_LONG_POLL_TIMEOUT: float = 30.0
+    EVENTS_LONG_POLL_MAX: float = 60.0
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    EVENTS_SSE_MAX_SECONDS: float = 300.0  # Streams end after this; EventSource reconnects
+    EVENTS_SSE_RETRY_MS: int = 3000
+    
     # Worker settings
     WORKER_CONCURRENCY: int = 10
     WORKER_PREFETCH_COUNT: int = 50
     WORKER_TASK_TIMEOUT: int = 60  # 60 seconds
+    WORKER_PROCESSES: int = 2  # Processes started by `python -m app.workers`
+    WORKER_DB_POOL_SIZE: int = 10  # Per worker process
+    WORKER_DB_MAX_OVERFLOW: int = 5  # Per worker process
+    WORKER_DRAIN_TIMEOUT: float = 30.0  # Seconds to finish in-flight batches after SIGTERM
+    WORKER_RESTART_BACKOFF_MAX: float = 30.0  # Cap on the delay before restarting a crashing worker
+    
+    # Queue partitioning (drain the queue before changing QUEUE_PARTITIONS)
+    QUEUE_PARTITIONS: int = 16
+    PARTITION_LEASE_TTL: float = 10.0  # Seconds a worker's partition lease survives without renewal
+    PARTITION_LEASE_RENEW_INTERVAL: float = 3.0
+    # Priority lanes in order: a request joins the first lane whose bound on hours until the
+    # appointment it is within; a lane bounded by null takes the rest
+    QUEUE_LANES: Dict[str, Optional[float]] = {"urgent": 24, "soon": 168, "later": None}
+    QUEUE_LANE_WEIGHTS: Dict[str, int] = {"urgent": 6, "soon": 3, "later": 1}  # Share of dequeues under backlog
+    
+    # Appointment scheduler (reminders, expiry, completion) in the worker processes
+    SCHEDULER_TICK_SECONDS: float = 1.0
+    SCHEDULER_LOOKAHEAD_SECONDS: float = 300.0  # How far ahead events are claimed into the in-memory wheel
+    SCHEDULER_POLL_INTERVAL: float = 5.0
+    SCHEDULER_BATCH_SIZE: int = 500
+    SCHEDULER_RETRY_SECONDS: float = 30.0  # Delay before retrying events whose handler failed
+    SCHEDULER_REMINDER_LEAD_SECONDS: int = 86400  # Remind 24 hours before the appointment
+    SCHEDULER_COMPLETE_AFTER_SECONDS: int = 3600  # Mark confirmed appointments completed an hour after they start
+    SCHEDULER_REMINDER_STREAM_MAXLEN: int = 10000
+    
+    # Table partitioning settings
+    APPOINTMENT_PARTITION_PREMAKE_MONTHS: int = 3  # Monthly partitions kept ready ahead of the current month
+    APPOINTMENT_RETENTION_MONTHS: int = 12  # Older months are detached and archived
+    APPOINTMENT_ARCHIVE_DIR: str = "archive"  # Must be readable by the API to serve archived appointments
+    ARCHIVE_PAGE_SIZE: int = 50
+    ARCHIVE_MAX_PAGE_SIZE: int = 200
+    APPOINTMENT_MAINTENANCE_INTERVAL: float = 3600.0
+    
+    # Bulk import settings
+    IMPORT_BATCH_SIZE: int = 5000  # Rows per COPY batch
+    IMPORT_HASH_PROCESSES: Optional[int] = None  # Password hashing processes (default: CPU count)
+    IMPORT_MAX_ERRORS: int = 100  # Invalid rows reported in detail per import
+    
+    # Change feed settings
+    CHANGE_FEED_PAGE_SIZE: int = 100
+    CHANGE_FEED_MAX_PAGE_SIZE: int = 1000
+    
+    # Appointment search settings
+    SEARCH_PAGE_SIZE: int = 20
+    SEARCH_MAX_PAGE_SIZE: int = 100
+    SEARCH_MAX_TERMS: int = 8
+    SEARCH_SIMILARITY_THRESHOLD: float = 0.6  # pg_trgm word similarity each query term needs to match
+    
+    # Conditional GET settings
+    ETAG_STAMP_TTL: int = 300  # Seconds an ETag remembered in Redis can answer If-None-Match without a query
+    
+    # Response compression settings
+    COMPRESSION_MIN_SIZE: int = 1024  # Bytes; smaller response bodies are sent uncompressed
+    COMPRESSION_GZIP_LEVEL: int = 6  # 1 (fastest) to 9 (smallest)
+    COMPRESSION_BROTLI_QUALITY: int = 4  # 0 to 11; brotli is only offered when the brotli package is installed
+    COMPRESSION_CACHE_TTL: int = 300  # Seconds a precompressed list response is kept (any change replaces it sooner)
+    
+    # Appointment cache settings
+    APPOINTMENT_CACHE_TTL: int = 900  # Upper bound on staleness if a write-through is missed
+    APPOINTMENT_CACHE_WARM_DAYS: int = 7  # Appointments this far ahead are preloaded
+    APPOINTMENT_CACHE_WARM_INTERVAL: float = 600.0  # Keep below APPOINTMENT_CACHE_TTL
+    APPOINTMENT_CACHE_WARM_BATCH_SIZE: int = 1000
+    
+    # Vehicle catalog settings
+    VEHICLE_CATALOG_REFRESH_INTERVAL: float = 300.0  # Seconds between reloads of each process's copy
+    VEHICLE_AUTOCOMPLETE_MAX_RESULTS: int = 10
+    VEHICLE_BACKFILL_BATCH_SIZE: int = 1000
+    
+    # Server settings (`python -m app`)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: Optional[int] = None  # API processes (default: one per CPU this process may run on)
+    SERVER_PRELOAD: bool = True  # Import the app once before forking; code changes then need a full restart
+    SERVER_REUSE_PORT: bool = False  # A socket per process (SO_REUSEPORT) instead of one shared socket
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE_TIMEOUT: int = 5  # Seconds an idle keep-alive connection stays open
+    SERVER_GRACEFUL_TIMEOUT: float = 30.0  # Seconds a stopping process waits for in-flight requests
+    SERVER_STARTUP_TIMEOUT: float = 60.0  # Wait for a replacement process during a rolling restart
+    SERVER_CPU_AFFINITY: bool = False  # Pin each API process to one CPU
+    SERVER_LOOP: str = "auto"  # uvicorn event loop; "auto" uses uvloop when it is installed
+    SERVER_HTTP: str = "auto"  # uvicorn HTTP parser; "auto" uses httptools when it is installed
+    SERVER_ACCESS_LOG: bool = False
+    SERVER_APPOINTMENT_WORKERS: int = 0  # Worker processes run alongside (0: run `python -m app.workers` separately)
     
     # API settings
     API_TIMEOUT: int = 30  # 30 seconds
     API_MAX_CONNECTIONS: int = 100
     
+    # Health check settings
+    LOOP_LAG_INTERVAL: float = 0.25  # Loop lag probe period
+    LIVENESS_MAX_LOOP_STALL: float = 5.0  # /healthz fails if the probe hasn't run for this long
+    HEALTH_CHECK_CACHE_TTL: float = 2.0  # /readyz result reuse window
+    HEALTH_CHECK_TIMEOUT: float = 1.0  # Per-dependency check timeout
+    READY_MAX_QUEUE_DEPTH: int = 10000
+    READY_MAX_LOOP_LAG: float = 0.5
+    
+    # Logging settings
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json or text
+    LOG_QUEUE_SIZE: int = 10000  # Records beyond this are dropped rather than blocking
+    LOG_DEDUP_WINDOW: float = 10.0  # Repeated warnings/errors are summarised per window
+    
+    # Admin settings
+    ADMIN_API_KEY: Optional[str] = None  # Admin endpoints are disabled when unset
+    
+    # Profiler settings
+    PROFILER_SAMPLE_INTERVAL: float = 0.005  # 5ms between stack samples
+    PROFILER_MAX_SECONDS: int = 120
+    PROFILER_SIGNAL_SECONDS: int = 30  # Duration of a SIGUSR1-triggered worker profile
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,100 @@
+import logging
+from typing import Iterable, Optional, Tuple
+
+import redis.asyncio as redis
+from fastapi import Response, status
+
+from .cache import redis_client
+from .config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Bumped after every committed change to any appointment (lists) and to each appointment
+APPOINTMENTS_VERSION_KEY = "appointments_version"
+APPOINTMENT_VERSION_KEY = "appointment_version:{}"
+# "<version>:<etag>" remembered for a resource, valid while the version is unchanged
+ETAG_STAMP_KEY = "etag_stamp:{}"
+
+# Per-appointment versions outlive every stamp taken against them, so an expired (reset)
+# version can't revive a stamp from before the last change
+_VERSION_TTL_FACTOR = 10
+
+# Appended to the ETag of a compressed representation, so each content coding has its own
+CODING_SUFFIXES = {"gzip": "-gz", "br": "-br"}
+
+def coded_etag(etag: str, encoding: Optional[str]) -> str:
+    """ETag of a representation compressed with `encoding` (None: the identity ETag itself)"""
+    if encoding is None or not etag.endswith('"'):
+        return etag
+    return etag[:-1] + CODING_SUFFIXES[encoding] + '"'
+
+def _identity_etag(tag: str) -> str:
+    for suffix in CODING_SUFFIXES.values():
+        if tag.endswith(suffix + '"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for it).
+
+    A tag matches in any of its content codings: the representations only differ in encoding.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag or _identity_etag(tag) == etag:
+            return True
+    return False
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+def bump_versions(pipe, appointment_ids: Iterable[int]) -> None:
+    """Queue the version bumps for changed appointments on a Redis pipeline"""
+    pipe.incr(APPOINTMENTS_VERSION_KEY)
+    for appointment_id in appointment_ids:
+        key = APPOINTMENT_VERSION_KEY.format(appointment_id)
+        pipe.incr(key)
+        pipe.expire(key, settings.ETAG_STAMP_TTL * _VERSION_TTL_FACTOR)
+
+async def appointments_changed(appointment_ids: Iterable[int] = ()) -> None:
+    """Invalidate ETag stamps after committing changes (or inserts, with no ids) to appointments"""
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            bump_versions(pipe, appointment_ids)
+            await pipe.execute()
+    except redis.RedisError as e:
+        # Stamps taken before the change stay valid until ETAG_STAMP_TTL
+        logger.warning("Redis error bumping appointment versions: %s", e)
+
+async def read_stamp(scope: str, version_key: str) -> Tuple[Optional[str], Optional[str]]:
+    """Current version of a resource and its stamped ETag, if one was taken at that version.
+
+    Read the version *before* querying the database: a stamp saved with it is then
+    invalidated by any change committed in between.
+    """
+    try:
+        version, stamp = await redis_client.mget(version_key, ETAG_STAMP_KEY.format(scope))
+    except redis.RedisError as e:
+        logger.warning("Redis error reading ETag stamp: %s", e)
+        return None, None
+    version = version or "0"
+    if stamp is not None:
+        stamped_version, _, etag = stamp.partition(":")
+        if stamped_version == version:
+            return version, etag
+    return version, None
+
+async def save_stamp(scope: str, version: Optional[str], etag: str) -> None:
+    if version is None:
+        return
+    try:
+        await redis_client.set(ETAG_STAMP_KEY.format(scope), f"{version}:{etag}", ex=settings.ETAG_STAMP_TTL)
+    except redis.RedisError as e:
+        logger.warning("Redis error saving ETag stamp: %s", e)
@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import json
+import logging
+from typing import AsyncIterator, Dict, Optional, Set
+
+import redis.asyncio as redis
+
+from ..utils.cache import redis_client
+from ..utils.etag import bump_versions
+from ..utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+APPOINTMENT_STATUS_CHANNEL = "appointment_status"
+
+# Queued to waiters after the subscriber reconnects: events may have been missed, re-read state
+RESYNC = None
+
+status_waiters = registry.gauge(
+    "appointment_status_waiters",
+    "Clients currently waiting for an appointment status change in this process",
+)
+
+async def publish_status_change(appointment_id: int, status: str) -> None:
+    """Notify waiting clients in every process that an appointment's status changed.
+
+    Also retires its ETag stamps; call it after the change is committed.
+    """
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.publish(APPOINTMENT_STATUS_CHANNEL, json.dumps({"id": appointment_id, "status": status}))
+            bump_versions(pipe, [appointment_id])
+            await pipe.execute()
+    except redis.RedisError as e:
+        # Waiters fall back to their timeout and re-read the database
+        logger.warning("Redis error publishing status change: %s", e)
+
+class StatusBroadcaster:
+    """Fans status-change messages out to in-process waiters over one pub/sub connection"""
+
+    def __init__(self, client: redis.Redis, channel: str = APPOINTMENT_STATUS_CHANNEL):
+        self.client = client
+        self.channel = channel
+        self._waiters: Dict[int, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._waiter_count = 0
+        status_waiters.set_function(lambda: self._waiter_count)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, appointment_id: int) -> AsyncIterator[asyncio.Queue]:
+        """Register a waiter; the queue receives status strings (or RESYNC)"""
+        self.start()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._waiters.setdefault(appointment_id, set()).add(queue)
+        self._waiter_count += 1
+        try:
+            yield queue
+        finally:
+            self._waiter_count -= 1
+            waiters = self._waiters.get(appointment_id)
+            if waiters is not None:
+                waiters.discard(queue)
+                if not waiters:
+                    del self._waiters[appointment_id]
+
+    def _dispatch(self, data: str) -> None:
+        try:
+            event = json.loads(data)
+            waiters = self._waiters.get(int(event["id"]))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed status event: %s", data)
+            return
+        for queue in waiters or ():
+            queue.put_nowait(event["status"])
+
+    def _resync_all(self) -> None:
+        for waiters in self._waiters.values():
+            for queue in waiters:
+                queue.put_nowait(RESYNC)
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        connected_before = False
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                if connected_before:
+                    self._resync_all()
+                connected_before = True
+                backoff = 0.5
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Status subscriber disconnected: %s", e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10)
+            finally:
+                with contextlib.suppress(Exception):
+                    await pubsub.aclose()
+
+status_broadcaster = StatusBroadcaster(redis_client)
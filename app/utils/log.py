@@ -0,0 +1,197 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from ..utils.config import get_settings
+from ..utils.metrics import registry
+
+settings = get_settings()
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the request id and any `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id (runs in the logging caller's context)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """Deduplicate repeated warnings/errors with the same message template.
+
+    The first record for a (logger, level, template) key in each window passes through;
+    later ones are counted and summarised as "<message> ×N in last Ws" when the window
+    closes, so an outage logs a handful of lines instead of one per failed call.
+    """
+
+    def __init__(self, window: float = settings.LOG_DEDUP_WINDOW, min_level: int = logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.min_level = min_level
+        self._lock = threading.Lock()
+        # key -> [window start, suppressed count, last suppressed record]
+        self._state: Dict[Tuple[str, int, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level or getattr(record, "suppressed", None):
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                if state is not None and state[1]:
+                    # The periodic flush hasn't summarised the previous window yet
+                    record.msg = f"{record.msg} (+{state[1]} similar in previous {self.window:g}s)"
+                self._state[key] = [now, 0, None]
+                return True
+            state[1] += 1
+            state[2] = record
+            return False
+
+    def flush(self, handler: logging.Handler) -> None:
+        """Emit summaries for windows that have closed"""
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            for key, state in list(self._state.items()):
+                if now - state[0] < self.window:
+                    continue
+                if state[1]:
+                    summaries.append((state[2], state[1]))
+                del self._state[key]
+        for record, count in summaries:
+            record.msg = f"{record.getMessage()} ×{count + 1} in last {self.window:g}s"
+            record.args = None
+            record.suppressed = count
+            handler.handle(record)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(level: str = settings.LOG_LEVEL, fmt: str = settings.LOG_FORMAT) -> None:
+    """Route all logging through a bounded queue drained by a background thread"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    rate_limit_filter = RateLimitFilter()
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(rate_limit_filter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    registry.gauge(
+        "log_records_dropped",
+        "Log records dropped because the logging queue was full"
+    ).set_function(lambda: queue_handler.dropped)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    def flush_summaries():
+        while _listener is not None:
+            time.sleep(rate_limit_filter.window / 2)
+            rate_limit_filter.flush(queue_handler)
+
+    threading.Thread(target=flush_summaries, name="log-dedup-flush", daemon=True).start()
+    atexit.register(shutdown_logging)
+
+def restart_logging_after_fork() -> None:
+    """Set up logging afresh in a forked child; the parent's listener thread isn't copied"""
+    global _listener
+    _listener = None
+    setup_logging()
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the background thread"""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+
+class RequestIdMiddleware:
+    """ASGI middleware that binds an X-Request-ID to the request's logging context"""
+
+    def __init__(self, app, header_name: str = "X-Request-ID"):
+        self.app = app
+        self.header_name = header_name.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header_name:
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(self.header_name, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from ..utils.config import get_settings
+from ..utils.metrics import registry
+
+settings = get_settings()
+
+loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds",
+    "Delay between when the loop lag probe was scheduled to wake and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+class LoopLagMonitor:
+    """Measures event loop scheduling delay by timing a periodic sleep"""
+
+    def __init__(self, interval: float = settings.LOOP_LAG_INTERVAL, window: int = 40):
+        self.interval = interval
+        self.recent = deque(maxlen=window)
+        self.last_tick: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def current_lag(self) -> float:
+        return self.recent[-1] if self.recent else 0.0
+
+    @property
+    def max_recent_lag(self) -> float:
+        return max(self.recent) if self.recent else 0.0
+
+    def seconds_since_last_tick(self) -> float:
+        """Time since the probe last ran; grows without bound if the loop is stalled"""
+        if self.last_tick is None:
+            return 0.0
+        return time.monotonic() - self.last_tick
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.recent.append(lag)
+            self.last_tick = now
+            loop_lag_seconds.observe(lag)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self.last_tick = time.monotonic()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+loop_monitor = LoopLagMonitor()
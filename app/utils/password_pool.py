@@ -0,0 +1,43 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil
+from typing import List, Optional
+
+from passlib.context import CryptContext
+
+# Kept free of app imports: worker processes import this module to run hash_passwords
+
+def hash_passwords(passwords: List[str], rounds: int) -> List[str]:
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    return [context.hash(password) for password in passwords]
+
+class PasswordHashPool:
+    """Hashes batches of passwords across worker processes (bcrypt is CPU-bound)"""
+
+    def __init__(self, processes: Optional[int] = None):
+        self.processes = processes or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def hash_many(self, passwords: List[str], rounds: int) -> List[str]:
+        if not passwords:
+            return []
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        size = ceil(len(passwords) / self.processes)
+        chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        results = await asyncio.gather(
+            *[loop.run_in_executor(executor, hash_passwords, chunk, rounds) for chunk in chunks]
+        )
+        return [hashed for chunk in results for hashed in chunk]
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional, Set
+
+from ..utils.config import get_settings
+
+settings = get_settings()
+
+# Redis keys used to drive the profiler in the appointment worker process
+WORKER_PROFILE_REQUEST_KEY = "appointment_worker:profile_request"
+WORKER_PROFILE_RESULT_KEY = "appointment_worker:profile_result"
+WORKER_PROFILE_RESULT_TTL = 3600
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profiling session is already running"""
+
+class ProfileSession:
+    def __init__(self, route_prefix: Optional[str] = None, max_requests: Optional[int] = None):
+        self.route_prefix = route_prefix
+        self.max_requests = max_requests
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.completed_requests = 0
+        self.tracked_tasks: Set[asyncio.Task] = set()
+        self.done = asyncio.Event()
+        self.started_at = time.monotonic()
+
+    def matches(self, path: str) -> bool:
+        """Check whether a request path should be profiled in this session"""
+        return self.route_prefix is not None and path.startswith(self.route_prefix)
+
+    def request_started(self, task: asyncio.Task) -> None:
+        self.tracked_tasks.add(task)
+
+    def request_finished(self, task: asyncio.Task) -> None:
+        self.tracked_tasks.discard(task)
+        self.completed_requests += 1
+        if self.max_requests is not None and self.completed_requests >= self.max_requests:
+            self.done.set()
+
+    def collapsed(self) -> str:
+        """Render samples in collapsed-stack format (flamegraph.pl / speedscope compatible)"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _task_label(task: Optional[asyncio.Task]) -> str:
+    if task is None:
+        return "<event loop>"
+    coro = task.get_coro()
+    name = getattr(coro, "__qualname__", None) or type(coro).__name__
+    return f"<task {name}>"
+
+class SamplingProfiler:
+    """Stdlib sampling profiler that attributes event-loop thread samples to the running coroutine"""
+
+    def __init__(self, interval: float = settings.PROFILER_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.session: Optional[ProfileSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.session is not None
+
+    def start(self, route_prefix: Optional[str] = None, max_requests: Optional[int] = None) -> ProfileSession:
+        """Start sampling the thread running the current event loop"""
+        if self.session is not None:
+            raise ProfilerBusyError("A profiling session is already running")
+        self._loop = asyncio.get_running_loop()
+        self.session = ProfileSession(route_prefix, max_requests)
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(self.session, threading.get_ident()),
+            name="sampling-profiler",
+            daemon=True,
+        )
+        self._thread.start()
+        return self.session
+
+    def stop(self) -> str:
+        """Stop sampling and return the collapsed stacks"""
+        session = self.session
+        if session is None:
+            return ""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.session = None
+        self._thread = None
+        return session.collapsed()
+
+    def _run(self, session: ProfileSession, target_ident: int) -> None:
+        current_tasks = asyncio.tasks._current_tasks
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(target_ident)
+            if frame is None:
+                continue
+            task = current_tasks.get(self._loop)
+            # In route mode only samples taken while a tracked request is running count
+            if session.route_prefix is not None and task not in session.tracked_tasks:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(_task_label(task))
+            stack.reverse()
+            session.samples[";".join(stack)] += 1
+            session.sample_count += 1
+
+    async def profile(
+        self,
+        seconds: float,
+        route_prefix: Optional[str] = None,
+        max_requests: Optional[int] = None,
+    ) -> str:
+        """Profile for `seconds`, or until `max_requests` matching requests have completed"""
+        session = self.start(route_prefix, max_requests)
+        try:
+            if max_requests is not None:
+                try:
+                    await asyncio.wait_for(session.done.wait(), timeout=seconds)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(seconds)
+        finally:
+            result = self.stop()
+        return result
+
+class ProfilerMiddleware:
+    """ASGI middleware that marks requests matching an armed route-profiling session"""
+
+    def __init__(self, app, profiler: SamplingProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        session = self.profiler.session
+        if scope["type"] != "http" or session is None or not session.matches(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        session.request_started(task)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.request_finished(task)
+
+profiler = SamplingProfiler()
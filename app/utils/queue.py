@@ -1,20 +1,184 @@
 import json
+import logging
+import zlib
 from datetime import datetime
 import redis.asyncio as redis
 import pytz
 from ..utils.config import get_settings
 from ..utils.json_encoder import dumps, loads
 from fastapi import HTTPException, status
+from typing import Dict, Iterable, List, NamedTuple, Optional, Protocol
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
-# Redis queue keys
+# Redis queue keys. Requests are sharded into QUEUE_PARTITIONS partitions, each with one list per
+# priority lane ("appointment_requests:<partition>:<lane>"). The unsuffixed key and the per-partition
+# lists are earlier layouts, drained into the lanes by the workers.
 APPOINTMENT_QUEUE_KEY = "appointment_requests"
 APPOINTMENT_PROCESSING_KEY = "appointment_processing"
+# Sorted set mirroring the queued (not yet dequeued) ids, scored by enqueue sequence, plus one
+# per lane list ("appointment_pending:<partition>:<lane>") and a hash of id -> "<partition>:<lane>"
+APPOINTMENT_PENDING_KEY = "appointment_pending"
+APPOINTMENT_PENDING_LANES_KEY = "appointment_pending_lanes"
+APPOINTMENT_SEQUENCE_KEY = "appointment_queue_seq"
+# Hash of per-lane counters: "<lane>:depth", "<lane>:dequeued", "<lane>:wait_seconds"
+APPOINTMENT_LANE_STATS_KEY = "appointment_lane_stats"
+
+# KEYS: pending, sequence, lane stats, pending lanes, then the target queue and lane pending set
+# of each message; ARGV: id, lane, "<partition>:<lane>", message quadruples. Returns the number pending.
+ENQUEUE_LUA = """
+for i = 1, #ARGV, 4 do
+    local sequence = redis.call('INCR', KEYS[2])
+    redis.call('ZADD', KEYS[1], sequence, ARGV[i])
+    redis.call('ZADD', KEYS[6 + (i - 1) / 2], sequence, ARGV[i])
+    redis.call('HSET', KEYS[4], ARGV[i], ARGV[i + 2])
+    redis.call('LPUSH', KEYS[5 + (i - 1) / 2], ARGV[i + 3])
+    redis.call('HINCRBY', KEYS[3], ARGV[i + 1] .. ':depth', 1)
+end
+return redis.call('ZCARD', KEYS[1])
+"""
+
+# KEYS: lane queues in preference order, then processing, pending, lane stats, pending lanes,
+# then the lanes' pending sets in the same order; ARGV: the lanes' names. Pops from the first
+# non-empty lane; returns {lane index, message}.
+DEQUEUE_LUA = """
+local n = #ARGV
+for i = 1, n do
+    local message = redis.call('RPOPLPUSH', KEYS[i], KEYS[n + 1])
+    if message then
+        local id = string.format('%d', cjson.decode(message)['id'])
+        redis.call('ZREM', KEYS[n + 2], id)
+        redis.call('ZREM', KEYS[n + 4 + i], id)
+        redis.call('HDEL', KEYS[n + 4], id)
+        redis.call('HINCRBY', KEYS[n + 3], ARGV[i] .. ':depth', -1)
+        return {i, message}
+    end
+end
+return false
+"""
+
+# KEYS: source list, pending, sequence, lane stats, pending lanes, then the target queue and lane
+# pending set of each message; ARGV: id, lane, "<partition>:<lane>", message quadruples (oldest
+# first). Moved messages go to the back of their lane with a fresh sequence number.
+REQUEUE_LUA = """
+local moved = 0
+for i = 1, #ARGV, 4 do
+    if redis.call('LREM', KEYS[1], -1, ARGV[i + 3]) > 0 then
+        local sequence = redis.call('INCR', KEYS[3])
+        redis.call('LPUSH', KEYS[6 + (i - 1) / 2], ARGV[i + 3])
+        redis.call('ZADD', KEYS[2], sequence, ARGV[i])
+        redis.call('ZADD', KEYS[7 + (i - 1) / 2], sequence, ARGV[i])
+        redis.call('HSET', KEYS[5], ARGV[i], ARGV[i + 2])
+        redis.call('HINCRBY', KEYS[4], ARGV[i + 1] .. ':depth', 1)
+        moved = moved + 1
+    end
+end
+return moved
+"""
+
+def partition_for(appointment_time) -> int:
+    """Queue partition for an appointment: its UTC service date hashed into QUEUE_PARTITIONS.
+
+    All requests for the same day, and so for the same slot, land in one partition.
+    """
+    if isinstance(appointment_time, str):
+        appointment_time = datetime.fromisoformat(appointment_time)
+    service_date = appointment_time.astimezone(pytz.UTC).date().isoformat()
+    return zlib.crc32(service_date.encode()) % settings.QUEUE_PARTITIONS
+
+def lane_for(appointment_time, now: Optional[datetime] = None) -> str:
+    """Priority lane for an appointment: the first lane in QUEUE_LANES whose lead-time bound it is within"""
+    if isinstance(appointment_time, str):
+        appointment_time = datetime.fromisoformat(appointment_time)
+    lead_hours = (appointment_time - (now or datetime.now(pytz.UTC))).total_seconds() / 3600
+    for lane, max_lead_hours in settings.QUEUE_LANES.items():
+        if max_lead_hours is None or lead_hours <= max_lead_hours:
+            return lane
+    # No catch-all lane configured: the last lane takes the rest
+    return lane
+
+def lane_key(partition: int, lane: str) -> str:
+    return f"{APPOINTMENT_QUEUE_KEY}:{partition}:{lane}"
+
+def pending_lane_key(partition: int, lane: str) -> str:
+    return f"{APPOINTMENT_PENDING_KEY}:{partition}:{lane}"
+
+def partition_key(partition: int) -> str:
+    """Single list per partition used before priority lanes"""
+    return f"{APPOINTMENT_QUEUE_KEY}:{partition}"
+
+def _script_inputs(messages: Iterable[str]):
+    """Target lane and pending keys, and id, lane, placement, message quadruples for the enqueue/requeue scripts"""
+    keys, args = [], []
+    now = datetime.now(pytz.UTC)
+    for message in messages:
+        data = loads(message)
+        lane = lane_for(data["appointment_time"], now)
+        partition = partition_for(data["appointment_time"])
+        keys.extend((lane_key(partition, lane), pending_lane_key(partition, lane)))
+        args.extend((str(data["id"]), lane, f"{partition}:{lane}", message))
+    return keys, args
+
+class QueuePosition(NamedTuple):
+    # Requests its partition serves up to and including this one
+    position: int
+    # None for requests queued before per-lane tracking; position is then the global rank
+    lane: Optional[str]
+    # Requests all partitions serve meanwhile, for an ETA from the overall drain rate
+    served_before: int
+
+class WeightedLaneScheduler:
+    """Smooth weighted round robin over priority lanes (QUEUE_LANE_WEIGHTS).
+
+    Each pick yields every lane in preference order; the dequeue script serves the first
+    non-empty one. Lanes that were found empty don't accumulate credit, so an idle lane
+    can't burst ahead of the others once it fills up again.
+    """
+
+    def __init__(self, weights: Dict[str, int]):
+        self.weights = {lane: max(1, int(weight)) for lane, weight in weights.items()}
+        self.total = sum(self.weights.values())
+        self._credit: Dict[str, float] = {lane: 0.0 for lane in self.weights}
+
+    def order(self) -> List[str]:
+        for lane, weight in self.weights.items():
+            self._credit[lane] += weight
+        return sorted(self.weights, key=lambda lane: (-self._credit[lane], -self.weights[lane]))
+
+    def served(self, order: List[str], lane: Optional[str]) -> None:
+        """Charge the lane that was served; lanes skipped ahead of it were empty"""
+        for skipped in order:
+            if skipped == lane:
+                break
+            self._credit[skipped] = 0.0
+        if lane is not None:
+            self._credit[lane] -= self.total
+
+class EnqueueFallback(Protocol):
+    """Durable store that accepts queue messages while Redis is unavailable"""
+
+    async def append(self, message: str) -> None:
+        ...
 
 class AppointmentQueue:
-    def __init__(self, redis_client: redis.Redis):
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        fallback: Optional[EnqueueFallback] = None,
+        processing_key: str = APPOINTMENT_PROCESSING_KEY,
+    ):
         self.redis = redis_client
+        self.fallback = fallback
+        # Worker processes each use their own processing list so a restart only hands back its own messages
+        self.processing_key = processing_key
+        self._enqueue_script = redis_client.register_script(ENQUEUE_LUA)
+        self._dequeue_script = redis_client.register_script(DEQUEUE_LUA)
+        self._requeue_script = redis_client.register_script(REQUEUE_LUA)
+        self._lane_weights = {lane: settings.QUEUE_LANE_WEIGHTS.get(lane, 1) for lane in settings.QUEUE_LANES}
+        self._schedulers: Dict[int, WeightedLaneScheduler] = {}
+        # lane -> [seconds waited, requests] since the last flush_lane_stats
+        self._lane_waits: Dict[str, List[float]] = {}
 
     async def enqueue_appointment(self, appointment_data: dict) -> dict:
         """Add an appointment request to the queue"""
@@ -26,10 +190,21 @@ class AppointmentQueue:
             # Add timestamp to track when the request was made
             appointment_data["queued_at"] = datetime.now(pytz.UTC)
             message = dumps(appointment_data)
-            await self.redis.lpush(APPOINTMENT_QUEUE_KEY, message)
-            
-            # Get queue position
-            position = await self.get_queue_length()
+            try:
+                # The new item has the highest sequence, so its position is the pending count
+                position = await self.push_messages([message])
+            except redis.RedisError as e:
+                if self.fallback is None:
+                    raise
+                # Redis is down or the breaker is open: hand the message to the fallback store
+                logger.warning("Redis error in enqueue, using fallback: %s", e)
+                await self.fallback.append(message)
+                return {
+                    "status": "queued",
+                    "message": "Your appointment request has been queued for processing",
+                    "queue_position": None,
+                    "id": appointment_data["id"]
+                }
             
             response = {
                 "status": "queued",
@@ -40,60 +215,198 @@ class AppointmentQueue:
             
             return response
         except redis.RedisError as e:
-            print(f"Redis error in enqueue: {e}")
+            logger.error("Redis error in enqueue: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Service temporarily unavailable"
             )
         except ValueError as e:
-            print(f"Validation error in enqueue: {e}")
+            logger.warning("Validation error in enqueue: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=str(e)
             )
 
-    async def dequeue_appointment(self) -> dict:
-        """Get the next appointment request from the queue"""
+    async def push_messages(self, messages: List[str]) -> int:
+        """Append already-serialized messages to their partitions, oldest first; returns the pending count"""
+        queue_keys, args = _script_inputs(messages)
+        return await self._enqueue_script(
+            keys=[
+                APPOINTMENT_PENDING_KEY, APPOINTMENT_SEQUENCE_KEY, APPOINTMENT_LANE_STATS_KEY,
+                APPOINTMENT_PENDING_LANES_KEY, *queue_keys,
+            ],
+            args=args,
+        )
+
+    async def dequeue_appointment(self, partition: int) -> dict:
+        """Get the next appointment request from a queue partition, weighted-fair across lanes"""
+        scheduler = self._schedulers.get(partition)
+        if scheduler is None:
+            scheduler = self._schedulers[partition] = WeightedLaneScheduler(self._lane_weights)
+        order = scheduler.order()
         try:
-            # Atomic operation to move item from queue to processing list
-            message = await self.redis.rpoplpush(APPOINTMENT_QUEUE_KEY, APPOINTMENT_PROCESSING_KEY)
-            if message:
-                return loads(message)
-            return None
+            # Atomically move the item to the processing list and drop it from the pending set
+            result = await self._dequeue_script(
+                keys=[
+                    *(lane_key(partition, lane) for lane in order),
+                    self.processing_key, APPOINTMENT_PENDING_KEY, APPOINTMENT_LANE_STATS_KEY,
+                    APPOINTMENT_PENDING_LANES_KEY, *(pending_lane_key(partition, lane) for lane in order),
+                ],
+                args=order,
+            )
         except redis.RedisError as e:
-            print(f"Redis error in dequeue: {e}")
+            logger.error("Redis error in dequeue: %s", e)
+            return None
+        if not result:
+            scheduler.served(order, None)
             return None
+        lane = order[int(result[0]) - 1]
+        scheduler.served(order, lane)
+        appointment_data = loads(result[1])
+        queued_at = appointment_data.get("queued_at")
+        if isinstance(queued_at, datetime):
+            waits = self._lane_waits.setdefault(lane, [0.0, 0])
+            waits[0] += max(0.0, (datetime.now(pytz.UTC) - queued_at).total_seconds())
+            waits[1] += 1
+        return appointment_data
+
+    async def flush_lane_stats(self) -> None:
+        """Publish queue wait times accumulated by dequeue_appointment (called by the worker)"""
+        waits, self._lane_waits = self._lane_waits, {}
+        if not waits:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for lane, (seconds, count) in waits.items():
+                    pipe.hincrbyfloat(APPOINTMENT_LANE_STATS_KEY, f"{lane}:wait_seconds", seconds)
+                    pipe.hincrby(APPOINTMENT_LANE_STATS_KEY, f"{lane}:dequeued", int(count))
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Redis error recording lane wait times: %s", e)
+
+    async def get_lane_stats(self) -> Dict[str, Dict[str, float]]:
+        """Depth, dequeued total and cumulative wait seconds per lane, across all processes"""
+        raw = await self.redis.hgetall(APPOINTMENT_LANE_STATS_KEY)
+        stats = {lane: {"depth": 0, "dequeued": 0, "wait_seconds": 0.0} for lane in settings.QUEUE_LANES}
+        for field, value in raw.items():
+            lane, _, name = field.rpartition(":")
+            if lane in stats and name in stats[lane]:
+                stats[lane][name] = float(value)
+        for lane_stats in stats.values():
+            # Counters can drift below zero if the hash was reset with requests in flight
+            lane_stats["depth"] = max(0, int(lane_stats["depth"]))
+            lane_stats["dequeued"] = int(lane_stats["dequeued"])
+        return stats
 
     async def complete_processing(self, appointment_data: dict) -> None:
         """Remove the appointment request from the processing list"""
         try:
             message = dumps(appointment_data)
-            await self.redis.lrem(APPOINTMENT_PROCESSING_KEY, 1, message)
+            await self.redis.lrem(self.processing_key, 1, message)
+        except redis.RedisError as e:
+            logger.error("Redis error in complete_processing: %s", e)
+
+    async def requeue(self, appointment_data: dict) -> None:
+        """Move one failed request from the processing list to the back of the queue"""
+        try:
+            await self._requeue_messages([dumps(appointment_data)])
         except redis.RedisError as e:
-            print(f"Redis error in complete_processing: {e}")
+            logger.error("Redis error in requeue: %s", e)
 
     async def requeue_failed(self) -> None:
-        """Requeue any failed processing items back to the main queue"""
+        """Requeue everything left in this queue's processing list back to the main queue"""
         try:
-            while True:
-                message = await self.redis.rpoplpush(APPOINTMENT_PROCESSING_KEY, APPOINTMENT_QUEUE_KEY)
-                if not message:
-                    break
+            # The processing list is newest first; requeue the oldest first to keep order
+            messages = await self.redis.lrange(self.processing_key, 0, -1)
+            if messages:
+                await self._requeue_messages(reversed(messages))
         except redis.RedisError as e:
-            print(f"Redis error in requeue_failed: {e}")
+            logger.error("Redis error in requeue_failed: %s", e)
+
+    async def migrate_unpartitioned(self, batch_size: int = 500) -> int:
+        """Move requests left in earlier queue layouts (no partitions, no lanes) into the lanes"""
+        moved = 0
+        sources = [APPOINTMENT_QUEUE_KEY, *(partition_key(p) for p in range(settings.QUEUE_PARTITIONS))]
+        try:
+            for source in sources:
+                while True:
+                    # Oldest messages are at the tail
+                    messages = await self.redis.lrange(source, -batch_size, -1)
+                    if not messages:
+                        break
+                    moved += await self._requeue_messages(reversed(messages), source=source)
+        except redis.RedisError as e:
+            logger.error("Redis error in migrate_unpartitioned: %s", e)
+        except (KeyError, ValueError) as e:
+            logger.error("Malformed message in an old queue list: %s", e)
+        if moved:
+            logger.info("Moved %s queued requests into partition lanes", moved)
+        return moved
+
+    async def _requeue_messages(self, messages: Iterable[str], source: Optional[str] = None) -> int:
+        queue_keys, args = _script_inputs(messages)
+        return await self._requeue_script(
+            keys=[
+                source or self.processing_key, APPOINTMENT_PENDING_KEY, APPOINTMENT_SEQUENCE_KEY,
+                APPOINTMENT_LANE_STATS_KEY, APPOINTMENT_PENDING_LANES_KEY, *queue_keys,
+            ],
+            args=args,
+        )
 
     async def get_queue_length(self) -> int:
-        """Get the current length of the queue"""
+        """Get the current length of the queue across all partitions"""
         try:
-            return await self.redis.llen(APPOINTMENT_QUEUE_KEY)
+            return await self.redis.zcard(APPOINTMENT_PENDING_KEY)
         except redis.RedisError as e:
-            print(f"Redis error in get_queue_length: {e}")
+            logger.error("Redis error in get_queue_length: %s", e)
             return 0
 
+    async def get_queue_position(self, appointment_id: int) -> Optional[QueuePosition]:
+        """Estimated place of a queued appointment in the service order, or None once it has been dequeued.
+
+        Workers serve each partition's lanes by weight, so the requests ahead of this one are
+        those before it in its own lane plus, from each other lane of its partition, its weight
+        share of that many (at most that lane's depth). Partitions are served side by side, so
+        while this partition gets there every other one serves up to as many requests again.
+        New arrivals in heavier lanes are not counted.
+        """
+        member = str(appointment_id)
+        placement = await self.redis.hget(APPOINTMENT_PENDING_LANES_KEY, member)
+        if placement is None:
+            # Queued before per-lane tracking, or not queued at all
+            rank = await self.redis.zrank(APPOINTMENT_PENDING_KEY, member)
+            return None if rank is None else QueuePosition(rank + 1, None, rank + 1)
+
+        partition, _, lane = placement.partition(":")
+        partition = int(partition)
+        lanes = list(self._lane_weights)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrank(pending_lane_key(partition, lane), member)
+            for other_partition in range(settings.QUEUE_PARTITIONS):
+                for other_lane in lanes:
+                    pipe.zcard(pending_lane_key(other_partition, other_lane))
+            rank, *depths = await pipe.execute()
+        if rank is None:
+            # Dequeued between the two reads
+            return None
+
+        in_lane = rank + 1
+        weight = self._lane_weights.get(lane, 1)
+        own_depths = dict(zip(lanes, depths[partition * len(lanes):(partition + 1) * len(lanes)]))
+        position = in_lane + sum(
+            min(depth, in_lane * self._lane_weights[other_lane] // weight)
+            for other_lane, depth in own_depths.items() if other_lane != lane
+        )
+        served_before = position + sum(
+            min(sum(depths[p * len(lanes):(p + 1) * len(lanes)]), position)
+            for p in range(settings.QUEUE_PARTITIONS) if p != partition
+        )
+        return QueuePosition(position, lane, served_before)
+
     async def get_processing_length(self) -> int:
         """Get the number of items being processed"""
         try:
-            return await self.redis.llen(APPOINTMENT_PROCESSING_KEY)
+            return await self.redis.llen(self.processing_key)
         except redis.RedisError as e:
-            print(f"Redis error in get_processing_length: {e}")
+            logger.error("Redis error in get_processing_length: %s", e)
             return 0 
\ No newline at end of file
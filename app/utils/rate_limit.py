@@ -0,0 +1,226 @@
+import asyncio
+import ipaddress
+import logging
+import time
+from math import ceil
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import NoScriptError
+from fastapi import HTTPException, status
+from starlette.requests import Request
+
+from ..utils.cache import redis_client
+from ..utils.config import get_settings
+from ..utils.metrics import registry
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_PREFIX = "rate_limit"
+
+rate_limit_redis_reservations = registry.counter(
+    "rate_limit_redis_reservations_total",
+    "Quota leases reserved from Redis by the hybrid rate limiter",
+)
+rate_limit_rejections = registry.counter(
+    "rate_limit_rejections_total",
+    "Requests rejected by the rate limiter",
+    ["route"],
+)
+rate_limit_fallbacks = registry.counter(
+    "rate_limit_local_fallback_total",
+    "Rate limit checks answered by the in-process fallback because Redis was unavailable",
+)
+
+# Atomically reserve up to ARGV[2] requests from a window allowing ARGV[1]; returns the
+# number granted (0 when the window is exhausted) and the window's remaining TTL in ms
+RESERVE_LUA = """
+local limit = tonumber(ARGV[1])
+local chunk = tonumber(ARGV[2])
+local used = redis.call('INCRBY', KEYS[1], chunk)
+if used == chunk then
+    redis.call('PEXPIRE', KEYS[1], ARGV[3])
+end
+local before = used - chunk
+local granted = math.max(0, math.min(chunk, limit - before))
+return {granted, redis.call('PTTL', KEYS[1])}
+"""
+
+def get_route_limit(route: str) -> Tuple[int, int]:
+    """Resolve (times, seconds) for a route from RATE_LIMITS, falling back to the global limit"""
+    spec = settings.RATE_LIMITS.get(route)
+    if spec:
+        times, seconds = spec.split("/")
+        return int(times), int(seconds)
+    return settings.RATE_LIMIT_TIMES, settings.RATE_LIMIT_SECONDS
+
+_trusted_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.RATE_LIMIT_TRUSTED_PROXIES]
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_proxies)
+
+def client_identifier(request: Request) -> str:
+    """The address to limit: the peer itself unless it is a trusted proxy.
+
+    Behind trusted proxies, X-Forwarded-For is read from the right and the first hop not
+    added by one of them is the client. Entries left of that are supplied by the client and
+    could be anything, so they are never used.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not is_trusted_proxy(peer):
+        return peer
+    hops = [hop.strip() for hop in ",".join(request.headers.getlist("X-Forwarded-For")).split(",")]
+    for hop in reversed([hop for hop in hops if hop]):
+        if not is_trusted_proxy(hop):
+            return hop
+    return peer
+
+class LocalFixedWindow:
+    """In-process fixed-window counters used while Redis is unavailable"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> [window start, count]
+        self._windows: Dict[str, List[float]] = {}
+
+    def hit(self, key: str, times: int, milliseconds: int) -> int:
+        """Count a hit; return 0 if allowed, otherwise the milliseconds until the window resets"""
+        now = time.monotonic() * 1000
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= milliseconds:
+            if len(self._windows) >= self.max_keys:
+                self._prune(now, milliseconds)
+            self._windows[key] = [now, 1]
+            return 0
+        if window[1] >= times:
+            return max(1, int(window[0] + milliseconds - now))
+        window[1] += 1
+        return 0
+
+    def _prune(self, now: float, milliseconds: int) -> None:
+        expired = [key for key, window in self._windows.items() if now - window[0] >= milliseconds]
+        for key in expired:
+            del self._windows[key]
+        if len(self._windows) >= self.max_keys:
+            self._windows.clear()
+
+local_windows = LocalFixedWindow()
+
+class _Lease:
+    __slots__ = ("window", "tokens", "exhausted_until", "pending")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.tokens = 0
+        # Monotonic time until which Redis reported the window exhausted
+        self.exhausted_until = 0.0
+        self.pending: Optional[asyncio.Future] = None
+
+class RateLimiter:
+    """Hybrid fixed-window rate limiter dependency.
+
+    Windows are aligned to wall-clock multiples of `seconds` so every process agrees on
+    them. Each process serves requests from a local lease of tokens and only goes to Redis
+    to reserve the next chunk (RATE_LIMIT_LEASE_SIZE, capped to a fraction of the limit),
+    so most requests never touch Redis. Tokens leased but not used by a process are lost
+    at the end of the window, so the global limit is approximate: up to
+    (processes x (chunk - 1)) requests per window may be refused early, never allowed in
+    excess. If Redis is unavailable each process enforces the limit locally.
+    """
+
+    def __init__(self, route: str, max_keys: int = 100000):
+        self.route = route
+        self.max_keys = max_keys
+        self._leases: Dict[str, _Lease] = {}
+
+    @property
+    def limit(self) -> Tuple[int, int]:
+        return get_route_limit(self.route)
+
+    def _chunk_size(self, times: int) -> int:
+        return max(1, min(settings.RATE_LIMIT_LEASE_SIZE, times // 10))
+
+    def _get_lease(self, key: str, window: int) -> _Lease:
+        lease = self._leases.get(key)
+        if lease is None or lease.window != window:
+            if lease is None and len(self._leases) >= self.max_keys:
+                self._leases = {k: v for k, v in self._leases.items() if v.window == window}
+                if len(self._leases) >= self.max_keys:
+                    self._leases.clear()
+            lease = self._leases[key] = _Lease(window)
+        return lease
+
+    async def _reserve(self, lease: _Lease, redis_key: str, times: int, seconds: int) -> None:
+        args = (1, redis_key, times, self._chunk_size(times), seconds * 1000)
+        try:
+            granted, pttl = await redis_client.evalsha(await get_reserve_sha(), *args)
+        except NoScriptError:
+            # Redis restarted or flushed its script cache
+            granted, pttl = await redis_client.evalsha(await get_reserve_sha(reload=True), *args)
+        rate_limit_redis_reservations.inc()
+        lease.tokens += int(granted)
+        if not granted:
+            lease.exhausted_until = time.monotonic() + max(int(pttl), 0) / 1000
+
+    def _reject(self, retry_after: float) -> None:
+        rate_limit_rejections.inc(route=self.route)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too Many Requests",
+            headers={"Retry-After": str(max(1, ceil(retry_after)))}
+        )
+
+    async def __call__(self, request: Request):
+        times, seconds = self.limit
+        client = client_identifier(request)
+        now = time.time()
+        window = int(now // seconds)
+        key = f"{client}:{self.route}"
+        lease = self._get_lease(key, window)
+
+        while lease.tokens <= 0:
+            if time.monotonic() < lease.exhausted_until:
+                self._reject(lease.exhausted_until - time.monotonic())
+            if lease.pending is not None:
+                # Another request from this client is already reserving; share its result
+                await asyncio.shield(lease.pending)
+                continue
+            lease.pending = asyncio.get_running_loop().create_future()
+            try:
+                await self._reserve(lease, f"{RATE_LIMIT_PREFIX}:{key}:{window}", times, seconds)
+            except redis.RedisError as e:
+                logger.warning("Rate limiter using local fallback: %s", e)
+                rate_limit_fallbacks.inc()
+                pexpire = local_windows.hit(key, times, seconds * 1000)
+                if pexpire:
+                    self._reject(pexpire / 1000)
+                return
+            finally:
+                lease.pending.set_result(None)
+                lease.pending = None
+            if lease.tokens <= 0 and lease.exhausted_until <= time.monotonic():
+                # Window rolled over between reservation and reply
+                self._reject((window + 1) * seconds - time.time())
+
+        lease.tokens -= 1
+
+_reserve_sha: Optional[str] = None
+
+async def get_reserve_sha(reload: bool = False) -> str:
+    """Load the reservation script once per process (reloaded if Redis lost it)"""
+    global _reserve_sha
+    if _reserve_sha is None or reload:
+        _reserve_sha = await redis_client.script_load(RESERVE_LUA)
+    return _reserve_sha
+
+async def init_rate_limiter() -> None:
+    """Preload the reservation script; failures are tolerated and retried lazily"""
+    try:
+        await get_reserve_sha(reload=True)
+    except redis.RedisError as e:
+        logger.warning("Redis unavailable during rate limiter init: %s", e)
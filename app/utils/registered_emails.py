@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from typing import Iterable, List, Optional, Set
+
+import redis.asyncio as redis
+from sqlalchemy import func, select
+
+from ..database.base import AsyncSessionLocal
+from ..models.user import User
+from .bloom import BloomFilter
+from .cache import redis_client
+from .config import get_settings
+from .metrics import registry
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Emails registered recently (score = registration time), covering the gap since each process's last build
+RECENT_REGISTRATIONS_KEY = "recent_registrations"
+# Member of that set scored with the time from which it holds every registration
+COVERAGE_MEMBER = ""
+
+# Delays between attempts to record registrations Redis refused, in seconds
+RECORD_RETRY_BACKOFF = 0.5
+RECORD_RETRY_BACKOFF_MAX = 30.0
+
+# KEYS: recent registrations; ARGV: now, trim cutoff, then the emails. The coverage start
+# moves up to the cutoff as older entries are trimmed; a set recreated after eviction only
+# covers from now.
+RECORD_LUA = """
+local since = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[3]) or ARGV[1])
+if since < tonumber(ARGV[2]) then
+    since = tonumber(ARGV[2])
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[2])
+redis.call('ZADD', KEYS[1], since, ARGV[3])
+for i = 4, #ARGV do
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[i])
+end
+return since
+"""
+
+login_filter_rejections = registry.counter(
+    "login_filter_rejections_total",
+    "Logins rejected because the email is certainly not registered (no database query)",
+)
+
+class RegisteredEmailFilter:
+    """Answers "might this email be registered?" without touching the database.
+
+    Each process builds a Bloom filter of all registered emails and rebuilds it every
+    LOGIN_FILTER_REBUILD_INTERVAL. Registrations made since a build (possibly in other
+    processes) are found in a Redis sorted set that is trimmed to twice that interval; the
+    set also records since when it is complete, so after it is evicted or trimmed past a
+    build, that build's negatives aren't trusted. Registrations Redis refuses are retried
+    until recorded. Any doubt — filter not built yet, Redis unavailable, set not reaching
+    back to the build — answers "maybe".
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._record_script = client.register_script(RECORD_LUA)
+        self._filter: Optional[BloomFilter] = None
+        self._built_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._unrecorded: Set[str] = set()
+        self._retry_task: Optional[asyncio.Task] = None
+
+    async def build(self) -> None:
+        started = time.monotonic()
+        built_at = time.time()
+        try:
+            # Registrations from here on are either in the database snapshot below or in the set
+            await self.client.zadd(RECENT_REGISTRATIONS_KEY, {COVERAGE_MEMBER: built_at}, nx=True)
+        except redis.RedisError as e:
+            logger.warning("Redis error marking recent registrations: %s", e)
+        async with AsyncSessionLocal() as session:
+            users = (await session.execute(select(func.count(User.id)))).scalar_one()
+            bloom = BloomFilter(max(settings.LOGIN_FILTER_CAPACITY, users * 2), settings.LOGIN_FILTER_ERROR_RATE)
+            emails = await session.stream_scalars(select(User.email).execution_options(yield_per=10000))
+            async for email in emails:
+                bloom.add(email)
+        self._filter = bloom
+        self._built_at = built_at
+        logger.info(
+            "Built registered-email filter with %s emails in %.2fs", bloom.count, time.monotonic() - started
+        )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.build()
+            except Exception as e:
+                logger.error("Failed to build registered-email filter: %s", e)
+            await asyncio.sleep(settings.LOGIN_FILTER_REBUILD_INTERVAL)
+
+    def start(self) -> None:
+        if settings.LOGIN_FILTER_ENABLED and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._retry_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._retry_task = None
+
+    async def might_exist(self, email: str) -> bool:
+        bloom = self._filter
+        if bloom is None or email in bloom:
+            return True
+        try:
+            since, registered = await self.client.zmscore(RECENT_REGISTRATIONS_KEY, [COVERAGE_MEMBER, email])
+        except redis.RedisError as e:
+            logger.warning("Redis error checking recent registrations: %s", e)
+            return True
+        if registered is not None:
+            return True
+        if since is None or since > self._built_at:
+            # The set was evicted or trimmed since this filter was built, so may miss registrations
+            return True
+        login_filter_rejections.inc()
+        return False
+
+    async def record_registration(self, email: str) -> None:
+        await self.record_registrations([email])
+
+    async def _record(self, emails: Iterable[str]) -> None:
+        now = time.time()
+        await self._record_script(
+            keys=[RECENT_REGISTRATIONS_KEY],
+            args=[now, now - 2 * settings.LOGIN_FILTER_REBUILD_INTERVAL, COVERAGE_MEMBER, *emails],
+        )
+
+    async def record_registrations(self, emails: List[str]) -> None:
+        if not emails:
+            return
+        if self._filter is not None:
+            for email in emails:
+                self._filter.add(email)
+        try:
+            await self._record(emails)
+        except redis.RedisError as e:
+            # Until these are recorded, other processes may reject these users' logins
+            logger.error("Redis error recording %s registrations, retrying: %s", len(emails), e)
+            self._unrecorded.update(emails)
+            if self._retry_task is None or self._retry_task.done():
+                self._retry_task = asyncio.create_task(self._retry_unrecorded())
+
+    async def _retry_unrecorded(self) -> None:
+        delay = RECORD_RETRY_BACKOFF
+        while self._unrecorded:
+            await asyncio.sleep(delay)
+            emails = list(self._unrecorded)
+            try:
+                await self._record(emails)
+            except redis.RedisError as e:
+                logger.warning("Redis error retrying %s registrations: %s", len(emails), e)
+                delay = min(delay * 2, RECORD_RETRY_BACKOFF_MAX)
+                continue
+            self._unrecorded.difference_update(emails)
+            logger.info("Recorded %s registrations after a Redis error", len(emails))
+
+registered_emails = RegisteredEmailFilter(redis_client)
@@ -0,0 +1,50 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, Tuple
+
+import pytz
+import redis.asyncio as redis
+
+from ..utils.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Sorted set of pending timed events, member "<kind>:<appointment id>", score = fire time (epoch seconds)
+SCHEDULE_KEY = "appointment_schedule"
+
+# Event kinds
+REMIND = "remind"  # Confirmed appointment coming up: emit a reminder
+EXPIRE = "expire"  # Appointment time reached while still pending: cancel it
+COMPLETE = "complete"  # Confirmed appointment is over: mark it completed
+
+ScheduledEvent = Tuple[str, int, float]
+
+def event_member(kind: str, appointment_id: int) -> str:
+    return f"{kind}:{appointment_id}"
+
+def parse_member(member: str) -> Tuple[str, int]:
+    kind, _, appointment_id = member.partition(":")
+    return kind, int(appointment_id)
+
+def pending_events(appointment_id: int, appointment_time: datetime) -> List[ScheduledEvent]:
+    """Events for a newly requested appointment"""
+    return [(EXPIRE, appointment_id, appointment_time.timestamp())]
+
+def confirmed_events(appointment_id: int, appointment_time: datetime) -> List[ScheduledEvent]:
+    """Events for a confirmed appointment (a reminder only if its time is still ahead)"""
+    events = [(COMPLETE, appointment_id, appointment_time.timestamp() + settings.SCHEDULER_COMPLETE_AFTER_SECONDS)]
+    remind_at = appointment_time - timedelta(seconds=settings.SCHEDULER_REMINDER_LEAD_SECONDS)
+    if remind_at > datetime.now(pytz.UTC):
+        events.append((REMIND, appointment_id, remind_at.timestamp()))
+    return events
+
+async def schedule_events(redis_client: redis.Redis, events: Iterable[ScheduledEvent]) -> None:
+    """Add events to the shared schedule; failures are logged, handlers re-check status anyway"""
+    mapping = {event_member(kind, appointment_id): fire_at for kind, appointment_id, fire_at in events}
+    if not mapping:
+        return
+    try:
+        await redis_client.zadd(SCHEDULE_KEY, mapping)
+    except redis.RedisError as e:
+        logger.warning("Redis error scheduling appointment events: %s", e)
@@ -0,0 +1,285 @@
+import asyncio
+import fcntl
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from ..utils.config import get_settings
+from ..utils.metrics import registry
+from ..utils.queue import AppointmentQueue
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+spool_appended = registry.counter(
+    "appointment_spool_appended_total",
+    "Queue messages written to the local spool because Redis was unavailable",
+)
+spool_replayed = registry.counter(
+    "appointment_spool_replayed_total",
+    "Spooled queue messages replayed into Redis",
+)
+spool_fsync_seconds = registry.histogram(
+    "appointment_spool_fsync_seconds",
+    "Time to write and fsync one batch of spooled messages",
+)
+
+OFFSET_FILE = "offset"
+LOCK_FILE = "lock"
+SEGMENT_SUFFIX = ".log"
+
+def _segment_name(seq: int) -> str:
+    return f"{seq:012d}{SEGMENT_SUFFIX}"
+
+class AppointmentSpool:
+    """Append-only, segment-rotated local spool for queue messages.
+
+    Appends are group-committed: messages arriving while a batch is being fsynced are
+    written together in the next batch, so enqueue latency stays bounded by roughly one
+    fsync. A drainer replays messages into the queue in batches and records progress in an
+    atomically replaced offset file; a crash between LPUSH and the offset update replays
+    that batch again (at-least-once delivery).
+
+    Each process claims its own slot directory under SPOOL_DIR with an exclusive flock, so
+    several API workers can share a host and a restarted process picks up an orphaned slot.
+    """
+
+    def __init__(
+        self,
+        base_dir: str = settings.SPOOL_DIR,
+        segment_bytes: int = settings.SPOOL_SEGMENT_BYTES,
+        fsync_interval: float = settings.SPOOL_FSYNC_INTERVAL,
+        drain_batch_size: int = settings.SPOOL_DRAIN_BATCH_SIZE,
+    ):
+        self.base_dir = base_dir
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.drain_batch_size = drain_batch_size
+        self.directory: Optional[str] = None
+        self._lock_fd: Optional[int] = None
+        self._segment_seq = 0
+        self._segment_fd: Optional[int] = None
+        self._segment_size = 0
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # Set by stop(): the flusher writes what is pending and exits instead of waiting
+        self._closing = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        # Lets the drainer skip disk reads while nothing new has been spooled
+        self._appended_batches = 0
+        self._idle_marker: Optional[int] = None
+
+    # Setup
+
+    def _claim_slot(self) -> None:
+        os.makedirs(self.base_dir, exist_ok=True)
+        slot = 0
+        while True:
+            directory = os.path.join(self.base_dir, str(slot))
+            os.makedirs(directory, exist_ok=True)
+            fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                slot += 1
+                continue
+            self.directory = directory
+            self._lock_fd = fd
+            return
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _open_segment(self, seq: int) -> None:
+        if self._segment_fd is not None:
+            os.close(self._segment_fd)
+        path = os.path.join(self.directory, _segment_name(seq))
+        self._segment_fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segment_seq = seq
+        self._segment_size = os.fstat(self._segment_fd).st_size
+
+    def _recover(self) -> None:
+        """Open the newest segment for appends, dropping a torn trailing record"""
+        segments = self._segments()
+        seq = segments[-1] if segments else self._read_offset()[0]
+        path = os.path.join(self.directory, _segment_name(seq))
+        if os.path.exists(path):
+            with open(path, "rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+                    logger.warning("Truncated torn record at the end of %s", path)
+        self._open_segment(seq)
+
+    def _read_offset(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, OFFSET_FILE)) as f:
+                seq, position = f.read().split()
+                return int(seq), int(position)
+        except (FileNotFoundError, ValueError):
+            segments = self._segments()
+            return (segments[0] if segments else 0), 0
+
+    def _write_offset(self, seq: int, position: int) -> None:
+        path = os.path.join(self.directory, OFFSET_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"{seq} {position}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    # Appending
+
+    async def append(self, message: str) -> None:
+        """Durably append a message; returns once it has been fsynced"""
+        if self._wakeup is None:
+            raise RuntimeError("Spool has not been started")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((message, future))
+        self._wakeup.set()
+        await future
+
+    def _write_batch(self, messages: List[str]) -> None:
+        data = "".join(message + "\n" for message in messages).encode()
+        if self._segment_size and self._segment_size + len(data) > self.segment_bytes:
+            os.fsync(self._segment_fd)
+            self._open_segment(self._segment_seq + 1)
+        os.write(self._segment_fd, data)
+        os.fsync(self._segment_fd)
+        self._segment_size += len(data)
+
+    async def _write_pending(self) -> None:
+        """Write and fsync everything appended so far, then resolve the appenders' futures"""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await asyncio.to_thread(self._write_batch, [message for message, _ in batch])
+        except Exception as e:
+            logger.error("Error writing spool batch: %s", e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        spool_fsync_seconds.observe(loop.time() - start)
+        spool_appended.inc(len(batch))
+        self._appended_batches += 1
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def _flush_loop(self) -> None:
+        # The only writer while running: never cancelled, since cancelling can't stop a write
+        # already running in its thread
+        while not (self._closing and not self._pending):
+            if not self._closing:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                # Let concurrent appends accumulate into one fsync
+                await asyncio.sleep(self.fsync_interval)
+            await self._write_pending()
+
+    # Draining
+
+    def _read_batch(self) -> Tuple[List[str], int, int]:
+        """Read up to drain_batch_size messages from the committed offset"""
+        seq, position = self._read_offset()
+        while True:
+            path = os.path.join(self.directory, _segment_name(seq))
+            messages: List[str] = []
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    f.seek(position)
+                    while len(messages) < self.drain_batch_size:
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            break
+                        messages.append(line[:-1].decode())
+                        position += len(line)
+            if messages or seq >= self._segment_seq:
+                return messages, seq, position
+            # Fully drained an older segment: move on and remove it
+            seq, position = seq + 1, 0
+            self._write_offset(seq, position)
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def _drain_loop(self, queue: AppointmentQueue) -> None:
+        while True:
+            try:
+                marker = self._appended_batches
+                if marker == self._idle_marker:
+                    await asyncio.sleep(settings.SPOOL_DRAIN_INTERVAL)
+                    continue
+                messages, seq, position = await asyncio.to_thread(self._read_batch)
+                if not messages:
+                    self._idle_marker = marker
+                    continue
+                # The spool holds messages oldest first, the order push_messages expects
+                await queue.push_messages(messages)
+                await asyncio.to_thread(self._write_offset, seq, position)
+                spool_replayed.inc(len(messages))
+                logger.info("Replayed %s spooled appointment requests into Redis", len(messages))
+            except redis.RedisError as e:
+                logger.warning("Spool drain waiting for Redis: %s", e)
+                await asyncio.sleep(settings.SPOOL_DRAIN_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Spool drain error: %s", e)
+                await asyncio.sleep(settings.SPOOL_DRAIN_INTERVAL)
+
+    # Lifecycle
+
+    async def start(self, queue: AppointmentQueue) -> None:
+        """Claim a slot, recover the tail segment and start the flusher and drainer"""
+        await asyncio.to_thread(self._claim_slot)
+        await asyncio.to_thread(self._recover)
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        self._drain_task = asyncio.create_task(self._drain_loop(queue))
+
+    async def stop(self) -> None:
+        """Flush pending appends and release the slot"""
+        if self._drain_task is not None:
+            self._drain_task.cancel()
+            try:
+                await self._drain_task
+            except asyncio.CancelledError:
+                pass
+            self._drain_task = None
+        if self._flush_task is not None:
+            # Let the flusher finish its current write and drain what is pending
+            self._closing = True
+            self._wakeup.set()
+            await self._flush_task
+            self._flush_task = None
+        # Appends from here on fail; write any that came in while the flusher was exiting
+        self._wakeup = None
+        while self._pending:
+            await self._write_pending()
+        if self._segment_fd is not None:
+            os.close(self._segment_fd)
+            self._segment_fd = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+appointment_spool = AppointmentSpool()
@@ -0,0 +1,93 @@
+from typing import Any, List, Optional, Tuple
+
+class HierarchicalTimingWheel:
+    """Hierarchical timing wheel: O(1) inserts, and advancing costs O(elapsed ticks + due items).
+
+    Level 0 has `wheel_size` slots of one tick each; every level above covers `wheel_size`
+    slots of the level below. Entries sit in the coarsest level that fits their deadline and
+    cascade down as the wheel turns. Deadlines beyond the top level wait in an overflow list
+    that is re-placed each time the top level wraps.
+    """
+
+    def __init__(self, tick: float, wheel_size: int = 64, levels: int = 3, start: float = 0.0):
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.levels = levels
+        self._slots: List[List[List[Tuple[float, Any]]]] = [
+            [[] for _ in range(wheel_size)] for _ in range(levels)
+        ]
+        self._overflow: List[Tuple[float, Any]] = []
+        self._ready: List[Tuple[float, Any]] = []
+        # Next tick that has not been fired yet
+        self._current = int(start // tick)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _place(self, entry: Tuple[float, Any]) -> None:
+        # Round up so nothing fires before its deadline
+        due_tick = int(-(-entry[0] // self.tick))
+        if due_tick < self._current:
+            # Already due: returned by the next advance()
+            self._ready.append(entry)
+            return
+        delta = due_tick - self._current
+        span = 1
+        for level in range(self.levels):
+            if delta < span * self.wheel_size:
+                self._slots[level][(due_tick // span) % self.wheel_size].append(entry)
+                return
+            span *= self.wheel_size
+        self._overflow.append(entry)
+
+    def add(self, deadline: float, item: Any) -> None:
+        """Schedule `item` to be returned by the first advance() at or after `deadline`"""
+        self._place((deadline, item))
+        self._count += 1
+
+    def advance(self, now: float, limit: Optional[int] = None) -> List[Any]:
+        """Turn the wheel up to `now` and return the items that became due.
+
+        With `limit`, stop after the tick in which at least that many items became due;
+        the remaining ticks are processed by the next call.
+        """
+        target = int(now // self.tick)
+        due: List[Any] = [item for _, item in self._ready]
+        self._ready = []
+        while self._current <= target:
+            slot = self._current % self.wheel_size
+            entries, self._slots[0][slot] = self._slots[0][slot], []
+            due.extend(item for _, item in entries)
+            self._current += 1
+
+            # Cascade coarser levels whose slot boundary was just crossed
+            span = self.wheel_size
+            for level in range(1, self.levels):
+                if self._current % span:
+                    break
+                slot = (self._current // span) % self.wheel_size
+                entries, self._slots[level][slot] = self._slots[level][slot], []
+                for entry in entries:
+                    self._place(entry)
+                span *= self.wheel_size
+            else:
+                if self._current % span == 0 and self._overflow:
+                    entries, self._overflow = self._overflow, []
+                    for entry in entries:
+                        self._place(entry)
+
+            if limit is not None and len(due) >= limit:
+                break
+        self._count -= len(due)
+        return due
+
+    def drain(self) -> List[Tuple[float, Any]]:
+        """Remove and return every pending (deadline, item)"""
+        entries = [entry for level in self._slots for slot in level for entry in slot]
+        entries += self._overflow + self._ready
+        self._slots = [[[] for _ in range(self.wheel_size)] for _ in range(self.levels)]
+        self._overflow = []
+        self._ready = []
+        self._count = 0
+        return entries
@@ -0,0 +1,49 @@
+import bisect
+from typing import Any, Dict, List, Optional, Tuple
+
+class _Node:
+    __slots__ = ("children", "best")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # (rank, value) of the best completions below this node, lowest rank first
+        self.best: List[Tuple[Any, Any]] = []
+
+class PrefixTrie:
+    """Prefix completion in O(len(prefix)): every node keeps its `max_results` best completions.
+
+    Values can be indexed under several keys (e.g. each word of a name) and are listed once.
+    """
+
+    def __init__(self, max_results: int = 10):
+        self.max_results = max_results
+        self._root = _Node()
+        self.count = 0
+
+    def insert(self, key: str, value: Any, rank: Any) -> None:
+        """Index `value` under `key`; completions are ordered by `rank`, then value"""
+        entry = (rank, value)
+        node = self._root
+        self._offer(node, entry)
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            self._offer(node, entry)
+        self.count += 1
+
+    def _offer(self, node: _Node, entry: Tuple[Any, Any]) -> None:
+        best = node.best
+        if len(best) == self.max_results and entry >= best[-1]:
+            return
+        if any(value == entry[1] for _, value in best):
+            return
+        bisect.insort(best, entry)
+        if len(best) > self.max_results:
+            best.pop()
+
+    def complete(self, prefix: str, limit: Optional[int] = None) -> List[Any]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [value for _, value in node.best[:limit]]
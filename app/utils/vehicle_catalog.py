@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from ..database.base import AsyncSessionLocal
+from ..models.vehicle import VehicleMake, VehicleModel
+from .config import get_settings
+from .trie import PrefixTrie
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_WORD_START = re.compile(r"(?<=[\s\-/])\w")
+
+def clean_vehicle_name(name: str) -> str:
+    """Spelling as stored: surrounding and repeated whitespace removed"""
+    return " ".join(name.split())
+
+def normalize_vehicle_name(name: str) -> str:
+    """Key that spelling variants ("Toyota", " toyota", "TOYOTA") share"""
+    return clean_vehicle_name(name).lower()
+
+class CatalogEntry(NamedTuple):
+    id: int
+    name: str
+
+class ResolvedVehicle(NamedTuple):
+    make: Optional[str]
+    model: Optional[str]
+    make_id: Optional[int]
+    model_id: Optional[int]
+
+class _Snapshot:
+    """Catalog contents and their tries; replaced wholesale on reload"""
+
+    def __init__(self):
+        self.makes: Dict[str, CatalogEntry] = {}
+        self.models: Dict[Tuple[int, str], CatalogEntry] = {}
+        self.make_trie = PrefixTrie(settings.VEHICLE_AUTOCOMPLETE_MAX_RESULTS)
+        self.model_tries: Dict[int, PrefixTrie] = {}
+
+    def add_make(self, entry: CatalogEntry) -> None:
+        key = normalize_vehicle_name(entry.name)
+        self.makes[key] = entry
+        _index(self.make_trie, key, entry)
+
+    def add_model(self, make_id: int, entry: CatalogEntry) -> None:
+        key = normalize_vehicle_name(entry.name)
+        self.models[(make_id, key)] = entry
+        trie = self.model_tries.get(make_id)
+        if trie is None:
+            trie = self.model_tries[make_id] = PrefixTrie(settings.VEHICLE_AUTOCOMPLETE_MAX_RESULTS)
+        _index(trie, key, entry)
+
+def _index(trie: PrefixTrie, key: str, entry: CatalogEntry) -> None:
+    # Also under each later word, so "rover" completes to "Land Rover" (after names starting with it)
+    trie.insert(key, entry, (0, key))
+    for match in _WORD_START.finditer(key):
+        trie.insert(key[match.start():], entry, (1, key))
+
+class VehicleCatalog:
+    """Normalized vehicle makes and models, held in memory for autocomplete and write-time lookups.
+
+    Each process loads the catalog at startup and reloads it every
+    VEHICLE_CATALOG_REFRESH_INTERVAL. Public writes are only matched against the loaded
+    catalog; entries are added by the operator tools (the vehicles backfill and bulk imports),
+    which look names up in the database and create the ones that are missing.
+    """
+
+    def __init__(self):
+        self._snapshot = _Snapshot()
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self) -> None:
+        started = time.monotonic()
+        snapshot = _Snapshot()
+        async with AsyncSessionLocal() as session:
+            for make in (await session.execute(select(VehicleMake.id, VehicleMake.name))).all():
+                snapshot.add_make(CatalogEntry(make.id, make.name))
+            models = await session.execute(select(VehicleModel.id, VehicleModel.make_id, VehicleModel.name))
+            for model in models.all():
+                snapshot.add_model(model.make_id, CatalogEntry(model.id, model.name))
+        self._snapshot = snapshot
+        logger.info(
+            "Loaded vehicle catalog with %s makes and %s models in %.3fs",
+            len(snapshot.makes), len(snapshot.models), time.monotonic() - started
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.VEHICLE_CATALOG_REFRESH_INTERVAL)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error("Failed to reload vehicle catalog: %s", e)
+
+    async def start(self) -> None:
+        await self.load()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # Autocomplete
+
+    def find_make(self, name: str) -> Optional[CatalogEntry]:
+        return self._snapshot.makes.get(normalize_vehicle_name(name))
+
+    def complete_makes(self, prefix: str, limit: Optional[int] = None) -> List[CatalogEntry]:
+        return self._snapshot.make_trie.complete(normalize_vehicle_name(prefix), limit)
+
+    def complete_models(self, make_id: int, prefix: str, limit: Optional[int] = None) -> List[CatalogEntry]:
+        trie = self._snapshot.model_tries.get(make_id)
+        return trie.complete(normalize_vehicle_name(prefix), limit) if trie is not None else []
+
+    # Write-time normalization
+
+    async def _get_or_create(self, table, values: dict, conflict_columns: List[str]) -> CatalogEntry:
+        async with AsyncSessionLocal() as session:
+            stmt = (
+                pg_insert(table)
+                .values(**values)
+                .on_conflict_do_nothing(index_elements=conflict_columns)
+                .returning(table.id, table.name)
+            )
+            row = (await session.execute(stmt)).first()
+            if row is None:
+                # Someone else created it first
+                conditions = [getattr(table, column) == values[column] for column in conflict_columns]
+                row = (await session.execute(select(table.id, table.name).where(*conditions))).one()
+            await session.commit()
+        return CatalogEntry(row.id, row.name)
+
+    async def resolve_make(self, name: str) -> CatalogEntry:
+        snapshot = self._snapshot
+        key = normalize_vehicle_name(name)
+        entry = snapshot.makes.get(key)
+        if entry is None:
+            entry = await self._get_or_create(
+                VehicleMake, {"name": clean_vehicle_name(name), "normalized_name": key}, ["normalized_name"]
+            )
+            snapshot.add_make(entry)
+        return entry
+
+    async def resolve_model(self, make_id: int, name: str) -> CatalogEntry:
+        snapshot = self._snapshot
+        key = normalize_vehicle_name(name)
+        entry = snapshot.models.get((make_id, key))
+        if entry is None:
+            entry = await self._get_or_create(
+                VehicleModel,
+                {"make_id": make_id, "name": clean_vehicle_name(name), "normalized_name": key},
+                ["make_id", "normalized_name"],
+            )
+            snapshot.add_model(make_id, entry)
+        return entry
+
+    async def resolve(self, make: Optional[str], model: Optional[str], create: bool = False) -> ResolvedVehicle:
+        """Canonical spelling and catalog ids for a make and model.
+
+        Names the catalog doesn't know keep their own (cleaned) spelling and get no id, unless
+        `create` adds them; the backfill resolves such rows once the names are in the catalog.
+        Blank names stay unresolved; a model is only resolved together with its make.
+        """
+        if not make or not make.strip():
+            return ResolvedVehicle(make, model, None, None)
+        snapshot = self._snapshot
+        if create:
+            make_entry = await self.resolve_make(make)
+        else:
+            make_entry = snapshot.makes.get(normalize_vehicle_name(make))
+        has_model = bool(model and model.strip())
+        if make_entry is None:
+            return ResolvedVehicle(
+                clean_vehicle_name(make), clean_vehicle_name(model) if has_model else model, None, None
+            )
+        if not has_model:
+            return ResolvedVehicle(make_entry.name, model, make_entry.id, None)
+        if create:
+            model_entry = await self.resolve_model(make_entry.id, model)
+        else:
+            model_entry = snapshot.models.get((make_entry.id, normalize_vehicle_name(model)))
+        if model_entry is None:
+            return ResolvedVehicle(make_entry.name, clean_vehicle_name(model), make_entry.id, None)
+        return ResolvedVehicle(make_entry.name, model_entry.name, make_entry.id, model_entry.id)
+
+vehicle_catalog = VehicleCatalog()
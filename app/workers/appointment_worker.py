@@ -1,41 +1,46 @@
 import asyncio
 from datetime import datetime
+import json
+import os
+import signal
+import tempfile
 import pytz
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 import redis
 import contextlib
-from typing import List
+from typing import List, Optional
 import logging
 
-from ..database.base import AsyncSessionLocal, engine
+from ..database.base import AsyncSessionLocal
 from ..models.appointment import Appointment
 from ..utils.queue import AppointmentQueue
 from ..utils.cache import redis_client, clear_cached_data
 from ..utils.config import get_settings
+from ..utils.admission import record_drained
+from ..utils.events import publish_status_change
+from ..utils.appointment_cache import appointment_cache
+from ..utils.schedule import schedule_events, confirmed_events
+from .partitions import PartitionLeases, SlotBook
+from ..utils.profiler import (
+    profiler,
+    ProfilerBusyError,
+    WORKER_PROFILE_REQUEST_KEY,
+    WORKER_PROFILE_RESULT_KEY,
+    WORKER_PROFILE_RESULT_TTL,
+)
 
 settings = get_settings()
 appointment_queue = AppointmentQueue(redis_client)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def is_time_slot_available(session: AsyncSession, appointment_time: datetime) -> bool:
-    """Check if the appointment time slot is available with error handling"""
-    try:
-        query = select(Appointment).where(
-            Appointment.appointment_time == appointment_time,
-            Appointment.status != "cancelled"
-        )
-        result = await session.execute(query)
-        return result.scalar_one_or_none() is None
-    except Exception as e:
-        logger.error(f"Error checking time slot availability: {e}")
-        raise
-
-async def process_appointments_batch(appointments: List[dict]) -> List[dict]:
-    """Process a batch of appointments concurrently"""
+# Occupied slots for the partitions this process owns
+slot_book = SlotBook()
+
+async def process_appointments_batch(appointments: List[dict], partition: int) -> List[dict]:
+    """Process a batch of appointments from one partition concurrently"""
     async def process_single(appointment_data: dict) -> dict:
         try:
             if isinstance(appointment_data["appointment_time"], str):
@@ -43,10 +48,8 @@ async def process_appointments_batch(appointments: List[dict]) -> List[dict]:
             else:
                 appointment_time = appointment_data["appointment_time"]
             
-            if appointment_time <= datetime.now(pytz.UTC):
-                return {"id": appointment_data.get("id"), "success": False, "error": "Appointment time must be in the future"}
-            
             async with AsyncSessionLocal() as session:
+                reserved = False
                 try:
                     appointment_id = appointment_data.get("id")
                     if not appointment_id:
@@ -59,78 +62,195 @@ async def process_appointments_batch(appointments: List[dict]) -> List[dict]:
                     if not db_appointment:
                         return {"id": appointment_id, "success": False, "error": "Appointment not found"}
                     
-                    # Check time slot availability
-                    if not await is_time_slot_available(session, appointment_time):
-                        return {"id": appointment_id, "success": False, "error": "Time slot is not available"}
+                    if db_appointment.status != "pending":
+                        # Redelivered after a crash or drain, or changed through the API meanwhile
+                        return {"id": appointment_id, "success": True}
+                    
+                    if appointment_time <= datetime.now(pytz.UTC):
+                        # Its time passed while queued; expire it as the scheduler would
+                        db_appointment.status = "cancelled"
+                        await session.commit()
+                        await appointment_cache.put([db_appointment])
+                        await publish_status_change(appointment_id, "cancelled")
+                        logger.info("Cancelled appointment %s: appointment time has passed", appointment_id)
+                        return {"id": appointment_id, "success": True}
+                    
+                    # Check time slot availability against the partition's in-memory slot book
+                    reserved = await slot_book.reserve(session, partition, appointment_time, appointment_id)
+                    if not reserved:
+                        # Another appointment holds the slot; this request can never be confirmed
+                        db_appointment.status = "cancelled"
+                        await session.commit()
+                        await appointment_cache.put([db_appointment])
+                        await publish_status_change(appointment_id, "cancelled")
+                        logger.info("Cancelled appointment %s: time slot is not available", appointment_id)
+                        return {"id": appointment_id, "success": True}
                     
                     # Update appointment
                     db_appointment.status = "confirmed"
                     await session.commit()
+                    slot_book.committed(partition, appointment_time)
+                    await appointment_cache.put([db_appointment])
+                    await publish_status_change(appointment_id, "confirmed")
+                    await schedule_events(redis_client, confirmed_events(appointment_id, appointment_time))
                     return {"id": appointment_id, "success": True}
+                except IntegrityError:
+                    # The slot was taken outside this worker (stale slot book); retry from the database
+                    await session.rollback()
+                    if reserved:
+                        slot_book.release(partition, appointment_time, appointment_id)
+                    slot_book.forget(partition)
+                    return {"id": appointment_id, "success": False, "error": "Time slot was taken concurrently"}
                 except Exception as e:
                     await session.rollback()
-                    logger.error(f"Database error processing appointment {appointment_id}: {e}")
+                    if reserved:
+                        slot_book.release(partition, appointment_time, appointment_id)
+                    logger.error("Database error processing appointment %s: %s", appointment_id, e)
                     return {"id": appointment_id, "success": False, "error": str(e)}
         except Exception as e:
-            logger.error(f"Error processing appointment: {e}")
+            logger.error("Error processing appointment: %s", e)
             return {"id": appointment_data.get("id"), "success": False, "error": str(e)}
 
     return await asyncio.gather(*[process_single(appt) for appt in appointments])
 
-async def appointment_worker():
-    """Background worker to process appointment requests with improved concurrency"""
-    cleanup_interval = 300  # Cleanup every 5 minutes
-    last_cleanup = datetime.now()
+async def _pause(seconds: float, stopping: Optional[asyncio.Event]) -> None:
+    """Sleep, waking early if the worker is asked to stop"""
+    if stopping is None:
+        await asyncio.sleep(seconds)
+        return
+    with contextlib.suppress(asyncio.TimeoutError):
+        await asyncio.wait_for(stopping.wait(), timeout=seconds)
+
+async def appointment_worker(
+    queue: AppointmentQueue = appointment_queue,
+    stopping: Optional[asyncio.Event] = None,
+    leases: Optional[PartitionLeases] = None,
+):
+    """Background worker to process appointment requests with improved concurrency.
+
+    Each iteration claims one of the process's queue partitions and takes a batch from it.
+    Once `stopping` is set the worker finishes the batch it holds and returns. Pooled
+    connections are replaced individually by the engine's pool_recycle and pre-ping.
+    """
     batch_size = settings.WORKER_PREFETCH_COUNT
+    leases = leases or PartitionLeases()
     
-    while True:
+    while stopping is None or not stopping.is_set():
+        partition = leases.claim()
+        if partition is None:
+            # Every owned partition is busy or was just found empty
+            await _pause(0.2, stopping)
+            continue
+        appointments = []
         try:
-            # Periodic cleanup
-            if (datetime.now() - last_cleanup).seconds >= cleanup_interval:
-                await engine.dispose()
-                last_cleanup = datetime.now()
-                logger.info("Performed periodic connection cleanup")
-            
             # Get batch of appointments
-            appointments = []
             for _ in range(batch_size):
-                appointment_data = await appointment_queue.dequeue_appointment()
+                appointment_data = await queue.dequeue_appointment(partition)
                 if appointment_data:
                     appointments.append(appointment_data)
                 else:
                     break
             
             if not appointments:
-                await asyncio.sleep(1)
                 continue
             
             # Process batch
-            results = await process_appointments_batch(appointments)
+            results = await process_appointments_batch(appointments, partition)
+            # Requests removed from the queue (confirmed, cancelled or already handled) count as
+            # drained; failed ones go back on the queue
+            await record_drained(redis_client, sum(result["success"] for result in results))
+            await queue.flush_lane_stats()
             
             # Handle results
             for appointment_data, result in zip(appointments, results):
                 if result["success"]:
-                    await appointment_queue.complete_processing(appointment_data)
+                    await queue.complete_processing(appointment_data)
                 else:
-                    logger.error(f"Failed to process appointment: {result.get('error', 'Unknown error')}")
-                    await appointment_queue.requeue_failed()
+                    logger.error("Failed to process appointment: %s", result.get('error', 'Unknown error'))
+                    await queue.requeue(appointment_data)
         
         except redis.RedisError as e:
-            logger.error(f"Redis error in worker: {e}")
-            await asyncio.sleep(5)
+            logger.error("Redis error in worker: %s", e)
+            await _pause(5, stopping)
             try:
-                await appointment_queue.requeue_failed()
+                await queue.requeue_failed()
             except Exception as e:
-                logger.error(f"Error requeuing failed appointments: {e}")
+                logger.error("Error requeuing failed appointments: %s", e)
+        
+        except Exception as e:
+            logger.error("Worker error: %s", e)
+            await _pause(1, stopping)
         
+        finally:
+            leases.release(partition, empty=len(appointments) < batch_size)
+
+async def profile_control_listener():
+    """Run profiling sessions requested through Redis by the admin API"""
+    while True:
+        try:
+            request = await redis_client.getdel(WORKER_PROFILE_REQUEST_KEY)
+            if request:
+                seconds = min(float(json.loads(request).get("seconds", 10)), settings.PROFILER_MAX_SECONDS)
+                logger.info("Profiling worker for %ss on request", seconds)
+                result = await profiler.profile(seconds)
+                await redis_client.set(WORKER_PROFILE_RESULT_KEY, result, ex=WORKER_PROFILE_RESULT_TTL)
+        except ProfilerBusyError:
+            logger.warning("Ignoring profile request, a session is already running")
+        except redis.RedisError as e:
+            logger.error("Redis error in profile listener: %s", e)
+            await asyncio.sleep(5)
         except Exception as e:
-            logger.error(f"Worker error: {e}")
-            await asyncio.sleep(1)
+            logger.error("Profile listener error: %s", e)
+        await asyncio.sleep(1)
+
+async def profile_to_file(seconds: float) -> None:
+    """Profile the worker and write collapsed stacks to a temp file"""
+    try:
+        result = await profiler.profile(seconds)
+    except ProfilerBusyError:
+        logger.warning("Ignoring SIGUSR1, a profiling session is already running")
+        return
+    path = os.path.join(
+        tempfile.gettempdir(),
+        f"appointment_worker-{os.getpid()}-{int(datetime.now().timestamp())}.collapsed"
+    )
+    await asyncio.to_thread(_write_file, path, result)
+    logger.info("Wrote worker profile to %s", path)
+
+def _write_file(path: str, content: str) -> None:
+    with open(path, "w") as f:
+        f.write(content)
+
+_signal_profile_tasks = set()
+
+def install_profile_signal_handler() -> None:
+    """Profile for PROFILER_SIGNAL_SECONDS whenever the process receives SIGUSR1"""
+    def on_signal():
+        task = asyncio.create_task(profile_to_file(settings.PROFILER_SIGNAL_SECONDS))
+        _signal_profile_tasks.add(task)
+        task.add_done_callback(_signal_profile_tasks.discard)
+
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, on_signal)
+    except (NotImplementedError, RuntimeError, ValueError, AttributeError):
+        # Not on the main thread or the platform has no SIGUSR1
+        logger.info("SIGUSR1 profiling unavailable in this process")
+
+async def start_appointment_worker(
+    queue: AppointmentQueue = appointment_queue,
+    stopping: Optional[asyncio.Event] = None,
+    leases: Optional[PartitionLeases] = None,
+):
+    """Start multiple appointment processing workers.
 
-async def start_appointment_worker():
-    """Start multiple appointment processing workers"""
+    Without `leases` the process consumes every partition itself (single-process mode).
+    """
+    leases = leases or PartitionLeases(on_lost=slot_book.forget)
+    await queue.migrate_unpartitioned()
     worker_tasks = []
     for _ in range(settings.WORKER_CONCURRENCY):
-        worker_task = asyncio.create_task(appointment_worker())
+        worker_task = asyncio.create_task(appointment_worker(queue, stopping, leases))
         worker_tasks.append(worker_task)
-    return worker_tasks 
\ No newline at end of file
+    install_profile_signal_handler()
+    worker_tasks.append(asyncio.create_task(profile_control_listener()))
+    return worker_tasks
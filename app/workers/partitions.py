@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from math import ceil
+from typing import Callable, Dict, Optional, Set
+
+import pytz
+import redis.asyncio as redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.appointment import Appointment
+from ..utils.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+PARTITION_LEASE_KEY = "appointment_partition_lease"
+CONSUMERS_KEY = "appointment_consumers"
+
+# Statuses that occupy a time slot
+SLOT_HOLDING_STATUSES = ("confirmed", "completed")
+
+# KEYS: lease keys; ARGV: owner, ttl ms. Returns 1 per key still owned (and extended), else 0.
+RENEW_LUA = """
+local renewed = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('PEXPIRE', key, ARGV[2])
+        renewed[i] = 1
+    else
+        renewed[i] = 0
+    end
+end
+return renewed
+"""
+
+# KEYS: lease keys; ARGV: owner
+RELEASE_LUA = """
+local released = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('DEL', key)
+        released = released + 1
+    end
+end
+return released
+"""
+
+def lease_key(partition: int) -> str:
+    return f"{PARTITION_LEASE_KEY}:{partition}"
+
+class PartitionLeases:
+    """Tracks which queue partitions this process consumes.
+
+    With a Redis client, partitions are leased (SET NX PX) and shared out between the live
+    consumers registered in CONSUMERS_KEY: each aims for ceil(partitions / consumers),
+    releasing idle extras when consumers join and picking up free partitions when they
+    leave or crash. Without one, every partition is owned locally (single-process mode).
+
+    Within the process a partition is handed to one worker task at a time, so requests
+    for a slot are confirmed sequentially by a single owner.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        consumer: str = "local",
+        partitions: int = settings.QUEUE_PARTITIONS,
+        ttl: float = settings.PARTITION_LEASE_TTL,
+        on_lost: Optional[Callable[[int], None]] = None,  # Called when a partition stops being owned
+    ):
+        self.redis = redis_client
+        self.consumer = consumer
+        self.partitions = partitions
+        self.ttl = ttl
+        self.on_lost = on_lost
+        self.owned: Set[int] = set() if redis_client is not None else set(range(partitions))
+        self._busy: Set[int] = set()
+        self._idle_until: Dict[int, float] = {}
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+        if redis_client is not None:
+            self._renew_script = redis_client.register_script(RENEW_LUA)
+            self._release_script = redis_client.register_script(RELEASE_LUA)
+
+    # Handing partitions to worker tasks
+
+    def claim(self) -> Optional[int]:
+        """Next owned partition that no task is consuming and that wasn't just found empty"""
+        candidates = sorted(self.owned)
+        now = time.monotonic()
+        for offset in range(len(candidates)):
+            partition = candidates[(self._cursor + offset) % len(candidates)]
+            if partition in self._busy or self._idle_until.get(partition, 0) > now:
+                continue
+            self._cursor = (self._cursor + offset + 1) % len(candidates)
+            self._busy.add(partition)
+            return partition
+        return None
+
+    def release(self, partition: int, empty: bool = False, idle_seconds: float = 1.0) -> None:
+        """Return a claimed partition; an empty one is skipped for `idle_seconds`"""
+        self._busy.discard(partition)
+        if empty:
+            self._idle_until[partition] = time.monotonic() + idle_seconds
+
+    # Lease maintenance
+
+    def _lose(self, partition: int) -> None:
+        self.owned.discard(partition)
+        logger.warning("Lost lease on queue partition %s", partition)
+        if self.on_lost is not None:
+            self.on_lost(partition)
+
+    async def rebalance(self) -> None:
+        """Heartbeat, renew held leases, then release or acquire partitions toward a fair share"""
+        now = time.time()
+        ttl_ms = int(self.ttl * 1000)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(CONSUMERS_KEY, {self.consumer: now})
+            pipe.zremrangebyscore(CONSUMERS_KEY, "-inf", now - self.ttl)
+            pipe.zcard(CONSUMERS_KEY)
+            _, _, consumers = await pipe.execute()
+        target = ceil(self.partitions / max(consumers, 1))
+
+        held = sorted(self.owned)
+        if held:
+            renewed = await self._renew_script(keys=[lease_key(p) for p in held], args=[self.consumer, ttl_ms])
+            for partition, ok in zip(held, renewed):
+                if not ok:
+                    self._lose(partition)
+
+        if len(self.owned) > target:
+            # Give back idle partitions so newly joined consumers can take them
+            extras = [p for p in sorted(self.owned) if p not in self._busy][:len(self.owned) - target]
+            if extras:
+                await self._release_script(keys=[lease_key(p) for p in extras], args=[self.consumer])
+                self.owned.difference_update(extras)
+                logger.info("Released queue partitions %s", extras)
+                if self.on_lost is not None:
+                    for partition in extras:
+                        self.on_lost(partition)
+            return
+
+        # Start probing at a random partition so consumers don't all race for the same ones
+        start = random.randrange(self.partitions)
+        for offset in range(self.partitions):
+            if len(self.owned) >= target:
+                break
+            partition = (start + offset) % self.partitions
+            if partition in self.owned:
+                continue
+            if await self.redis.set(lease_key(partition), self.consumer, nx=True, px=ttl_ms):
+                self.owned.add(partition)
+                self._idle_until.pop(partition, None)
+                logger.info("Acquired lease on queue partition %s", partition)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.PARTITION_LEASE_RENEW_INTERVAL)
+            try:
+                await self.rebalance()
+            except redis.RedisError as e:
+                logger.error("Redis error maintaining partition leases: %s", e)
+
+    async def start(self) -> None:
+        if self.redis is None:
+            return
+        try:
+            await self.rebalance()
+        except redis.RedisError as e:
+            logger.error("Redis error acquiring partition leases: %s", e)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop renewing and give all leases back"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.redis is None:
+            return
+        try:
+            if self.owned:
+                await self._release_script(keys=[lease_key(p) for p in sorted(self.owned)], args=[self.consumer])
+            await self.redis.zrem(CONSUMERS_KEY, self.consumer)
+        except redis.RedisError as e:
+            logger.error("Redis error releasing partition leases: %s", e)
+        self.owned.clear()
+
+class SlotBook:
+    """In-memory record of occupied time slots for the partitions this process owns.
+
+    A service date is loaded from the database the first time one of its requests is
+    processed. Only this process confirms requests in an owned partition, so the book
+    stays current for them; changes made through the API are caught by re-checking the
+    database before reporting a conflict, and by the unique index on confirmed slots.
+    """
+
+    def __init__(self):
+        # partition -> service date -> slot time -> appointment id
+        self._slots: Dict[int, Dict[date, Dict[datetime, int]]] = {}
+        # Reservations whose confirmation hasn't committed yet; kept across reloads
+        self._uncommitted: Dict[int, Dict[datetime, int]] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    @staticmethod
+    def _service_date(appointment_time: datetime) -> date:
+        return appointment_time.astimezone(pytz.UTC).date()
+
+    async def _load(self, session: AsyncSession, partition: int, service_date: date) -> Dict[datetime, int]:
+        start = datetime.combine(service_date, dt_time.min, tzinfo=pytz.UTC)
+        result = await session.execute(
+            select(Appointment.appointment_time, Appointment.id).where(
+                Appointment.appointment_time >= start,
+                Appointment.appointment_time < start + timedelta(days=1),
+                Appointment.status.in_(SLOT_HOLDING_STATUSES),
+            )
+        )
+        dates = self._slots.setdefault(partition, {})
+        # Past dates can no longer be booked
+        today = datetime.now(pytz.UTC).date()
+        for stale in [d for d in dates if d < today]:
+            del dates[stale]
+        slots = {row.appointment_time: row.id for row in result}
+        for slot_time, appointment_id in self._uncommitted.get(partition, {}).items():
+            if self._service_date(slot_time) == service_date:
+                slots[slot_time] = appointment_id
+        dates[service_date] = slots
+        return slots
+
+    async def reserve(self, session: AsyncSession, partition: int, appointment_time: datetime, appointment_id: int) -> bool:
+        """Claim a slot for an appointment; False if another appointment holds it"""
+        service_date = self._service_date(appointment_time)
+        async with self._locks.setdefault(partition, asyncio.Lock()):
+            slots = self._slots.get(partition, {}).get(service_date)
+            if slots is None:
+                slots = await self._load(session, partition, service_date)
+            holder = slots.get(appointment_time)
+            if holder is not None and holder != appointment_id:
+                # The holder may have been cancelled through the API; confirm before rejecting
+                slots = await self._load(session, partition, service_date)
+                holder = slots.get(appointment_time)
+                if holder is not None and holder != appointment_id:
+                    return False
+            slots[appointment_time] = appointment_id
+            self._uncommitted.setdefault(partition, {})[appointment_time] = appointment_id
+            return True
+
+    def committed(self, partition: int, appointment_time: datetime) -> None:
+        """The reservation's confirmation is now in the database"""
+        self._uncommitted.get(partition, {}).pop(appointment_time, None)
+
+    def release(self, partition: int, appointment_time: datetime, appointment_id: int) -> None:
+        """Undo a reservation whose confirmation did not commit"""
+        self._uncommitted.get(partition, {}).pop(appointment_time, None)
+        slots = self._slots.get(partition, {}).get(self._service_date(appointment_time))
+        if slots is not None and slots.get(appointment_time) == appointment_id:
+            del slots[appointment_time]
+
+    def forget(self, partition: int) -> None:
+        """Drop everything cached for a partition (its lease was lost)"""
+        self._slots.pop(partition, None)
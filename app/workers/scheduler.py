@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pytz
+import redis.asyncio as redis
+from sqlalchemy import select, update
+
+from ..database.base import AsyncSessionLocal
+from ..models.appointment import Appointment
+from ..utils.config import get_settings
+from ..utils.events import publish_status_change
+from ..utils.appointment_cache import appointment_cache
+from ..utils.schedule import SCHEDULE_KEY, REMIND, EXPIRE, COMPLETE, parse_member
+from ..utils.timing_wheel import HierarchicalTimingWheel
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Events a scheduler has taken from SCHEDULE_KEY, per consumer, until their handler succeeds
+SCHEDULE_CLAIMED_KEY = "appointment_schedule_claimed"
+# Capped stream of reminders for a notification sender to consume
+REMINDER_STREAM_KEY = "appointment_reminders"
+
+# KEYS: schedule, claimed; ARGV: max fire time, limit. Moves due events to the claimed set.
+CLAIM_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+for i = 1, #due, 2 do
+    redis.call('ZADD', KEYS[2], due[i + 1], due[i])
+    redis.call('ZREM', KEYS[1], due[i])
+end
+return due
+"""
+
+# KEYS: claimed, schedule. Returns every claimed event to the schedule (unless rescheduled meanwhile).
+UNCLAIM_LUA = """
+local claimed = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+for i = 1, #claimed, 2 do
+    redis.call('ZADD', KEYS[2], 'NX', claimed[i + 1], claimed[i])
+end
+redis.call('DEL', KEYS[1])
+return #claimed / 2
+"""
+
+class AppointmentScheduler:
+    """Fires timed appointment events (reminders, expiry, completion) in batches.
+
+    Events live in a Redis sorted set scored by fire time. Every SCHEDULER_POLL_INTERVAL the
+    scheduler claims those due within SCHEDULER_LOOKAHEAD_SECONDS into a per-consumer set and
+    an in-memory hierarchical timing wheel, which hands them to the handlers as they come
+    due. Work is proportional to due events; the appointments table is never scanned.
+    Claimed events survive a crash and are returned to the schedule on the next start.
+    """
+
+    def __init__(self, redis_client: redis.Redis, consumer: str = "local"):
+        self.redis = redis_client
+        self.claimed_key = f"{SCHEDULE_CLAIMED_KEY}:{consumer}"
+        self.wheel = HierarchicalTimingWheel(settings.SCHEDULER_TICK_SECONDS, start=time.time())
+        self.max_in_wheel = settings.SCHEDULER_BATCH_SIZE * 20
+        self._claim_script = redis_client.register_script(CLAIM_LUA)
+        self._unclaim_script = redis_client.register_script(UNCLAIM_LUA)
+        self._task: Optional[asyncio.Task] = None
+        self._handlers = {
+            REMIND: self._remind,
+            EXPIRE: self._expire,
+            COMPLETE: self._complete,
+        }
+
+    async def _claim(self) -> int:
+        horizon = time.time() + settings.SCHEDULER_LOOKAHEAD_SECONDS
+        claimed = 0
+        while len(self.wheel) < self.max_in_wheel:
+            due = await self._claim_script(
+                keys=[SCHEDULE_KEY, self.claimed_key], args=[horizon, settings.SCHEDULER_BATCH_SIZE]
+            )
+            for i in range(0, len(due), 2):
+                self.wheel.add(float(due[i + 1]), due[i])
+            claimed += len(due) // 2
+            if len(due) // 2 < settings.SCHEDULER_BATCH_SIZE:
+                break
+        return claimed
+
+    async def _fire(self, members: List[str]) -> None:
+        by_kind: Dict[str, List[str]] = defaultdict(list)
+        for member in members:
+            by_kind[member.partition(":")[0]].append(member)
+        for kind, kind_members in by_kind.items():
+            handler = self._handlers.get(kind)
+            try:
+                if handler is None:
+                    logger.warning("Dropping %s scheduled events of unknown kind %s", len(kind_members), kind)
+                else:
+                    await handler([parse_member(member)[1] for member in kind_members])
+                await self.redis.zrem(self.claimed_key, *kind_members)
+            except Exception as e:
+                logger.error("Scheduled %s handler failed for %s events: %s", kind, len(kind_members), e)
+                retry_at = time.time() + settings.SCHEDULER_RETRY_SECONDS
+                for member in kind_members:
+                    self.wheel.add(retry_at, member)
+
+    # Handlers; each re-checks status so stale or duplicate events are harmless
+
+    async def _transition(self, ids: List[int], from_status: str, to_status: str, *conditions) -> None:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(Appointment)
+                .where(Appointment.id.in_(ids), Appointment.status == from_status, *conditions)
+                .values(status=to_status)
+                .returning(Appointment)
+            )
+            changed = list(result.scalars())
+            await session.commit()
+        await appointment_cache.put(changed)
+        for appointment in changed:
+            await publish_status_change(appointment.id, to_status)
+        if changed:
+            logger.info("Scheduler moved %s appointments from %s to %s", len(changed), from_status, to_status)
+
+    async def _expire(self, ids: List[int]) -> None:
+        await self._transition(ids, "pending", "cancelled", Appointment.appointment_time <= datetime.now(pytz.UTC))
+
+    async def _complete(self, ids: List[int]) -> None:
+        await self._transition(ids, "confirmed", "completed")
+
+    async def _remind(self, ids: List[int]) -> None:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(
+                    Appointment.id, Appointment.email, Appointment.phone_number, Appointment.appointment_time
+                ).where(Appointment.id.in_(ids), Appointment.status == "confirmed")
+            )
+            rows = result.all()
+        if not rows:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for row in rows:
+                pipe.xadd(
+                    REMINDER_STREAM_KEY,
+                    {
+                        "id": row.id,
+                        "email": row.email,
+                        "phone_number": row.phone_number,
+                        "appointment_time": row.appointment_time.isoformat(),
+                    },
+                    maxlen=settings.SCHEDULER_REMINDER_STREAM_MAXLEN,
+                    approximate=True,
+                )
+            await pipe.execute()
+        logger.info("Queued %s appointment reminders", len(rows))
+
+    # Lifecycle
+
+    async def _run(self) -> None:
+        next_claim = 0.0
+        while True:
+            now = time.time()
+            if now >= next_claim:
+                try:
+                    await self._claim()
+                except redis.RedisError as e:
+                    logger.error("Redis error claiming scheduled events: %s", e)
+                next_claim = now + settings.SCHEDULER_POLL_INTERVAL
+            due = self.wheel.advance(now, limit=settings.SCHEDULER_BATCH_SIZE)
+            if due:
+                await self._fire(due)
+            if len(due) < settings.SCHEDULER_BATCH_SIZE:
+                await asyncio.sleep(settings.SCHEDULER_TICK_SECONDS)
+
+    async def start(self) -> None:
+        # Events claimed by a previous process in this slot were never acknowledged
+        try:
+            returned = await self._unclaim_script(keys=[self.claimed_key, SCHEDULE_KEY])
+            if returned:
+                logger.info("Returned %s unfinished scheduled events", returned)
+        except redis.RedisError as e:
+            logger.error("Redis error recovering scheduled events: %s", e)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop firing and hand events still waiting in the wheel back to the schedule"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.wheel.drain()
+        try:
+            await self._unclaim_script(keys=[self.claimed_key, SCHEDULE_KEY])
+        except redis.RedisError as e:
+            logger.error("Redis error returning scheduled events: %s", e)
@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+from ..utils.config import get_settings
+from ..utils.log import setup_logging
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# A child that ran at least this long is considered healthy and its backoff resets
+STABLE_RUN_SECONDS = 60
+
+def consumer_name(slot: int) -> str:
+    """Stable per-slot consumer name, so a restarted worker reclaims its predecessor's messages"""
+    return f"{socket.gethostname()}:{slot}"
+
+async def run_worker(slot: int) -> None:
+    """Run one worker process until SIGTERM/SIGINT, then drain"""
+    # Imported here so the supervisor process never builds an engine or Redis pool
+    from ..database.base import configure_engine
+    from ..utils.cache import redis_client
+    from ..utils.queue import AppointmentQueue, APPOINTMENT_PROCESSING_KEY
+    from .appointment_worker import slot_book, start_appointment_worker
+    from .partitions import PartitionLeases
+    from .scheduler import AppointmentScheduler
+    from .table_maintenance import TableMaintenance
+
+    engine = configure_engine(settings.WORKER_DB_POOL_SIZE, settings.WORKER_DB_MAX_OVERFLOW)
+    consumer = consumer_name(slot)
+    queue = AppointmentQueue(redis_client, processing_key=f"{APPOINTMENT_PROCESSING_KEY}:{consumer}")
+
+    # Anything still listed here was in flight when the previous process in this slot died
+    await queue.requeue_failed()
+
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    leases = PartitionLeases(redis_client, consumer, on_lost=slot_book.forget)
+    await leases.start()
+    tasks = await start_appointment_worker(queue, stopping, leases)
+    workers, listener = tasks[:-1], tasks[-1]
+    scheduler = AppointmentScheduler(redis_client, consumer)
+    await scheduler.start()
+    maintenance = TableMaintenance(redis_client, engine, consumer)
+    maintenance.start()
+    logger.info("Worker %s started with %s tasks", consumer, len(workers))
+
+    await stopping.wait()
+    logger.info("Worker %s draining", consumer)
+    await maintenance.stop()
+    await scheduler.stop()
+    listener.cancel()
+    _, unfinished = await asyncio.wait(workers, timeout=settings.WORKER_DRAIN_TIMEOUT)
+    for task in unfinished:
+        task.cancel()
+    await asyncio.gather(listener, *unfinished, return_exceptions=True)
+    if unfinished:
+        logger.warning("Worker %s cancelled %s tasks still busy after the drain timeout", consumer, len(unfinished))
+
+    # Hand unacknowledged messages back to the shared queue, then the partitions to the other workers
+    await queue.requeue_failed()
+    await leases.stop()
+    await redis_client.aclose()
+    await engine.dispose()
+    logger.info("Worker %s stopped", consumer)
+
+def worker_process_main(slot: int) -> None:
+    setup_logging()
+    asyncio.run(run_worker(slot))
+
+class _Child:
+    __slots__ = ("process", "started_at", "failures", "restart_at")
+
+    def __init__(self):
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at = 0.0
+
+class WorkerSupervisor:
+    """Keeps `processes` worker processes running and drains them on SIGTERM/SIGINT.
+
+    Each child owns a slot; a child that exits while the supervisor is running is restarted
+    in the same slot with exponential backoff (capped at WORKER_RESTART_BACKOFF_MAX), so
+    a crash loop does not spin.
+    """
+
+    def __init__(self, processes: int, drain_timeout: float = settings.WORKER_DRAIN_TIMEOUT):
+        self.processes = processes
+        self.drain_timeout = drain_timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._children: Dict[int, _Child] = {slot: _Child() for slot in range(processes)}
+        self._stopping = threading.Event()
+
+    def _start(self, slot: int) -> None:
+        child = self._children[slot]
+        child.process = self._context.Process(
+            target=worker_process_main, args=(slot,), name=f"appointment-worker-{slot}"
+        )
+        child.process.start()
+        child.started_at = time.monotonic()
+        logger.info("Started worker slot %s (pid %s)", slot, child.process.pid)
+
+    def _check(self, slot: int) -> None:
+        child = self._children[slot]
+        now = time.monotonic()
+        if child.process is None:
+            if now >= child.restart_at:
+                self._start(slot)
+            return
+        if child.process.is_alive():
+            return
+
+        exitcode = child.process.exitcode
+        child.process.close()
+        child.process = None
+        if now - child.started_at >= STABLE_RUN_SECONDS:
+            child.failures = 0
+        delay = min(2 ** child.failures, settings.WORKER_RESTART_BACKOFF_MAX)
+        child.failures += 1
+        child.restart_at = now + delay
+        logger.error("Worker slot %s exited with code %s, restarting in %.0fs", slot, exitcode, delay)
+
+    def _handle_signal(self, signum, frame) -> None:
+        self._stopping.set()
+
+    def start(self) -> None:
+        for slot in self._children:
+            self._start(slot)
+
+    def poll(self) -> None:
+        """Restart children that have exited (once their backoff has passed)"""
+        for slot in self._children:
+            self._check(slot)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        self.start()
+        while not self._stopping.wait(0.5):
+            self.poll()
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        running = [child.process for child in self._children.values() if child.process is not None]
+        logger.info("Stopping %s worker processes", len(running))
+        for process in running:
+            if process.is_alive():
+                process.terminate()  # SIGTERM: drain
+        # Children give up on in-flight work after drain_timeout; allow time for the hand-back
+        deadline = time.monotonic() + self.drain_timeout + 10
+        for process in running:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.error("Worker pid %s did not drain in time, killing it", process.pid)
+                process.kill()
+                process.join()
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.workers", description="Run appointment worker processes")
+    parser.add_argument(
+        "-p", "--processes", type=int, default=settings.WORKER_PROCESSES,
+        help="number of worker processes (default: WORKER_PROCESSES)"
+    )
+    args = parser.parse_args(argv)
+    setup_logging()
+    WorkerSupervisor(max(1, args.processes)).run()
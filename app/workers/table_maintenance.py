@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..database.partitions import run_maintenance
+from ..utils.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Held for one interval by whichever worker process ran maintenance last
+MAINTENANCE_LOCK_KEY = "appointment_table_maintenance"
+
+class TableMaintenance:
+    """Periodically premakes appointments partitions and archives old ones.
+
+    Every worker process runs one, but a Redis lock held for APPOINTMENT_MAINTENANCE_INTERVAL
+    lets only one of them do the work per interval.
+    """
+
+    def __init__(self, redis_client: redis.Redis, engine: AsyncEngine, consumer: str = "local"):
+        self.redis = redis_client
+        self.engine = engine
+        self.consumer = consumer
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> bool:
+        interval = int(settings.APPOINTMENT_MAINTENANCE_INTERVAL)
+        if not await self.redis.set(MAINTENANCE_LOCK_KEY, self.consumer, nx=True, ex=interval):
+            return False
+        await run_maintenance(self.engine)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except redis.RedisError as e:
+                logger.error("Redis error scheduling table maintenance: %s", e)
+            except Exception as e:
+                logger.exception("Appointments table maintenance failed: %s", e)
+            await asyncio.sleep(settings.APPOINTMENT_MAINTENANCE_INTERVAL)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,90 @@
+"""Measure bulk import and export throughput with synthetic appointments.
+
+Requires a reachable PostgreSQL (DATABASE_URL from .env) with the tables created; the
+generated rows are deleted again afterwards. Run from the repository root:
+
+    python scripts/bench_bulk.py --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+from sqlalchemy import text
+
+from app.database.base import engine
+from app.database.bulk import import_records, iter_records, password_pool, stream_export
+
+BENCH_EMAIL = "bulk-bench@example.com"
+
+async def appointment_csv(rows: int, lines_per_chunk: int = 10000):
+    """Unique past appointment times (one a minute) so none collide on the primary key"""
+    start = datetime(2000, 1, 1, tzinfo=pytz.UTC)
+    yield (
+        "email,phone_number,appointment_time,vehicle_year,vehicle_make,vehicle_model,"
+        "problem_description,status\n"
+    ).encode()
+    lines = []
+    for i in range(rows):
+        when = (start + timedelta(minutes=i)).isoformat()
+        lines.append(f"{BENCH_EMAIL},+15555550100,{when},2018,Toyota,Camry,Oil change {i},completed\n")
+        if len(lines) == lines_per_chunk:
+            yield "".join(lines).encode()
+            lines = []
+    if lines:
+        yield "".join(lines).encode()
+
+async def user_csv(rows: int):
+    yield b"email,first_name,last_name,phone_number,password\n"
+    for i in range(rows):
+        yield f"bulk-bench-{i}@example.com,Bench,User,+15555550100,bench-password-{i}\n".encode()
+
+async def time_import(kind: str, chunks, rows: int) -> None:
+    start = time.perf_counter()
+    summary = await import_records(engine, kind, iter_records(chunks, "csv"))
+    elapsed = time.perf_counter() - start
+    print(
+        f"import {kind:>12}: {rows / elapsed:10.0f} rows/s  ({elapsed:.1f}s, "
+        f"{summary['imported']} imported, {summary['skipped']} skipped, {summary['invalid']} invalid)"
+    )
+
+async def time_export(kind: str) -> None:
+    start = time.perf_counter()
+    size = 0
+    lines = 0
+    async for chunk in stream_export(engine, kind):
+        size += len(chunk)
+        lines += chunk.count(b"\n")
+    elapsed = time.perf_counter() - start
+    print(f"export {kind:>12}: {(lines - 1) / elapsed:10.0f} rows/s  ({elapsed:.1f}s, {size / 1e6:.0f} MB)")
+
+async def cleanup() -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM appointments WHERE email = :email"), {"email": BENCH_EMAIL})
+        await conn.execute(text("DELETE FROM users WHERE email LIKE 'bulk-bench-%@example.com'"))
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000, help="appointments to import")
+    parser.add_argument("--users", type=int, default=10000, help="users to import (each password is hashed)")
+    args = parser.parse_args()
+
+    await cleanup()
+    try:
+        await time_import("appointments", appointment_csv(args.rows), args.rows)
+        await time_export("appointments")
+        if args.users:
+            await time_import("users", user_csv(args.users), args.users)
+            await time_export("users")
+    finally:
+        await cleanup()
+        password_pool.shutdown()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
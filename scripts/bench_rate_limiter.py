@@ -0,0 +1,95 @@
+"""Compare the latency added by a per-request Redis fixed window and the hybrid limiter.
+
+Requires a reachable Redis (REDIS_URL from .env). Run from the repository root:
+
+    python scripts/bench_rate_limiter.py --requests 20000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils.cache import redis_client
+from app.utils.rate_limit import RateLimiter, client_identifier, get_reserve_sha, init_rate_limiter, settings
+
+def make_request(client: str) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/bench",
+        "headers": [],
+        "client": (client, 1234),
+        "app": type("App", (), {"routes": []})(),
+    })
+
+async def clear_keys() -> None:
+    for pattern in ("bench:*", "rate_limit:*:bench:*"):
+        async for key in redis_client.scan_iter(match=pattern, count=1000):
+            await redis_client.delete(key)
+
+def per_request_limiter(times: int, seconds: int):
+    """Baseline: one Redis round trip per check, reserving a single request at a time"""
+    async def check(request: Request) -> None:
+        window = int(time.time() // seconds)
+        key = f"bench:{client_identifier(request)}:{window}"
+        granted, _ = await redis_client.evalsha(await get_reserve_sha(), 1, key, times, 1, seconds * 1000)
+        if not granted:
+            raise HTTPException(status_code=429, detail="Too Many Requests")
+    return check
+
+async def run(name: str, check, requests: int, concurrency: int, clients: int) -> None:
+    latencies = []
+    rejected = 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(make_request(f"10.0.{(i % clients) // 256}.{(i % clients) % 256}"))
+
+    async def worker():
+        nonlocal rejected
+        while not queue.empty():
+            request = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                await check(request)
+            except HTTPException:
+                rejected += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"{name:>16}: {requests / elapsed:10.0f} checks/s  "
+        f"p50 {statistics.median(latencies) * 1e6:8.1f}us  "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:8.1f}us  "
+        f"rejected {rejected}"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=1000000)
+    args = parser.parse_args()
+
+    await clear_keys()
+    settings.RATE_LIMITS["bench"] = f"{args.limit}/60"
+    await init_rate_limiter()
+    hybrid_limiter = RateLimiter("bench")
+
+    await run("per-request", per_request_limiter(args.limit, 60), args.requests, args.concurrency, args.clients)
+    await run("hybrid", hybrid_limiter, args.requests, args.concurrency, args.clients)
+    await clear_keys()
+    await redis_client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
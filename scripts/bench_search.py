@@ -0,0 +1,110 @@
+"""Measure /appointments/search query latency on a large synthetic appointments table.
+
+Requires a reachable PostgreSQL (DATABASE_URL from .env) with the tables created. Seeds
+`--rows` appointments (generated in the database), runs each query, prints the plan of the
+first one so index use can be checked, then deletes the seed rows unless `--keep`:
+
+    python scripts/bench_search.py --rows 3000000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.database.base import AsyncSessionLocal, engine
+from app.routers.appointments import search_appointments, search_query, search_terms
+from app.utils.config import get_settings
+
+settings = get_settings()
+
+BENCH_EMAIL = "search-bench@example.com"
+QUERIES = ["brake noise 2019 civic", "check engine light", "ac not cold", "transmision slipping", "f-150 battery"]
+
+SEED = f"""
+INSERT INTO appointments (
+    email, phone_number, appointment_time, vehicle_year, vehicle_make, vehicle_model,
+    problem_description, status
+)
+SELECT
+    '{BENCH_EMAIL}', '+15555550100',
+    timestamptz '2001-01-01 00:00+00' + i * interval '1 minute',
+    (2005 + i % 20)::text,
+    (ARRAY['Honda','Toyota','Ford','Chevrolet','BMW','Subaru','Nissan','Tesla'])[1 + i % 8],
+    (ARRAY['Civic','Camry','F-150','Silverado','X5','Outback','Altima','Model 3','Accord','Corolla'])[1 + i % 10],
+    (ARRAY['Brake noise when stopping','Check engine light on','AC not blowing cold air',
+           'Transmission slipping between gears','Battery keeps dying','Oil change and tire rotation',
+           'Steering wheel vibrates at highway speed','Coolant leak under the engine'])[1 + (i / 7) % 8]
+        || ' (job ' || i || ')',
+    'cancelled'
+FROM generate_series(1, :rows) AS i
+"""
+
+async def seed(rows: int) -> None:
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.execute(text(SEED), {"rows": rows})
+    async with engine.connect() as conn:
+        await conn.execute(text("ANALYZE appointments"))
+    print(f"seeded {rows} rows in {time.perf_counter() - start:.1f}s")
+
+async def search(q: str, limit: int, cursor=None) -> dict:
+    async with AsyncSessionLocal() as session:
+        return await search_appointments(q=q, cursor=cursor, limit=limit, db=session, rate_limit=None)
+
+async def explain(q: str, limit: int) -> None:
+    query = search_query(search_terms(q), limit + 1)
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+            {"threshold": str(settings.SEARCH_SIMILARITY_THRESHOLD)},
+        )
+        result = await conn.execute(text("EXPLAIN (ANALYZE, BUFFERS) " + sql))
+        print("\n".join(row[0] for row in result))
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=3000000)
+    parser.add_argument("--runs", type=int, default=20, help="runs per query")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="keep the seed rows for further runs")
+    parser.add_argument("--no-seed", action="store_true", help="reuse rows kept by an earlier run")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        await seed(args.rows)
+    try:
+        await explain(QUERIES[0], args.limit)
+        for q in QUERIES:
+            latencies = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                page = await search(q, args.limit)
+                latencies.append(time.perf_counter() - start)
+            if page["next_cursor"]:
+                start = time.perf_counter()
+                await search(q, args.limit, page["next_cursor"])
+                next_page = time.perf_counter() - start
+            else:
+                next_page = 0.0
+            latencies.sort()
+            print(
+                f"{q!r:>28}: p50 {statistics.median(latencies) * 1e3:7.1f}ms  "
+                f"p95 {latencies[int(len(latencies) * 0.95)] * 1e3:7.1f}ms  "
+                f"page 2 {next_page * 1e3:7.1f}ms  {len(page['results'])} results"
+            )
+    finally:
+        if not args.keep:
+            async with engine.begin() as conn:
+                await conn.execute(text("DELETE FROM appointments WHERE email = :email"), {"email": BENCH_EMAIL})
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
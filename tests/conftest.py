@@ -7,11 +7,8 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sess
 from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
 import redis.asyncio as redis
 from unittest.mock import AsyncMock, patch
-from fastapi import Request, Response
 
 from app.main import app
 from app.database.base import Base, get_db
@@ -19,6 +16,7 @@ from app.utils.config import get_settings
 from app.models.user import User
 from app.utils.auth import get_password_hash
 from app.utils.queue import AppointmentQueue
+from app.utils.vehicle_catalog import vehicle_catalog
 from app.workers.appointment_worker import start_appointment_worker
 import contextlib
 
@@ -77,18 +75,10 @@ async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
 
 app.dependency_overrides[get_db] = override_get_db
 
-# Mock rate limiter that always allows requests
-async def mock_rate_limit_check(request: Request, response: Response):
-    return True
-
-# Override rate limiter for tests
-app.dependency_overrides[RateLimiter] = lambda *args, **kwargs: mock_rate_limit_check
-
-# Configure rate limiter for tests with higher limits
-FastAPILimiter._redis = redis_client
-FastAPILimiter._prefix = "test_rate_limit"
-FastAPILimiter._times = 1000  # Increase rate limit for tests
-FastAPILimiter._seconds = 1  # Short window for tests
+# Route limits read settings on every request: drop the per-route limits so tests making
+# many requests through one client fall back to a global limit they can't reach
+settings.RATE_LIMITS = {}
+settings.RATE_LIMIT_TIMES = 1000000
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -106,14 +96,14 @@ def test_app():
 @pytest.fixture(autouse=True)
 async def setup_test_db():
     """Set up test database and Redis before each test."""
-    # Initialize rate limiter with Redis
-    await FastAPILimiter.init(redis_client)
-    
     # Drop all tables
     async with engine_test.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
     
+    # Forget catalog entries from the previous test's tables
+    await vehicle_catalog.load()
+    
     # Create test user
     async with async_session_maker() as session:
         try:
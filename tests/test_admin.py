@@ -0,0 +1,120 @@
+import pytest
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytz
+from httpx import AsyncClient
+
+from app.utils.auth import settings as auth_settings
+
+pytestmark = pytest.mark.asyncio
+
+ADMIN_KEY = "test-admin-key"
+
+@pytest.fixture
+def admin_headers(monkeypatch) -> dict:
+    monkeypatch.setattr(auth_settings, "ADMIN_API_KEY", ADMIN_KEY)
+    return {"X-Admin-Key": ADMIN_KEY}
+
+async def test_profile_requires_admin_key(async_client: AsyncClient, admin_headers: dict):
+    response = await async_client.post("/admin/profile?seconds=0.1")
+    assert response.status_code == 401
+    
+    response = await async_client.post("/admin/profile?seconds=0.1", headers={"X-Admin-Key": "wrong"})
+    assert response.status_code == 401
+
+async def test_profile_returns_collapsed_stacks(async_client: AsyncClient, admin_headers: dict):
+    response = await async_client.post("/admin/profile?seconds=0.2", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for line in response.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("<")
+        assert int(count) > 0
+
+async def test_profile_rejects_requests_without_route(async_client: AsyncClient, admin_headers: dict):
+    response = await async_client.post("/admin/profile?seconds=1&requests=5", headers=admin_headers)
+    assert response.status_code == 400
+
+async def test_import_and_export_appointments(async_client: AsyncClient, admin_headers: dict):
+    body = (
+        "email,phone_number,appointment_time,vehicle_year,vehicle_make,vehicle_model,problem_description\n"
+        "bulk@example.com,+12345678901,2023-03-01T10:00:00+00:00,2019,Honda,Civic,\"Brakes, front\"\n"
+        "bulk@example.com,+12345678901,not-a-time,2019,Honda,Civic,Oil change\n"
+    )
+    response = await async_client.post("/admin/import/appointments", content=body, headers=admin_headers)
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["imported"] == 1
+    assert summary["invalid"] == 1
+    assert summary["errors"][0]["line"] == 3
+    
+    response = await async_client.get("/admin/export/appointments", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0].startswith("id,email,")
+    assert any('"Brakes, front"' in line and "completed" in line for line in lines[1:])
+
+async def test_import_users_skips_existing_emails(async_client: AsyncClient, admin_headers: dict):
+    body = (
+        '{"email": "imported@example.com", "first_name": "Imp", "last_name": "Orted", '
+        '"phone_number": "+12345678901", "password": "imported-password"}\n'
+    )
+    for imported in (1, 0):
+        response = await async_client.post(
+            "/admin/import/users?format=ndjson", content=body, headers=admin_headers
+        )
+        assert response.status_code == 200
+        assert response.json()["imported"] == imported
+    
+    response = await async_client.post(
+        "/auth/token", data={"username": "imported@example.com", "password": "imported-password"}
+    )
+    assert response.status_code == 200
+    
+    response = await async_client.get("/admin/export/users", headers=admin_headers)
+    assert "imported@example.com" in response.text
+    assert "hashed_password" not in response.text
+
+async def test_import_queues_pending_and_schedules_confirmed(async_client: AsyncClient, admin_headers: dict):
+    from app.utils.cache import redis_client
+    from app.utils.schedule import SCHEDULE_KEY
+    
+    day = datetime.now(pytz.UTC).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=9)
+    records = [
+        {"email": "pending@example.com", "appointment_time": (day + timedelta(hours=10)).isoformat(), "status": "pending"},
+        {"email": "confirmed@example.com", "appointment_time": (day + timedelta(hours=12)).isoformat(), "status": "confirmed"},
+    ]
+    body = "".join(
+        json.dumps({
+            **record, "phone_number": "+12345678901", "vehicle_year": "2019",
+            "vehicle_make": "Honda", "vehicle_model": "Civic", "problem_description": "Imported",
+        }) + "\n"
+        for record in records
+    )
+    response = await async_client.post("/admin/import/appointments?format=ndjson", content=body, headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    
+    response = await async_client.get("/admin/export/appointments", headers=admin_headers)
+    ids = {row["email"]: int(row["id"]) for row in csv.DictReader(io.StringIO(response.text))}
+    
+    confirmed_id = ids["confirmed@example.com"]
+    assert await redis_client.zscore(SCHEDULE_KEY, f"complete:{confirmed_id}") is not None
+    assert await redis_client.zscore(SCHEDULE_KEY, f"remind:{confirmed_id}") is not None
+    
+    # The worker picks up the imported request like one made through the API
+    pending_id = ids["pending@example.com"]
+    assert await redis_client.zscore(SCHEDULE_KEY, f"expire:{pending_id}") is not None
+    appointment_status = None
+    for _ in range(20):
+        response = await async_client.get(f"/appointments/{pending_id}")
+        appointment_status = response.json()["status"]
+        if appointment_status != "pending":
+            break
+        await asyncio.sleep(0.5)
+    assert appointment_status == "confirmed"
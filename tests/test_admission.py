@@ -0,0 +1,80 @@
+import pytest
+import asyncio
+
+import fakeredis.aioredis
+
+from app.utils.admission import AdmissionController
+from app.workers import appointment_worker as worker
+
+pytestmark = pytest.mark.asyncio
+
+class StubQueue:
+    """Hands out one batch of queued requests and records what the worker does with them"""
+
+    def __init__(self, redis_client, messages):
+        self.redis = redis_client
+        self.messages = list(messages)
+        self.completed = []
+        self.requeued = []
+
+    async def dequeue_appointment(self, partition):
+        return self.messages.pop(0) if self.messages else None
+
+    async def flush_lane_stats(self):
+        pass
+
+    async def complete_processing(self, appointment_data):
+        self.completed.append(appointment_data)
+
+    async def requeue(self, appointment_data):
+        self.requeued.append(appointment_data)
+
+    async def get_queue_length(self):
+        return len(self.messages) + len(self.requeued)
+
+class OneBatchLeases:
+    """Leases partition 0 once, then stops the worker"""
+
+    def __init__(self, stopping: asyncio.Event):
+        self.stopping = stopping
+        self.claimed = False
+
+    def claim(self):
+        if self.claimed:
+            return None
+        self.claimed = True
+        return 0
+
+    def release(self, partition, empty):
+        self.stopping.set()
+
+async def run_one_batch(monkeypatch, messages, succeeded):
+    fake = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(worker, "redis_client", fake)
+
+    async def process_batch(appointments, partition):
+        return [
+            {"id": data["id"], "success": data["id"] in succeeded, "error": "Time slot was taken concurrently"}
+            for data in appointments
+        ]
+
+    monkeypatch.setattr(worker, "process_appointments_batch", process_batch)
+    queue = StubQueue(fake, messages)
+    stopping = asyncio.Event()
+    await asyncio.wait_for(worker.appointment_worker(queue, stopping, OneBatchLeases(stopping)), timeout=5)
+    return queue, await AdmissionController(queue)._measure_drain_rate()
+
+async def test_failed_batch_does_not_raise_drain_rate(monkeypatch):
+    queue, rate = await run_one_batch(monkeypatch, [{"id": 1}, {"id": 2}], succeeded=set())
+    assert [data["id"] for data in queue.requeued] == [1, 2]
+    assert rate == 0
+
+async def test_drain_rate_counts_requests_removed_from_queue(monkeypatch):
+    queue, rate = await run_one_batch(monkeypatch, [{"id": 1}, {"id": 2}, {"id": 3}], succeeded={2})
+    assert [data["id"] for data in queue.completed] == [2]
+    assert len(queue.requeued) == 2
+
+    fake = queue.redis
+    drained = sum(int(count) for count in await fake.mget(await fake.keys("appointment_drain:*")))
+    assert drained == 1
+    assert rate > 0
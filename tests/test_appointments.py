@@ -4,7 +4,10 @@ import asyncio
 from datetime import datetime, timedelta
 import pytz
 import json
+from types import SimpleNamespace
+from sqlalchemy import update
 from app.models.appointment import Appointment
+from app.database.base import AsyncSessionLocal
 import random
 
 pytestmark = pytest.mark.asyncio
@@ -56,6 +59,8 @@ async def test_create_appointment(async_client: AsyncClient, auth_headers: dict)
     data = response.json()
     assert data["status"] == "queued"
     assert "queue_position" in data
+    assert "projected_wait_seconds" in data
+    assert "estimated_confirmation_at" in data
     
     # Wait for appointment to be processed
     assert await wait_for_appointments(async_client, auth_headers, 1)
@@ -66,7 +71,8 @@ async def test_create_appointment(async_client: AsyncClient, auth_headers: dict)
     appointments = response.json()
     assert len(appointments) == 1
     assert appointments[0]["email"] == "test@example.com"
-    assert appointments[0]["status"] == "pending"
+    # The worker may already have confirmed it
+    assert appointments[0]["status"] in ("pending", "confirmed")
 
 async def test_create_appointment_past_time(async_client: AsyncClient, auth_headers: dict):
     appointment_time = datetime.now(pytz.UTC) - timedelta(days=1)
@@ -284,4 +290,439 @@ async def test_appointments_pressure(async_client: AsyncClient, auth_headers: di
         for e in exceptions[:5]:  # Show first 5 exceptions
             print(f"Exception: {str(e)}")
     
-    assert success_count == 100, f"Expected 100 successful retrievals, got {success_count}" 
\ No newline at end of file
+    assert success_count == 100, f"Expected 100 successful retrievals, got {success_count}" 
+
+async def test_appointment_events_long_poll(async_client: AsyncClient, auth_headers: dict):
+    appointment_time = datetime.now(pytz.UTC) + timedelta(days=6)
+    create_response = await async_client.post(
+        "/appointments/",
+        headers=auth_headers,
+        json={
+            "email": "test@example.com",
+            "phone_number": "+12345678901",
+            "appointment_time": appointment_time.isoformat(),
+            "vehicle_year": "2020",
+            "vehicle_make": "Toyota",
+            "vehicle_model": "Camry",
+            "problem_description": "Regular maintenance"
+        }
+    )
+    appointment_id = create_response.json()["id"]
+    
+    # Nothing changes: the long poll times out and reports the current status
+    response = await async_client.get(
+        f"/appointments/{appointment_id}/events?status=pending&timeout=0.5", headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json() == {"id": appointment_id, "status": "pending", "changed": False}
+    
+    # A status change wakes the waiting request
+    waiter = asyncio.create_task(async_client.get(
+        f"/appointments/{appointment_id}/events?status=pending&timeout=10", headers=auth_headers
+    ))
+    await asyncio.sleep(0.5)
+    await async_client.put(f"/appointments/{appointment_id}", headers=auth_headers, json={"status": "cancelled"})
+    response = await waiter
+    assert response.status_code == 200
+    assert response.json() == {"id": appointment_id, "status": "cancelled", "changed": True}
+
+async def test_appointment_events_not_found(async_client: AsyncClient, auth_headers: dict):
+    response = await async_client.get("/appointments/999999/events?timeout=0.1", headers=auth_headers)
+    assert response.status_code == 404
+
+async def test_appointment_queue_status(async_client: AsyncClient, auth_headers: dict):
+    from app.utils.cache import redis_client
+    from app.utils.queue import APPOINTMENT_PENDING_KEY
+    
+    # Mirror entries only (no list items), so the worker never dequeues them
+    await redis_client.zadd(APPOINTMENT_PENDING_KEY, {"900001": 1, "900002": 2})
+    try:
+        response = await async_client.get("/appointments/900002/queue-status", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["queued"] is True
+        assert data["position"] == 2
+        # Without a lane entry the position falls back to the global enqueue order
+        assert data["lane"] is None
+        assert "eta_seconds" in data
+    finally:
+        await redis_client.zrem(APPOINTMENT_PENDING_KEY, "900001", "900002")
+    
+    response = await async_client.get("/appointments/900002/queue-status", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["queued"] is False
+    assert response.json()["position"] is None
+
+async def test_conflicting_appointments_confirm_once(async_client: AsyncClient, auth_headers: dict):
+    appointment_time = datetime.now(pytz.UTC).replace(microsecond=0) + timedelta(days=7)
+    ids = []
+    for _ in range(2):
+        response = await async_client.post(
+            "/appointments/",
+            headers=auth_headers,
+            json={
+                "email": "test@example.com",
+                "phone_number": "+12345678901",
+                "appointment_time": appointment_time.isoformat(),
+                "vehicle_year": "2020",
+                "vehicle_make": "Toyota",
+                "vehicle_model": "Camry",
+                "problem_description": "Regular maintenance"
+            }
+        )
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    
+    # Both requests land in the same partition; the worker confirms one and rejects the other
+    statuses = []
+    for _ in range(20):
+        statuses = [
+            (await async_client.get(f"/appointments/{appointment_id}", headers=auth_headers)).json()["status"]
+            for appointment_id in ids
+        ]
+        if "pending" not in statuses:
+            break
+        await asyncio.sleep(0.5)
+    assert sorted(statuses) == ["cancelled", "confirmed"]
+
+async def test_appointment_events_scheduled(async_client: AsyncClient, auth_headers: dict):
+    from app.utils.cache import redis_client
+    from app.utils.schedule import SCHEDULE_KEY
+    
+    appointment_time = datetime.now(pytz.UTC).replace(microsecond=0) + timedelta(days=5)
+    response = await async_client.post(
+        "/appointments/",
+        headers=auth_headers,
+        json={
+            "email": "test@example.com",
+            "phone_number": "+12345678901",
+            "appointment_time": appointment_time.isoformat(),
+            "vehicle_year": "2020",
+            "vehicle_make": "Toyota",
+            "vehicle_model": "Camry",
+            "problem_description": "Regular maintenance"
+        }
+    )
+    appointment_id = response.json()["id"]
+    assert await redis_client.zscore(SCHEDULE_KEY, f"expire:{appointment_id}") == appointment_time.timestamp()
+    
+    response = await async_client.put(
+        f"/appointments/{appointment_id}",
+        headers=auth_headers,
+        json={"status": "confirmed"}
+    )
+    assert response.status_code == 200
+    assert await redis_client.zscore(SCHEDULE_KEY, f"complete:{appointment_id}") is not None
+    assert await redis_client.zscore(SCHEDULE_KEY, f"remind:{appointment_id}") is not None
+
+async def test_appointment_change_feed(async_client: AsyncClient, auth_headers: dict):
+    async def poll_until(since: str, predicate, timeout: int = 10) -> dict:
+        data = {}
+        for _ in range(timeout * 2):
+            response = await async_client.get(f"/appointments/changes?since={since}", headers=auth_headers)
+            assert response.status_code == 200
+            data = response.json()
+            if predicate(data):
+                break
+            await asyncio.sleep(0.5)
+        return data
+    
+    appointment_time = datetime.now(pytz.UTC) + timedelta(days=6)
+    response = await async_client.post(
+        "/appointments/",
+        headers=auth_headers,
+        json={
+            "email": "test@example.com",
+            "phone_number": "+12345678901",
+            "appointment_time": appointment_time.isoformat(),
+            "vehicle_year": "2020",
+            "vehicle_make": "Toyota",
+            "vehicle_model": "Camry",
+            "problem_description": "Regular maintenance"
+        }
+    )
+    appointment_id = response.json()["id"]
+    
+    # Reported once committed, and every change after it moves the token forward
+    data = await poll_until("0", lambda d: appointment_id in [c["id"] for c in d["changes"]] and not d["has_more"])
+    assert appointment_id in [change["id"] for change in data["changes"]]
+    token = data["next_token"]
+    assert token != "0"
+    
+    response = await async_client.put(
+        f"/appointments/{appointment_id}",
+        headers=auth_headers,
+        json={"status": "cancelled"}
+    )
+    assert response.status_code == 200
+    data = await poll_until(token, lambda d: any(c["id"] == appointment_id and c["status"] == "cancelled" for c in d["changes"]))
+    assert [change["id"] for change in data["changes"]][-1] == appointment_id
+    assert data["next_token"] != token
+    
+    data = await poll_until(data["next_token"], lambda d: True)
+    assert data["changes"] == []
+
+async def test_change_feed_waits_for_open_transactions(async_client: AsyncClient, auth_headers: dict):
+    ids = []
+    for day in (11, 12):
+        response = await async_client.post(
+            "/appointments/",
+            headers=auth_headers,
+            json={
+                "email": "test@example.com",
+                "phone_number": "+12345678901",
+                "appointment_time": (datetime.now(pytz.UTC) + timedelta(days=day)).isoformat(),
+                "vehicle_year": "2020",
+                "vehicle_make": "Toyota",
+                "vehicle_model": "Camry",
+                "problem_description": "Regular maintenance"
+            }
+        )
+        ids.append(response.json()["id"])
+    
+    # Wait for the worker to settle both, then read the feed up to now
+    for _ in range(20):
+        response = await async_client.get("/appointments/?email=test@example.com", headers=auth_headers)
+        if all(appointment["status"] != "pending" for appointment in response.json()):
+            break
+        await asyncio.sleep(0.5)
+    response = await async_client.get("/appointments/changes?since=0", headers=auth_headers)
+    token = response.json()["next_token"]
+    
+    # A writer takes its change number, then stays open longer than any settle delay while a
+    # later change commits
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Appointment).where(Appointment.id == ids[0]).values(problem_description="Held open")
+        )
+        await asyncio.sleep(3)
+        response = await async_client.put(
+            f"/appointments/{ids[1]}", headers=auth_headers, json={"status": "cancelled"}
+        )
+        assert response.status_code == 200
+        response = await async_client.get(f"/appointments/changes?since={token}", headers=auth_headers)
+        data = response.json()
+        assert data["changes"] == []
+        assert data["next_token"] == token
+        await session.commit()
+    
+    # Both are delivered once the slow writer commits, the slow one first
+    response = await async_client.get(f"/appointments/changes?since={token}", headers=auth_headers)
+    data = response.json()
+    assert [change["id"] for change in data["changes"]] == ids
+    assert data["changes"][0]["problem_description"] == "Held open"
+    assert data["changes"][1]["status"] == "cancelled"
+    
+    response = await async_client.get("/appointments/changes?since=bogus", headers=auth_headers)
+    assert response.status_code == 400
+
+async def test_search_appointments(async_client: AsyncClient, auth_headers: dict):
+    base_time = datetime.now(pytz.UTC) + timedelta(days=8)
+    vehicles = [
+        ("2019", "Honda", "Civic", "Noisy brakes when stopping"),
+        ("2019", "Honda", "Civic", "Brake pedal feels soft"),
+        ("2019", "Honda", "Accord", "Brake noise at low speed"),
+        ("2021", "Ford", "F-150", "Check engine light"),
+    ]
+    for i, (year, make, model, problem) in enumerate(vehicles):
+        response = await async_client.post(
+            "/appointments/",
+            headers=auth_headers,
+            json={
+                "email": "test@example.com",
+                "phone_number": "+12345678901",
+                "appointment_time": (base_time + timedelta(hours=i)).isoformat(),
+                "vehicle_year": year,
+                "vehicle_make": make,
+                "vehicle_model": model,
+                "problem_description": problem
+            }
+        )
+        assert response.status_code == 200
+    
+    response = await async_client.get("/appointments/search?q=brake+noise+civic", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["problem_description"] for r in data["results"]] == ["Noisy brakes when stopping"]
+    assert data["next_cursor"] is None
+    
+    # Paging through every brake job visits each once, best match first
+    seen = []
+    cursor = None
+    while True:
+        url = "/appointments/search?q=brakes&limit=1" + (f"&cursor={cursor}" if cursor else "")
+        data = (await async_client.get(url, headers=auth_headers)).json()
+        seen += data["results"]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 3
+    assert len({r["id"] for r in seen}) == 3
+    ranks = [r["rank"] for r in seen]
+    assert ranks == sorted(ranks, reverse=True)
+    
+    response = await async_client.get("/appointments/search?q=brakes&cursor=garbage", headers=auth_headers)
+    assert response.status_code == 400
+
+async def test_conditional_get_appointment(async_client: AsyncClient, auth_headers: dict):
+    response = await async_client.post(
+        "/appointments/",
+        headers=auth_headers,
+        json={
+            "email": "test@example.com",
+            "phone_number": "+12345678901",
+            "appointment_time": (datetime.now(pytz.UTC) + timedelta(days=10)).isoformat(),
+            "vehicle_year": "2020",
+            "vehicle_make": "Toyota",
+            "vehicle_model": "Camry",
+            "problem_description": "Regular maintenance"
+        }
+    )
+    appointment_id = response.json()["id"]
+    
+    # Let the worker confirm it first, so it doesn't change underneath the conditional requests
+    for _ in range(20):
+        response = await async_client.get(f"/appointments/{appointment_id}", headers=auth_headers)
+        if response.json()["status"] != "pending":
+            break
+        await asyncio.sleep(0.5)
+    etag = response.headers["ETag"]
+    list_response = await async_client.get("/appointments/?email=test@example.com", headers=auth_headers)
+    list_etag = list_response.headers["ETag"]
+    
+    # Twice: the second answer comes from the stamp the first one left
+    for _ in range(2):
+        response = await async_client.get(
+            f"/appointments/{appointment_id}", headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+        response = await async_client.get(
+            "/appointments/?email=test@example.com", headers={**auth_headers, "If-None-Match": list_etag}
+        )
+        assert response.status_code == 304
+    
+    # Any update changes both, and stamps the row
+    response = await async_client.put(
+        f"/appointments/{appointment_id}", headers=auth_headers, json={"status": "cancelled"}
+    )
+    assert response.status_code == 200
+    assert response.json()["updated_at"] is not None
+    response = await async_client.get(
+        f"/appointments/{appointment_id}", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert response.headers["ETag"] != etag
+    response = await async_client.get(
+        "/appointments/?email=test@example.com", headers={**auth_headers, "If-None-Match": list_etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != list_etag
+
+async def test_compressed_appointment_list(async_client: AsyncClient, auth_headers: dict):
+    ids = []
+    for day in range(1, 6):
+        response = await async_client.post(
+            "/appointments/",
+            headers=auth_headers,
+            json={
+                "email": "test@example.com",
+                "phone_number": "+12345678901",
+                "appointment_time": (datetime.now(pytz.UTC) + timedelta(days=day)).isoformat(),
+                "vehicle_year": "2020",
+                "vehicle_make": "Toyota",
+                "vehicle_model": "Camry",
+                "problem_description": "Brakes squeal when stopping and the steering wheel shakes at speed"
+            }
+        )
+        ids.append(response.json()["id"])
+    
+    # Let the worker settle them, so the list doesn't change between requests
+    for _ in range(20):
+        response = await async_client.get("/appointments/?email=test@example.com", headers=auth_headers)
+        if all(appointment["status"] != "pending" for appointment in response.json()):
+            break
+        await asyncio.sleep(0.5)
+    
+    # The second answer is the entry the first one cached
+    bodies = []
+    for _ in range(2):
+        response = await async_client.get(
+            "/appointments/?email=test@example.com", headers={**auth_headers, "Accept-Encoding": "gzip"}
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.headers["ETag"].endswith('-gz"')
+        bodies.append(response.json())
+    assert bodies[0] == bodies[1]
+    assert len(bodies[0]) == 5
+    gzip_etag = response.headers["ETag"]
+    
+    response = await async_client.get(
+        "/appointments/?email=test@example.com",
+        headers={**auth_headers, "Accept-Encoding": "gzip", "If-None-Match": gzip_etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == gzip_etag
+    
+    # Uncompressed for clients that don't ask for it, with the identity ETag
+    response = await async_client.get(
+        "/appointments/?email=test@example.com", headers={**auth_headers, "Accept-Encoding": "identity"}
+    )
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"] == gzip_etag.replace('-gz"', '"')
+    assert response.json() == bodies[0]
+    
+    # An update replaces the cached entry
+    await async_client.put(f"/appointments/{ids[0]}", headers=auth_headers, json={"status": "cancelled"})
+    response = await async_client.get(
+        "/appointments/?email=test@example.com", headers={**auth_headers, "Accept-Encoding": "gzip"}
+    )
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert {a["id"]: a["status"] for a in response.json()}[ids[0]] == "cancelled"
+
+async def test_appointment_cache_write_through(async_client: AsyncClient, auth_headers: dict):
+    from app.utils.appointment_cache import APPOINTMENT_CACHE_KEY, appointment_cache
+    
+    response = await async_client.post(
+        "/appointments/",
+        headers=auth_headers,
+        json={
+            "email": "test@example.com",
+            "phone_number": "+12345678901",
+            "appointment_time": (datetime.now(pytz.UTC) + timedelta(days=2)).isoformat(),
+            "vehicle_year": "2020",
+            "vehicle_make": "Toyota",
+            "vehicle_model": "Camry",
+            "problem_description": "Oil change"
+        }
+    )
+    appointment_id = response.json()["id"]
+    
+    # The worker caches the row it confirms
+    for _ in range(20):
+        cached = await appointment_cache.get(appointment_id)
+        if json.loads(cached.body)["status"] != "pending":
+            break
+        await asyncio.sleep(0.5)
+    assert json.loads(cached.body)["status"] == "confirmed"
+    response = await async_client.get(f"/appointments/{appointment_id}", headers=auth_headers)
+    assert response.json() == json.loads(cached.body)
+    assert response.headers["ETag"] == f'"{appointment_id}.{cached.change_seq}"'
+    
+    # So does the API, and an older version can't replace the newer one
+    await async_client.delete(f"/appointments/{appointment_id}", headers=auth_headers)
+    cancelled = await appointment_cache.get(appointment_id)
+    assert json.loads(cancelled.body)["status"] == "cancelled"
+    assert cancelled.change_seq > cached.change_seq
+    await appointment_cache.put([SimpleNamespace(**json.loads(cached.body), change_seq=cached.change_seq)])
+    assert (await appointment_cache.get(appointment_id)).change_seq == cancelled.change_seq
+    
+    # The warmer loads upcoming appointments
+    await appointment_cache.redis.delete(APPOINTMENT_CACHE_KEY.format(appointment_id))
+    assert await appointment_cache.warm() == 1
+    assert (await appointment_cache.get(appointment_id)).change_seq == cancelled.change_seq
@@ -57,6 +57,65 @@ async def test_login_success(async_client: AsyncClient):
     assert "access_token" in data
     assert data["token_type"] == "bearer"
 
+async def test_read_current_user(async_client: AsyncClient):
+    response = await async_client.post(
+        "/auth/token",
+        data={
+            "username": "test@example.com",
+            "password": "testpass123"
+        }
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    
+    # The second request is served from the token and user caches
+    for _ in range(2):
+        response = await async_client.get("/auth/me", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["email"] == "test@example.com"
+    
+    response = await async_client.get("/auth/me", headers={"Authorization": "Bearer not-a-token"})
+    assert response.status_code == 401
+    response = await async_client.get("/auth/me")
+    assert response.status_code == 401
+
+async def test_login_filter(async_client: AsyncClient):
+    from app.utils.registered_emails import registered_emails
+    
+    await registered_emails.build()
+    try:
+        assert not await registered_emails.might_exist("nobody@example.com")
+        response = await async_client.post(
+            "/auth/token",
+            data={"username": "nobody@example.com", "password": "testpass123"}
+        )
+        assert response.status_code == 401
+        
+        # Registered after the build: found through the local add and the recent-registrations set
+        response = await async_client.post(
+            "/auth/register",
+            json={
+                "email": "late@example.com",
+                "first_name": "Late",
+                "last_name": "User",
+                "phone_number": "+12345678903",
+                "password": "testpass123"
+            }
+        )
+        assert response.status_code == 200
+        response = await async_client.post(
+            "/auth/token",
+            data={"username": "late@example.com", "password": "testpass123"}
+        )
+        assert response.status_code == 200
+    finally:
+        registered_emails._filter = None
+
+async def test_bcrypt_calibration():
+    from app.utils.auth import calibrate_bcrypt_rounds, settings
+    
+    assert calibrate_bcrypt_rounds(0.0) == settings.BCRYPT_MIN_ROUNDS
+    assert calibrate_bcrypt_rounds(1000.0) == settings.BCRYPT_MAX_ROUNDS
+
 async def test_login_wrong_password(async_client: AsyncClient):
     response = await async_client.post(
         "/auth/token",
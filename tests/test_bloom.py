@@ -0,0 +1,29 @@
+import pytest
+
+from app.utils.bloom import BloomFilter
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    emails = [f"user{i}@example.com" for i in range(1000)]
+    for email in emails:
+        bloom.add(email)
+    assert all(email in bloom for email in emails)
+    assert bloom.count == 1000
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"user{i}@example.com")
+    false_positives = sum(f"other{i}@example.com" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_bloom_filter_round_trip():
+    bloom = BloomFilter(capacity=100, error_rate=0.01)
+    for i in range(100):
+        bloom.add(f"user{i}@example.com")
+    restored = BloomFilter.from_bytes(bloom.to_bytes())
+    assert restored.count == 100
+    assert all(f"user{i}@example.com" in restored for i in range(100))
+    assert sum(f"other{i}@example.com" in restored for i in range(1000)) < 50
+    with pytest.raises(ValueError):
+        BloomFilter.from_bytes(bloom.to_bytes()[:-1])
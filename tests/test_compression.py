@@ -0,0 +1,74 @@
+import gzip
+
+from httpx import AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app.utils.compression import CompressionMiddleware, choose_encoding, compress
+from app.utils.etag import coded_etag, etag_matches
+
+def test_choose_encoding():
+    assert choose_encoding(None) is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("*") in ("br", "gzip")
+    assert choose_encoding("br;q=0.5, gzip") == "gzip"
+
+def test_compress_round_trip():
+    body = b'{"status": "pending"}' * 100
+    compressed, seconds = compress(body, "gzip")
+    assert gzip.decompress(compressed) == body
+    assert len(compressed) < len(body)
+    assert seconds >= 0
+
+async def test_middleware_compresses_above_threshold():
+    large = "x" * 2000
+
+    async def chunks():
+        for _ in range(4):
+            yield large
+
+    app = Starlette(routes=[
+        Route("/small", lambda request: PlainTextResponse("small")),
+        Route("/large", lambda request: PlainTextResponse(large, headers={"ETag": '"large.1"'})),
+        Route("/stream", lambda request: StreamingResponse(chunks(), media_type="text/plain")),
+        Route("/encoded", lambda request: Response(gzip.compress(b"raw"), headers={"Content-Encoding": "gzip"})),
+    ])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.text == "small"
+
+        response = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"] == '"large.1-gz"'
+        assert response.text == large
+
+        response = await client.get("/large", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"] == '"large.1"'
+
+        response = await client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.text == large * 4
+
+        response = await client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "vary" not in response.headers
+        assert response.text == "raw"
+
+def test_etags_per_content_coding():
+    assert coded_etag('"list.3.7"', "gzip") == '"list.3.7-gz"'
+    assert coded_etag('"list.3.7"', "br") == '"list.3.7-br"'
+    assert coded_etag('"list.3.7"', None) == '"list.3.7"'
+    for tag in ('"list.3.7"', '"list.3.7-gz"', 'W/"list.3.7-br"', '"other", "list.3.7-gz"'):
+        assert etag_matches(tag, '"list.3.7"')
+    assert not etag_matches('"list.3.7-xz"', '"list.3.7"')
+    assert not etag_matches('"list.3.8-gz"', '"list.3.7"')
@@ -0,0 +1,60 @@
+import pytest
+from httpx import AsyncClient
+
+from app.routers.health import readiness_cache, settings
+
+pytestmark = pytest.mark.asyncio
+
+async def test_liveness(async_client: AsyncClient):
+    response = await async_client.get("/healthz")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ok"
+    assert "loop_lag_seconds" in data
+
+@pytest.fixture
+def fresh_readiness():
+    """Don't serve a result cached by an earlier test"""
+    readiness_cache.result = None
+    yield
+    readiness_cache.result = None
+
+async def test_readiness_reports_each_check(async_client: AsyncClient, fresh_readiness):
+    response = await async_client.get("/readyz")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ok"
+    for name in ("database", "redis", "queue", "loop_lag"):
+        assert data["checks"][name]["ok"] is True
+
+async def test_readiness_fails_when_a_check_fails(async_client: AsyncClient, fresh_readiness, monkeypatch):
+    monkeypatch.setattr(settings, "READY_MAX_QUEUE_DEPTH", -1)
+    response = await async_client.get("/readyz")
+    assert response.status_code == 503
+    data = response.json()
+    assert data["status"] == "unavailable"
+    assert data["checks"]["queue"]["ok"] is False
+    assert "exceeds" in data["checks"]["queue"]["error"]
+    assert data["checks"]["database"]["ok"] is True
+
+async def test_readiness_is_cached(async_client: AsyncClient, fresh_readiness):
+    first = await async_client.get("/readyz")
+    second = await async_client.get("/readyz")
+    # Within the cache TTL the exact same result (including latencies) is served
+    assert first.json() == second.json()
+
+async def test_metrics_exposition(async_client: AsyncClient):
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert "# TYPE event_loop_lag_seconds histogram" in response.text
+    assert 'circuit_breaker_state{name="redis"}' in response.text
+    assert 'appointment_queue_lane_depth{lane="urgent"}' in response.text
+    assert "# TYPE appointment_queue_lane_dequeued_total counter" in response.text
+    assert "# TYPE appointment_queue_lane_wait_seconds_total counter" in response.text
+
+async def test_request_id_is_echoed(async_client: AsyncClient):
+    response = await async_client.get("/healthz", headers={"X-Request-ID": "probe-123"})
+    assert response.headers["x-request-id"] == "probe-123"
+    
+    response = await async_client.get("/healthz")
+    assert response.headers["x-request-id"]
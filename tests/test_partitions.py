@@ -0,0 +1,191 @@
+import pytest
+import csv
+import gzip
+import os
+from datetime import date, datetime, timedelta
+
+import pytz
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from app.database.base import AsyncSessionLocal, engine
+from app.database.partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    archive_partitions,
+    archive_path,
+    attached_partitions,
+    ensure_partitions,
+    index_path,
+    month_start,
+    partition_month,
+    partition_name,
+    read_archived_appointments,
+    settings,
+)
+from app.models.appointment import Appointment
+from app.utils.bloom import BloomFilter
+
+HEADER = [
+    "id", "email", "phone_number", "appointment_time", "vehicle_year", "vehicle_make",
+    "vehicle_model", "problem_description", "status", "created_at", "updated_at", "change_seq",
+]
+
+def write_archive(archive_dir: str, month: date, rows, indexed: bool = False) -> None:
+    name = partition_name(month)
+    with gzip.open(archive_path(name, archive_dir), "wt", newline="") as archive:
+        writer = csv.writer(archive)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    if indexed:
+        index = BloomFilter(100)
+        for row in rows:
+            index.add(f"email:{row[1]}")
+            index.add(f"phone_number:{row[2]}")
+        with open(index_path(name, archive_dir), "wb") as index_file:
+            index_file.write(index.to_bytes())
+
+def archived_row(appointment_id: int, email: str, appointment_time: str):
+    return [
+        str(appointment_id), email, "+12345678901", appointment_time, "2020", "Toyota", "Camry",
+        "Oil change", "completed", "2024-01-01 09:00:00+00", "", str(appointment_id),
+    ]
+
+def test_month_helpers():
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert partition_name(date(2025, 3, 1)) == "appointments_p202503"
+    assert partition_month("appointments_p202503") == date(2025, 3, 1)
+    assert partition_month("appointments_default") is None
+
+def test_read_archived_appointments(tmp_path):
+    rows = [
+        ["1", "a@example.com", "+12345678901", "2024-01-05 10:00:00+00", "2020", "Toyota", "Camry",
+         "Brakes, squeaking", "completed", "2024-01-01 09:00:00+00", "2024-01-05 11:00:00+00", "3"],
+        ["2", "b@example.com", "+12345678902", "2024-01-06 10:00:00+00", "2019", "Honda", "Civic",
+         "Oil change", "cancelled", "2024-01-02 09:00:00+00", "", "4"],
+    ]
+    write_archive(str(tmp_path), date(2024, 1, 1), rows)
+    
+    matches = read_archived_appointments({"email": "a@example.com"}, str(tmp_path))
+    assert len(matches) == 1
+    assert matches[0]["id"] == 1
+    assert matches[0]["problem_description"] == "Brakes, squeaking"
+    assert matches[0]["appointment_time"] == datetime(2024, 1, 5, 10, tzinfo=pytz.UTC)
+    
+    matches = read_archived_appointments({"status": "cancelled"}, str(tmp_path))
+    assert [match["id"] for match in matches] == [2]
+    assert matches[0]["updated_at"] is None
+    
+    assert read_archived_appointments({}, str(tmp_path / "missing")) == []
+
+def test_read_archived_appointments_pages(tmp_path):
+    write_archive(str(tmp_path), date(2024, 1, 1), [
+        archived_row(1, "a@example.com", "2024-01-05 10:00:00+00"),
+        archived_row(2, "a@example.com", "2024-01-20 10:00:00+00"),
+    ])
+    write_archive(str(tmp_path), date(2024, 2, 1), [archived_row(3, "a@example.com", "2024-02-03 10:00:00+00")])
+    
+    first = read_archived_appointments({"email": "a@example.com"}, str(tmp_path), limit=2)
+    assert [row["id"] for row in first] == [3, 2]
+    last = first[-1]
+    rest = read_archived_appointments(
+        {"email": "a@example.com"}, str(tmp_path), limit=2, before=(last["appointment_time"], last["id"])
+    )
+    assert [row["id"] for row in rest] == [1]
+
+def test_archive_index_skips_months(tmp_path):
+    write_archive(
+        str(tmp_path), date(2024, 1, 1), [archived_row(1, "a@example.com", "2024-01-05 10:00:00+00")], indexed=True
+    )
+    # Rewritten behind its index's back: a month the index rules out is never opened
+    with gzip.open(archive_path(partition_name(date(2024, 1, 1)), str(tmp_path)), "wt", newline="") as archive:
+        csv.writer(archive).writerows([HEADER, archived_row(2, "b@example.com", "2024-01-06 10:00:00+00")])
+    
+    assert read_archived_appointments({"email": "b@example.com"}, str(tmp_path)) == []
+    # Unindexed filters read every month
+    assert [row["id"] for row in read_archived_appointments({"status": "completed"}, str(tmp_path))] == [2]
+
+# Against the database
+
+async def add_appointment(appointment_time: datetime, email: str = "old@example.com") -> int:
+    async with AsyncSessionLocal() as session:
+        appointment = Appointment(
+            email=email,
+            phone_number="+12345678901",
+            appointment_time=appointment_time,
+            vehicle_year="2020",
+            vehicle_make="Toyota",
+            vehicle_model="Camry",
+            problem_description="Oil change",
+            status="completed",
+        )
+        session.add(appointment)
+        await session.commit()
+        return appointment.id
+
+async def partition_rows(name: str) -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(text(f"SELECT count(*) FROM {name}"))).scalar_one()
+
+@pytest.mark.asyncio
+async def test_ensure_partitions():
+    now = datetime.now(pytz.UTC)
+    current = month_start(now)
+    premade = settings.APPOINTMENT_PARTITION_PREMAKE_MONTHS
+    async with engine.begin() as conn:
+        created = await ensure_partitions(conn, now)
+        assert set(await attached_partitions(conn)) == {add_months(current, offset) for offset in range(premade + 1)}
+    assert len(created) == premade + 1
+    
+    # Booked beyond the premade months, and history: both wait in the default partition
+    later_month = add_months(current, premade + 1)
+    earlier_month = add_months(current, -2)
+    await add_appointment(datetime(later_month.year, later_month.month, 10, 9, tzinfo=pytz.UTC))
+    await add_appointment(datetime(earlier_month.year, earlier_month.month, 10, 9, tzinfo=pytz.UTC))
+    assert await partition_rows(DEFAULT_PARTITION) == 2
+    
+    async with engine.begin() as conn:
+        assert await ensure_partitions(conn, now) == [partition_name(earlier_month)]
+    assert await partition_rows(partition_name(earlier_month)) == 1
+    
+    next_month = add_months(current, 1)
+    async with engine.begin() as conn:
+        created = await ensure_partitions(conn, datetime(next_month.year, next_month.month, 1, tzinfo=pytz.UTC))
+    assert created == [partition_name(later_month)]
+    assert await partition_rows(partition_name(later_month)) == 1
+    assert await partition_rows(DEFAULT_PARTITION) == 0
+
+@pytest.mark.asyncio
+async def test_archive_partitions(tmp_path, async_client: AsyncClient, monkeypatch):
+    now = datetime.now(pytz.UTC)
+    old_month = add_months(month_start(now), -settings.APPOINTMENT_RETENTION_MONTHS - 1)
+    first = await add_appointment(datetime(old_month.year, old_month.month, 3, 9, tzinfo=pytz.UTC))
+    second = await add_appointment(datetime(old_month.year, old_month.month, 4, 9, tzinfo=pytz.UTC))
+    await add_appointment(now + timedelta(days=1))
+    async with engine.begin() as conn:
+        await ensure_partitions(conn, now)
+    
+    name = partition_name(old_month)
+    assert await archive_partitions(engine, now, str(tmp_path)) == [name]
+    assert os.path.exists(archive_path(name, str(tmp_path)))
+    assert os.path.exists(index_path(name, str(tmp_path)))
+    async with engine.connect() as conn:
+        assert old_month not in await attached_partitions(conn)
+        assert (await conn.execute(text("SELECT count(*) FROM appointments"))).scalar_one() == 1
+    # Nothing left to archive
+    assert await archive_partitions(engine, now, str(tmp_path)) == []
+    
+    monkeypatch.setattr(settings, "APPOINTMENT_ARCHIVE_DIR", str(tmp_path))
+    response = await async_client.get("/appointments/archived")
+    assert response.status_code == 400
+    response = await async_client.get("/appointments/archived?email=old@example.com&limit=1")
+    assert response.status_code == 200
+    data = response.json()
+    assert [a["id"] for a in data["appointments"]] == [second]
+    response = await async_client.get(f"/appointments/archived?email=old@example.com&limit=1&cursor={data['next_cursor']}")
+    data = response.json()
+    assert [a["id"] for a in data["appointments"]] == [first]
+    assert data["next_cursor"] is None
+    response = await async_client.get("/appointments/archived?email=new@example.com")
+    assert response.json() == {"appointments": [], "next_cursor": None}
@@ -0,0 +1,89 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import fakeredis.aioredis
+import pytz
+
+from app.utils.queue import AppointmentQueue, WeightedLaneScheduler, lane_for, partition_for, settings
+
+NOW = datetime(2025, 3, 1, 12, tzinfo=pytz.UTC)
+WEIGHTS = {"urgent": 6, "soon": 3, "later": 1}
+
+def test_lane_for_lead_time():
+    assert lane_for(NOW + timedelta(hours=2), NOW) == "urgent"
+    assert lane_for(NOW + timedelta(hours=24), NOW) == "urgent"
+    assert lane_for(NOW + timedelta(hours=25), NOW) == "soon"
+    assert lane_for((NOW + timedelta(days=7)).isoformat(), NOW) == "soon"
+    assert lane_for(NOW + timedelta(days=30), NOW) == "later"
+    # Already due (or overdue) requests are the most urgent
+    assert lane_for(NOW - timedelta(hours=1), NOW) == "urgent"
+
+def test_lane_for_without_catch_all(monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_LANES", {"urgent": 24, "soon": 168})
+    assert lane_for(NOW + timedelta(days=30), NOW) == "soon"
+
+def pick(scheduler: WeightedLaneScheduler, waiting) -> str:
+    """One dequeue: the first lane in the scheduler's order that has requests"""
+    order = scheduler.order()
+    lane = next((lane for lane in order if lane in waiting), None)
+    scheduler.served(order, lane)
+    return lane
+
+def test_backlogged_lanes_are_served_by_weight():
+    scheduler = WeightedLaneScheduler(WEIGHTS)
+    served = Counter(pick(scheduler, WEIGHTS) for _ in range(100))
+    assert served == {"urgent": 60, "soon": 30, "later": 10}
+    
+    # Smooth: the light lane isn't starved within one round of the weights
+    scheduler = WeightedLaneScheduler(WEIGHTS)
+    assert "later" in [pick(scheduler, WEIGHTS) for _ in range(10)]
+
+def test_empty_lanes_do_not_bank_credit():
+    scheduler = WeightedLaneScheduler(WEIGHTS)
+    # Only the background lane has work for a while
+    assert [pick(scheduler, {"later"}) for _ in range(50)] == ["later"] * 50
+    assert pick(scheduler, set()) is None
+    
+    # Once the others fill up, they get their share rather than a burst
+    served = Counter(pick(scheduler, WEIGHTS) for _ in range(10))
+    assert served == {"urgent": 6, "soon": 3, "later": 1}
+
+async def test_queue_position_follows_service_order(monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_PARTITIONS", 1)
+    queue = AppointmentQueue(fakeredis.aioredis.FakeRedis(decode_responses=True))
+    now = datetime.now(pytz.UTC)
+    # Five far-off requests, then an urgent one: last by enqueue order, first to be served
+    for appointment_id in range(1, 6):
+        await queue.enqueue_appointment({"id": appointment_id, "appointment_time": now + timedelta(days=30)})
+    response = await queue.enqueue_appointment({"id": 6, "appointment_time": now + timedelta(hours=2)})
+    assert response["queue_position"] == 6
+
+    positions = {}
+    for appointment_id in range(1, 7):
+        positions[appointment_id] = await queue.get_queue_position(appointment_id)
+    assert positions[6] == (1, "urgent", 1)
+    assert positions[1] == (2, "later", 2)
+
+    served = []
+    while (appointment_data := await queue.dequeue_appointment(0)) is not None:
+        served.append(appointment_data["id"])
+    assert served == [6, 1, 2, 3, 4, 5]
+    assert [positions[appointment_id].position for appointment_id in served] == [1, 2, 3, 4, 5, 6]
+    assert await queue.get_queue_position(6) is None
+
+async def test_queue_position_counts_other_partitions(monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_PARTITIONS", 2)
+    queue = AppointmentQueue(fakeredis.aioredis.FakeRedis(decode_responses=True))
+    now = datetime.now(pytz.UTC)
+    days = {}
+    for day in range(30, 60):
+        days.setdefault(partition_for(now + timedelta(days=day)), day)
+    # Two requests in one partition, five in the other: the other serves two in the meantime
+    appointment_id = 0
+    for partition, count in ((0, 2), (1, 5)):
+        for _ in range(count):
+            appointment_id += 1
+            appointment_time = now + timedelta(days=days[partition])
+            await queue.enqueue_appointment({"id": appointment_id, "appointment_time": appointment_time})
+    assert await queue.get_queue_position(2) == (2, "later", 4)
+    assert await queue.get_queue_position(7) == (5, "later", 7)
@@ -0,0 +1,131 @@
+import pytest
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import fakeredis.aioredis
+import pytz
+
+from app.workers.partitions import CONSUMERS_KEY, PartitionLeases, SlotBook, lease_key
+
+pytestmark = pytest.mark.asyncio
+
+def leases(client, consumer: str, lost: list, partitions: int = 4, ttl: float = 10.0) -> PartitionLeases:
+    return PartitionLeases(client, consumer, partitions=partitions, ttl=ttl, on_lost=lost.append)
+
+async def test_local_claims_skip_busy_and_empty_partitions():
+    local = PartitionLeases(partitions=3)
+    assert [local.claim(), local.claim(), local.claim()] == [0, 1, 2]
+    assert local.claim() is None
+    local.release(1)
+    local.release(2, empty=True, idle_seconds=60)
+    assert local.claim() == 1
+    assert local.claim() is None
+
+async def test_consumers_share_partitions_fairly():
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    lost_a, lost_b = [], []
+    a, b = leases(client, "a", lost_a), leases(client, "b", lost_b)
+
+    await a.rebalance()
+    assert a.owned == {0, 1, 2, 3}
+
+    # b joins while every partition is leased: a gives back idle extras, keeping the busy one
+    busy = a.claim()
+    await b.rebalance()
+    assert b.owned == set()
+    await a.rebalance()
+    assert len(a.owned) == 2 and busy in a.owned
+    assert sorted(lost_a) == sorted({0, 1, 2, 3} - a.owned)
+    await b.rebalance()
+    assert b.owned == {0, 1, 2, 3} - a.owned
+    for partition in b.owned:
+        assert await client.get(lease_key(partition)) == "b"
+
+    # A clean stop hands everything back
+    await b.stop()
+    assert b.owned == set()
+    assert await client.zscore(CONSUMERS_KEY, "b") is None
+    await a.rebalance()
+    assert a.owned == {0, 1, 2, 3}
+
+async def test_crashed_consumer_partitions_are_picked_up():
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    a, b = leases(client, "a", [], ttl=0.5), leases(client, "b", [], ttl=0.5)
+    await a.rebalance()
+    await b.rebalance()
+    await a.rebalance()
+    await b.rebalance()
+    assert len(a.owned) == len(b.owned) == 2
+
+    # b stops renewing: its heartbeat and leases expire while a keeps renewing its own
+    await asyncio.sleep(0.3)
+    await a.rebalance()
+    await asyncio.sleep(0.3)
+    await a.rebalance()
+    assert a.owned == {0, 1, 2, 3}
+
+async def test_lost_lease_is_reported():
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    lost = []
+    a = leases(client, "a", lost)
+    await a.rebalance()
+
+    # The lease expired and another consumer took it before a renewed
+    await client.set(lease_key(2), "b")
+    await a.rebalance()
+    assert lost == [2]
+    assert 2 not in a.owned
+    assert await client.get(lease_key(2)) == "b"
+
+class StubSession:
+    """Answers the slot book's load query with the slots `held` in the "database" """
+
+    def __init__(self):
+        self.held = {}
+        self.loads = 0
+
+    async def execute(self, query):
+        self.loads += 1
+        return [SimpleNamespace(appointment_time=slot, id=holder) for slot, holder in self.held.items()]
+
+def slot(hours: int) -> datetime:
+    day = datetime.now(pytz.UTC).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=2)
+    return day + timedelta(hours=hours)
+
+async def test_slot_book_reserve_release_and_commit():
+    book, session = SlotBook(), StubSession()
+    assert await book.reserve(session, 0, slot(9), 1)
+    assert session.loads == 1
+    # Held by an uncommitted reservation, even after re-reading the database
+    assert not await book.reserve(session, 0, slot(9), 2)
+    assert session.loads == 2
+    assert await book.reserve(session, 0, slot(9), 1)
+
+    book.committed(0, slot(9))
+    session.held[slot(9)] = 1
+    assert not await book.reserve(session, 0, slot(9), 2)
+
+    # A reservation whose confirmation failed frees the slot without another load
+    assert await book.reserve(session, 0, slot(10), 3)
+    book.release(0, slot(10), 3)
+    loads = session.loads
+    assert await book.reserve(session, 0, slot(10), 4)
+    assert session.loads == loads
+
+    # A partition whose lease was lost is loaded again when next owned
+    book.forget(0)
+    loads = session.loads
+    assert not await book.reserve(session, 0, slot(9), 2)
+    assert session.loads > loads
+
+async def test_slot_book_rechecks_before_rejecting():
+    book, session = SlotBook(), StubSession()
+    session.held[slot(9)] = 1
+    assert not await book.reserve(session, 0, slot(9), 2)
+    assert session.loads == 2
+
+    # Cancelled through the API: the book still has the old holder, the re-check doesn't
+    del session.held[slot(9)]
+    assert await book.reserve(session, 0, slot(9), 2)
+    assert session.loads == 3
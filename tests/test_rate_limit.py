@@ -0,0 +1,35 @@
+import ipaddress
+
+import pytest
+from starlette.requests import Request
+
+from app.utils import rate_limit
+from app.utils.rate_limit import client_identifier
+
+def make_request(peer: str, *forwarded: str) -> Request:
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "client": (peer, 1234)})
+
+@pytest.fixture
+def trusted(monkeypatch):
+    networks = [ipaddress.ip_network("10.0.0.0/8"), ipaddress.ip_network("192.0.2.7")]
+    monkeypatch.setattr(rate_limit, "_trusted_proxies", networks)
+
+def test_forwarded_for_ignored_from_untrusted_peer():
+    assert client_identifier(make_request("203.0.113.5", "198.51.100.1")) == "203.0.113.5"
+
+def test_forwarded_for_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_trusted_proxies", [])
+    assert client_identifier(make_request("10.0.0.1", "198.51.100.1")) == "10.0.0.1"
+
+def test_client_is_rightmost_untrusted_hop(trusted):
+    # The client prepended a fake address; only the hop our proxies saw counts
+    request = make_request("10.0.0.1", "1.2.3.4, 198.51.100.1, 192.0.2.7")
+    assert client_identifier(request) == "198.51.100.1"
+
+def test_repeated_headers_are_joined(trusted):
+    assert client_identifier(make_request("10.0.0.1", "1.2.3.4", "198.51.100.1")) == "198.51.100.1"
+
+def test_trusted_peer_without_forwarded_for(trusted):
+    assert client_identifier(make_request("10.0.0.1")) == "10.0.0.1"
+    assert client_identifier(make_request("10.0.0.1", "10.0.0.2, ")) == "10.0.0.1"
@@ -0,0 +1,68 @@
+import pytest
+import asyncio
+import time
+
+import fakeredis
+import fakeredis.aioredis
+
+from app.utils import registered_emails as module
+from app.utils.bloom import BloomFilter
+from app.utils.registered_emails import RECENT_REGISTRATIONS_KEY, RegisteredEmailFilter
+
+pytestmark = pytest.mark.asyncio
+
+async def built_filter(server) -> RegisteredEmailFilter:
+    """Filter over an empty user table, marked in Redis the way build() marks it"""
+    registered = RegisteredEmailFilter(fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+    registered._built_at = time.time()
+    await registered.client.zadd(RECENT_REGISTRATIONS_KEY, {module.COVERAGE_MEMBER: registered._built_at}, nx=True)
+    registered._filter = BloomFilter(1000, 0.01)
+    return registered
+
+async def wait_for(predicate, timeout: float = 5) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if await predicate():
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+async def test_registrations_reach_other_processes():
+    server = fakeredis.FakeServer()
+    first, second = await built_filter(server), await built_filter(server)
+    
+    assert not await second.might_exist("new@example.com")
+    await first.record_registration("new@example.com")
+    assert await second.might_exist("new@example.com")
+    assert not await second.might_exist("nobody@example.com")
+
+async def test_registration_while_redis_is_down(monkeypatch):
+    monkeypatch.setattr(module, "RECORD_RETRY_BACKOFF", 0.05)
+    server = fakeredis.FakeServer()
+    first, second = await built_filter(server), await built_filter(server)
+    
+    server.connected = False
+    await first.record_registration("new@example.com")
+    # The registering process knows it; the others can't check and answer "maybe"
+    assert await first.might_exist("new@example.com")
+    assert await second.might_exist("new@example.com")
+    assert await second.might_exist("nobody@example.com")
+    
+    server.connected = True
+    assert await wait_for(lambda: second.client.zscore(RECENT_REGISTRATIONS_KEY, "new@example.com"))
+    assert await second.might_exist("new@example.com")
+    assert not await second.might_exist("nobody@example.com")
+    await first.stop()
+
+async def test_evicted_registrations_are_not_trusted():
+    server = fakeredis.FakeServer()
+    first, second = await built_filter(server), await built_filter(server)
+    await first.record_registration("new@example.com")
+    
+    await second.client.delete(RECENT_REGISTRATIONS_KEY)
+    assert await second.might_exist("nobody@example.com")
+    
+    # A set recreated by a later registration only covers from then on
+    await first.record_registration("other@example.com")
+    assert await second.might_exist("nobody@example.com")
+    assert not await (await built_filter(server)).might_exist("nobody@example.com")
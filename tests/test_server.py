@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+from app.server import ServerSupervisor, settings
+from app.workers.supervisor import STABLE_RUN_SECONDS
+
+# Stand-ins for the uvicorn entry point, run in the forked processes
+
+def serving(slot, host, port, sock, cpu, ready):
+    ready.set()
+    time.sleep(60)
+
+def crashing(slot, host, port, sock, cpu, ready):
+    os._exit(3)
+
+def never_ready(slot, host, port, sock, cpu, ready):
+    time.sleep(60)
+
+def supervisor(target, processes: int = 1) -> ServerSupervisor:
+    return ServerSupervisor(
+        processes, "127.0.0.1", 0, preload=False, cpu_affinity=False, appointment_workers=0, target=target
+    )
+
+def test_crashed_process_restarts_with_backoff():
+    server = supervisor(crashing)
+    child = server._children[0]
+    try:
+        server._start(0)
+        child.process.join(5)
+        server._check(0)
+        assert child.process is None
+        assert child.failures == 1
+        assert child.restart_at - time.monotonic() > 0.5
+
+        # Not restarted before its delay is up
+        server._check(0)
+        assert child.process is None
+        child.restart_at = 0
+        server._check(0)
+        assert child.process is not None
+
+        # Each quick crash doubles the delay, up to the cap
+        child.process.join(5)
+        server._check(0)
+        assert child.failures == 2
+        assert child.restart_at - time.monotonic() > 1.5
+        child.failures = 20
+        child.restart_at = 0
+        server._check(0)
+        child.process.join(5)
+        server._check(0)
+        assert settings.WORKER_RESTART_BACKOFF_MAX - 1 < child.restart_at - time.monotonic() <= settings.WORKER_RESTART_BACKOFF_MAX
+
+        # A process that ran for a while starts over at the shortest delay
+        child.restart_at = 0
+        server._check(0)
+        child.process.join(5)
+        child.started_at -= STABLE_RUN_SECONDS
+        server._check(0)
+        assert child.failures == 1
+    finally:
+        server.shutdown()
+
+def test_rolling_restart_replaces_each_process():
+    server = supervisor(serving, processes=2)
+    try:
+        for slot in server._children:
+            server._start(slot)
+            assert server._wait_ready(server._children[slot])
+        old_pids = [child.process.pid for child in server._children.values()]
+
+        server.rolling_restart()
+        new_pids = [child.process.pid for child in server._children.values()]
+        assert set(new_pids).isdisjoint(old_pids)
+        assert all(child.process.is_alive() and child.ready.is_set() for child in server._children.values())
+    finally:
+        server.shutdown()
+
+def test_rolling_restart_keeps_process_whose_replacement_fails():
+    server = supervisor(serving, processes=2)
+    try:
+        for slot in server._children:
+            server._start(slot)
+            assert server._wait_ready(server._children[slot])
+        old_pids = [child.process.pid for child in server._children.values()]
+
+        server.target = crashing
+        server.rolling_restart()
+        assert [child.process.pid for child in server._children.values()] == old_pids
+        assert all(child.process.is_alive() for child in server._children.values())
+    finally:
+        server.shutdown()
+
+def test_stop_interrupts_waiting_for_a_replacement():
+    server = supervisor(serving)
+    try:
+        server._start(0)
+        assert server._wait_ready(server._children[0])
+        old_pid = server._children[0].process.pid
+
+        server.target = never_ready
+        threading.Timer(0.5, server._stopping.set).start()
+        started = time.monotonic()
+        server.rolling_restart()
+        assert time.monotonic() - started < settings.SERVER_STARTUP_TIMEOUT / 2
+        assert server._children[0].process.pid == old_pid
+    finally:
+        server.shutdown()
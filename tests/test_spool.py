@@ -0,0 +1,97 @@
+import pytest
+import asyncio
+import os
+import time
+import redis.asyncio as redis
+
+from app.utils.spool import AppointmentSpool
+
+pytestmark = pytest.mark.asyncio
+
+class FlakyQueue:
+    """Stand-in that records pushed messages and can simulate a Redis outage"""
+
+    def __init__(self):
+        self.available = False
+        self.messages = []
+
+    async def push_messages(self, messages):
+        if not self.available:
+            raise redis.ConnectionError("Redis is down")
+        self.messages.extend(messages)
+        return len(self.messages)
+
+async def wait_for(predicate, timeout: float = 5) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+async def test_spool_replays_in_order_after_recovery(tmp_path):
+    fake_queue = FlakyQueue()
+    spool = AppointmentSpool(str(tmp_path), segment_bytes=200, fsync_interval=0.001, drain_batch_size=7)
+    await spool.start(fake_queue)
+    try:
+        for i in range(50):
+            await spool.append(f'{{"id": {i}}}')
+        # Small segments force rotation
+        assert len([name for name in os.listdir(spool.directory) if name.endswith(".log")]) > 1
+        
+        fake_queue.available = True
+        assert await wait_for(lambda: len(fake_queue.messages) == 50)
+        assert fake_queue.messages == [f'{{"id": {i}}}' for i in range(50)]
+    finally:
+        await spool.stop()
+
+async def test_spool_survives_restart_with_torn_record(tmp_path):
+    fake_queue = FlakyQueue()
+    spool = AppointmentSpool(str(tmp_path), fsync_interval=0.001)
+    await spool.start(fake_queue)
+    await asyncio.gather(*[spool.append(f'{{"id": {i}}}') for i in range(10)])
+    directory = spool.directory
+    await spool.stop()
+    
+    # Simulate a crash in the middle of writing a record
+    segment = sorted(name for name in os.listdir(directory) if name.endswith(".log"))[-1]
+    with open(os.path.join(directory, segment), "ab") as f:
+        f.write(b'{"id": 1')
+    
+    fake_queue.available = True
+    spool = AppointmentSpool(str(tmp_path), fsync_interval=0.001)
+    await spool.start(fake_queue)
+    try:
+        assert await wait_for(lambda: len(fake_queue.messages) == 10)
+        await asyncio.sleep(0.2)
+        assert len(fake_queue.messages) == 10
+    finally:
+        await spool.stop()
+
+async def test_stop_waits_for_in_flight_write(tmp_path):
+    spool = AppointmentSpool(str(tmp_path), fsync_interval=0.001)
+    await spool.start(FlakyQueue())
+    write_batch = spool._write_batch
+    writing, overlapped = [], []
+
+    def slow_write_batch(messages):
+        overlapped.append(bool(writing))
+        writing.append(True)
+        time.sleep(0.2)
+        write_batch(messages)
+        writing.pop()
+
+    spool._write_batch = slow_write_batch
+    first = asyncio.create_task(spool.append('{"id": 0}'))
+    await asyncio.sleep(0.05)
+    # Appended while the first batch is still being written, then stopped before it finishes
+    second = asyncio.create_task(spool.append('{"id": 1}'))
+    await asyncio.sleep(0)
+    directory = spool.directory
+    await spool.stop()
+    
+    await asyncio.gather(first, second)
+    assert overlapped == [False, False]
+    segment = sorted(name for name in os.listdir(directory) if name.endswith(".log"))[-1]
+    with open(os.path.join(directory, segment)) as f:
+        assert f.read() == '{"id": 0}\n{"id": 1}\n'
@@ -0,0 +1,45 @@
+import random
+
+from app.utils.timing_wheel import HierarchicalTimingWheel
+
+def test_items_fire_at_their_tick():
+    wheel = HierarchicalTimingWheel(tick=1.0, wheel_size=8, levels=2)
+    wheel.add(3.0, "a")
+    wheel.add(3.5, "b")
+    wheel.add(10.0, "c")
+    assert wheel.advance(2.9) == []
+    assert wheel.advance(3.0) == ["a"]
+    assert wheel.advance(4.0) == ["b"]
+    assert wheel.advance(9.0) == []
+    assert wheel.advance(10.0) == ["c"]
+    assert len(wheel) == 0
+
+def test_cascade_and_overflow_never_fire_early():
+    wheel = HierarchicalTimingWheel(tick=1.0, wheel_size=4, levels=2)
+    deadlines = {f"item{i}": random.uniform(0, 200) for i in range(500)}
+    for item, deadline in deadlines.items():
+        wheel.add(deadline, item)
+    fired = {}
+    for now in range(0, 202):
+        for item in wheel.advance(now):
+            fired[item] = now
+    assert fired.keys() == deadlines.keys()
+    for item, now in fired.items():
+        assert deadlines[item] <= now < deadlines[item] + 1
+
+def test_past_deadline_fires_on_next_advance():
+    wheel = HierarchicalTimingWheel(tick=1.0, start=100.0)
+    wheel.advance(105.0)
+    wheel.add(50.0, "late")
+    assert wheel.advance(105.0) == ["late"]
+
+def test_advance_limit_and_drain():
+    wheel = HierarchicalTimingWheel(tick=1.0)
+    for i in range(10):
+        wheel.add(float(i), i)
+    wheel.add(1000.0, "later")
+    assert wheel.advance(4.0, limit=3) == [0, 1, 2]
+    assert wheel.advance(4.0) == [3, 4]
+    assert len(wheel) == 6
+    assert sorted(entry[0] for entry in wheel.drain()) == [5.0, 6.0, 7.0, 8.0, 9.0, 1000.0]
+    assert len(wheel) == 0
@@ -0,0 +1,19 @@
+from app.utils.trie import PrefixTrie
+
+def test_prefix_trie_completes_in_rank_order():
+    trie = PrefixTrie(max_results=3)
+    for rank, word in enumerate(["toyota", "tesla", "tata", "triumph", "ford"]):
+        trie.insert(word, word.title(), rank)
+    assert trie.complete("t") == ["Toyota", "Tesla", "Tata"]
+    assert trie.complete("t", limit=2) == ["Toyota", "Tesla"]
+    assert trie.complete("tr") == ["Triumph"]
+    assert trie.complete("x") == []
+    assert trie.complete("") == ["Toyota", "Tesla", "Tata"]
+
+def test_prefix_trie_lists_values_once():
+    trie = PrefixTrie()
+    trie.insert("land rover", "Land Rover", (0, "land rover"))
+    trie.insert("rover", "Land Rover", (1, "land rover"))
+    trie.insert("rover", "Rover", (0, "rover"))
+    assert trie.complete("") == ["Land Rover", "Rover"]
+    assert trie.complete("rov") == ["Rover", "Land Rover"]
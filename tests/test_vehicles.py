@@ -0,0 +1,93 @@
+import pytest
+from httpx import AsyncClient
+from datetime import datetime, timedelta
+import pytz
+
+from app.database.base import engine
+from app.database.vehicles import backfill
+from app.utils.vehicle_catalog import vehicle_catalog
+
+pytestmark = pytest.mark.asyncio
+
+async def create_appointment(async_client: AsyncClient, make: str, model: str, hours: int) -> int:
+    response = await async_client.post(
+        "/appointments/",
+        json={
+            "email": "test@example.com",
+            "phone_number": "+12345678901",
+            "appointment_time": (datetime.now(pytz.UTC) + timedelta(days=9, hours=hours)).isoformat(),
+            "vehicle_year": "2020",
+            "vehicle_make": make,
+            "vehicle_model": model,
+            "problem_description": "Regular maintenance"
+        }
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+async def seed_catalog(*vehicles):
+    for make, model in vehicles:
+        await vehicle_catalog.resolve(make, model, create=True)
+
+async def test_writes_use_catalog_spelling(async_client: AsyncClient):
+    await seed_catalog(("Toyota", "Camry"))
+    first = await create_appointment(async_client, "Toyota", "Camry", 0)
+    second = await create_appointment(async_client, "  TOYOTA ", "camry", 1)
+    
+    appointments = []
+    for appointment_id in (first, second):
+        response = await async_client.get(f"/appointments/{appointment_id}")
+        appointments.append(response.json())
+    assert [a["vehicle_make"] for a in appointments] == ["Toyota", "Toyota"]
+    assert [a["vehicle_model"] for a in appointments] == ["Camry", "Camry"]
+    assert appointments[0]["vehicle_make_id"] == appointments[1]["vehicle_make_id"] is not None
+    assert appointments[0]["vehicle_model_id"] == appointments[1]["vehicle_model_id"] is not None
+
+async def test_unknown_vehicles_wait_for_backfill(async_client: AsyncClient):
+    await seed_catalog(("Toyota", "Camry"))
+    unknown_make = await create_appointment(async_client, "  Zastava ", "Yugo", 0)
+    unknown_model = await create_appointment(async_client, "toyota", "Supra", 1)
+    
+    response = await async_client.get(f"/appointments/{unknown_make}")
+    data = response.json()
+    assert (data["vehicle_make"], data["vehicle_model"]) == ("Zastava", "Yugo")
+    assert data["vehicle_make_id"] is None and data["vehicle_model_id"] is None
+    response = await async_client.get(f"/appointments/{unknown_model}")
+    data = response.json()
+    assert (data["vehicle_make"], data["vehicle_model"]) == ("Toyota", "Supra")
+    assert data["vehicle_make_id"] is not None and data["vehicle_model_id"] is None
+    
+    # Public writes don't add to the catalog
+    response = await async_client.get("/vehicles/autocomplete?q=z")
+    assert response.json()["suggestions"] == []
+    response = await async_client.get("/vehicles/autocomplete?q=s&make=Toyota")
+    assert response.json()["suggestions"] == []
+    
+    await backfill(engine)
+    for appointment_id in (unknown_make, unknown_model):
+        response = await async_client.get(f"/appointments/{appointment_id}")
+        data = response.json()
+        assert data["vehicle_make_id"] is not None and data["vehicle_model_id"] is not None
+    response = await async_client.get("/vehicles/autocomplete?q=z")
+    assert [s["name"] for s in response.json()["suggestions"]] == ["Zastava"]
+
+async def test_autocomplete_makes_and_models(async_client: AsyncClient):
+    await seed_catalog(("Toyota", "Camry"), ("Toyota", "Corolla"), ("Tesla", "Model 3"), ("Land Rover", "Defender"))
+    
+    response = await async_client.get("/vehicles/autocomplete?q=t")
+    assert response.status_code == 200
+    assert [s["name"] for s in response.json()["suggestions"]] == ["Tesla", "Toyota"]
+    
+    response = await async_client.get("/vehicles/autocomplete?q=ROV")
+    assert [s["name"] for s in response.json()["suggestions"]] == ["Land Rover"]
+    
+    response = await async_client.get("/vehicles/autocomplete?q=c&make=toyota")
+    data = response.json()
+    assert data["make_id"] is not None
+    assert [s["name"] for s in data["suggestions"]] == ["Camry", "Corolla"]
+    
+    response = await async_client.get("/vehicles/autocomplete?q=3&make=Tesla")
+    assert [s["name"] for s in response.json()["suggestions"]] == ["Model 3"]
+    
+    response = await async_client.get("/vehicles/autocomplete?q=c&make=Unknown")
+    assert response.json() == {"make_id": None, "suggestions": []}